@@ -1,7 +1,7 @@
 '''
 字节码
 '''
-from typing import List, Iterable, Iterator
+from typing import List, Iterable, Iterator, Optional
 from array import array
 
 Byte = int
@@ -17,7 +17,9 @@ class Bytes:
         for i in range(byteNumber):
             val = val*256 + self.proxy[address+i]
         return val
-    def pushInt(self, value:int, byteNumber:int) -> 'Bytes':
+    def pushInt(self, value:int, byteNumber:int) -> 'Bytes': # 大端无符号数，超出范围报错而不是截断
+        if value < 0 or value >= 1 << (8 * byteNumber):
+            raise Exception(f"{value} does not fit in {byteNumber} bytes")
         temp = []
         for i in range(byteNumber):
             temp.append(value % 256)
@@ -26,7 +28,7 @@ class Bytes:
         return self
     def popInt(self, byteNumber:int) -> int:
         val = self.readInt(len(self) - byteNumber, byteNumber)
-        self.proxy = self.proxy[:len(self) - byteNumber]
+        del self.proxy[len(self) - byteNumber:] # 原地删除，不复制整个数组
         return val
     def pushByte(self, byte:Byte) -> 'Bytes':
         self.proxy.append(byte)
@@ -35,9 +37,7 @@ class Bytes:
         self.proxy.extend(bytes)
         return self
     def replace(self, addr:int, bytes:'Bytes') -> None:
-        print(f"replace {self} {bytes}")
         self.proxy[addr:addr+len(bytes)] = bytes.proxy
-        print(f"replace {self}")
     def __iter__(self)->Iterator[int]:
         return self.proxy.__iter__()
     def __len__(self) -> int:
@@ -49,18 +49,43 @@ class Bytes:
     def __str__(self) -> str:
         return str(list(self.proxy))
 
+class FuncCode:
+    '''
+    函数的字节码，和所在的 ByteCode 共用常量池、全局变量
+    前 parameterCount 个局部变量槽位是形参；VM 中函数值就是 FuncCode 对象本身，不能参与运算
+    '''
+    def __init__(self, parameters:List[str]) -> None:
+        self.parameters = parameters
+        self.parameterCount = len(parameters)
+        self.instrctions:Bytes = Bytes()
+        self.localCount:int = self.parameterCount # 局部变量槽位数
+    def __str__(self) -> str:
+        return f"fn({', '.join(self.parameters)})"
+    def __repr__(self) -> str:
+        return str(self)
+
 class ByteCode:
     def __init__(self) -> None:
         self.instrctions:Bytes = Bytes() # 二进制码
-        self.constPool:Bytes = Bytes() # 常量池
+        self.constPool:List[int] = [] # 常量池，LOADI 的操作数是下标，整数不限大小
+        self.globalNames:List[str] = [] # 全局变量名，下标是全局变量槽位
+        self.localCount:int = 0 # 局部变量槽位数
+        self.functions:List[FuncCode] = [] # 函数，下标是 LOADF 的操作数
     def __str__(self) -> str:
+        ss:List[str] = [str(self.instrctions), ByteCode.listing(self, self.instrctions)]
+        for i, function in enumerate(self.functions):
+            ss.append(f"#{i} {function} locals {function.localCount}")
+            ss.append(ByteCode.listing(self, function.instrctions))
+        return "\n".join(ss)
+    @staticmethod
+    def listing(bytecode:'ByteCode', instrctions:Bytes) -> str: # 反汇编
         ss:List[str] = []
         address = 0
-        while address < len(self.instrctions):
-            op = OprationCodes._INDEXES[self.instrctions[address]]
-            ss.append(f"{address:4d}  {OprationCodes.string(address, self)}")
+        while address < len(instrctions):
+            op = OprationCodes._INDEXES[instrctions[address]]
+            ss.append(f"{address:4d}  {OprationCodes.string(address, bytecode, instrctions)}")
             address += op.length
-        return str(self.instrctions)+"\n"+"\n".join(ss)
+        return "\n".join(ss)
 
 
 class OprationCode:
@@ -97,57 +122,90 @@ class OprationCodes:
     BANGB = OprationCode(Byte(16), 0, "BANGB") # 弹出栈顶的一个四字节整形元素，视为 0/1 布尔，反转后入栈
     JUMP = OprationCode(Byte(17), 2, "JUMP") # 无条件跳转 (i<<8)+j 位置
     JUMPF = OprationCode(Byte(18), 2, "JUMPF") # 弹出栈顶的一个四字节整形元素，判断 0/1 布尔条件，false 时跳转 (i<<8)+j 位置
+    LOADG = OprationCode(Byte(19), 2, "LOADG") # LOADG i j; 将第 (i<<8)+j 个全局变量入栈，变量未定义时报错
+    STOREG = OprationCode(Byte(20), 2, "STOREG") # STOREG i j; 弹出栈顶元素，赋值给第 (i<<8)+j 个全局变量，变量未定义时报错
+    DEFG = OprationCode(Byte(21), 2, "DEFG") # DEFG i j; 弹出栈顶元素，定义第 (i<<8)+j 个全局变量，重复定义在编译期检查
+    LOADL = OprationCode(Byte(22), 2, "LOADL") # LOADL i j; 将第 (i<<8)+j 个局部变量入栈
+    STOREL = OprationCode(Byte(23), 2, "STOREL") # STOREL i j; 弹出栈顶元素，存入第 (i<<8)+j 个局部变量
+    LOADF = OprationCode(Byte(24), 2, "LOADF") # LOADF i j; 将第 (i<<8)+j 个函数的 FuncCode 入栈
+    CALL = OprationCode(Byte(25), 1, "CALL") # CALL n; 弹出 n 个实参和函数，新建栈帧存放形参和局部变量，跳转到函数开头
+    CALLN = OprationCode(Byte(26), 2, "CALLN") # CALLN i n; 弹出 n 个实参，调用第 i 个内置函数，结果入栈
+    RET = OprationCode(Byte(27), 0, "RET") # 弹出返回值，退出栈帧，回到调用处后返回值入栈；不在函数中时结束执行，返回值留在栈上
 
 
-    _INDEXES:List[OprationCode] = [NOOP, LOADI, ADDI, SUBI, MULI, DIVI, POPI, PUSHBT, PUSHBF, EQI, NEQI, GTI, GTEI, LTI, LTEI, MINUSI, BANGB, JUMP, JUMPF]
+    _INDEXES:List[OprationCode] = [NOOP, LOADI, ADDI, SUBI, MULI, DIVI, POPI, PUSHBT, PUSHBF, EQI, NEQI, GTI, GTEI, LTI, LTEI, MINUSI, BANGB, JUMP, JUMPF,
+        LOADG, STOREG, DEFG, LOADL, STOREL, LOADF, CALL, CALLN, RET]
 
     @staticmethod
-    def string(address:int, bytecode:ByteCode) -> str:
-        if bytecode.instrctions[address] == OprationCodes.NOOP.code:
+    def string(address:int, bytecode:ByteCode, instrctions:Optional[Bytes] = None) -> str: # instrctions 默认是 bytecode 的顶层指令
+        if instrctions is None:
+            instrctions = bytecode.instrctions
+        if instrctions[address] == OprationCodes.NOOP.code:
             return f"{OprationCodes.NOOP.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.LOADI.code:
-            constIndex = bytecode.instrctions.readInt(address+1, OprationCodes.LOADI.operandNumber)
-            return f"{OprationCodes.LOADI.mnemonic} #{constIndex}; {bytecode.constPool.readInt(constIndex, 4)}"
-        if bytecode.instrctions[address] == OprationCodes.ADDI.code:
+        if instrctions[address] == OprationCodes.LOADI.code:
+            constIndex = instrctions.readInt(address+1, OprationCodes.LOADI.operandNumber)
+            return f"{OprationCodes.LOADI.mnemonic} #{constIndex}; {bytecode.constPool[constIndex]}"
+        if instrctions[address] == OprationCodes.ADDI.code:
             return f"{OprationCodes.ADDI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.SUBI.code:
+        if instrctions[address] == OprationCodes.SUBI.code:
             return f"{OprationCodes.SUBI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.MULI.code:
+        if instrctions[address] == OprationCodes.MULI.code:
             return f"{OprationCodes.MULI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.DIVI.code:
+        if instrctions[address] == OprationCodes.DIVI.code:
             return f"{OprationCodes.DIVI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.POPI.code:
+        if instrctions[address] == OprationCodes.POPI.code:
             return f"{OprationCodes.POPI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.PUSHBT.code:
+        if instrctions[address] == OprationCodes.PUSHBT.code:
             return f"{OprationCodes.PUSHBT.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.PUSHBF.code:
+        if instrctions[address] == OprationCodes.PUSHBF.code:
             return f"{OprationCodes.PUSHBF.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.EQI.code:
+        if instrctions[address] == OprationCodes.EQI.code:
             return f"{OprationCodes.EQI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.NEQI.code:
+        if instrctions[address] == OprationCodes.NEQI.code:
             return f"{OprationCodes.NEQI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.GTI.code:
+        if instrctions[address] == OprationCodes.GTI.code:
             return f"{OprationCodes.GTI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.GTEI.code:
+        if instrctions[address] == OprationCodes.GTEI.code:
             return f"{OprationCodes.GTEI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.LTI.code:
+        if instrctions[address] == OprationCodes.LTI.code:
             return f"{OprationCodes.LTI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.LTEI.code:
+        if instrctions[address] == OprationCodes.LTEI.code:
             return f"{OprationCodes.LTEI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.MINUSI.code:
+        if instrctions[address] == OprationCodes.MINUSI.code:
             return f"{OprationCodes.MINUSI.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.BANGB.code:
+        if instrctions[address] == OprationCodes.BANGB.code:
             return f"{OprationCodes.BANGB.mnemonic};"
-        if bytecode.instrctions[address] == OprationCodes.JUMP.code:
-            target = bytecode.instrctions.readInt(address+1, OprationCodes.JUMP.operandNumber)
+        if instrctions[address] == OprationCodes.JUMP.code:
+            target = instrctions.readInt(address+1, OprationCodes.JUMP.operandNumber)
             return f"{OprationCodes.JUMP.mnemonic} {target};"
-        if bytecode.instrctions[address] == OprationCodes.JUMPF.code:
-            target = bytecode.instrctions.readInt(address+1, OprationCodes.JUMPF.operandNumber)
+        if instrctions[address] == OprationCodes.JUMPF.code:
+            target = instrctions.readInt(address+1, OprationCodes.JUMPF.operandNumber)
             return f"{OprationCodes.JUMPF.mnemonic} {target};"
-        raise Exception(f"unknow operation code {bytecode.instrctions[address]}")
+        if instrctions[address] in (OprationCodes.LOADG.code, OprationCodes.STOREG.code, OprationCodes.DEFG.code):
+            op = OprationCodes._INDEXES[instrctions[address]]
+            slot = instrctions.readInt(address+1, op.operandNumber)
+            return f"{op.mnemonic} #{slot}; {bytecode.globalNames[slot]}"
+        if instrctions[address] in (OprationCodes.LOADL.code, OprationCodes.STOREL.code):
+            op = OprationCodes._INDEXES[instrctions[address]]
+            slot = instrctions.readInt(address+1, op.operandNumber)
+            return f"{op.mnemonic} {slot};"
+        if instrctions[address] == OprationCodes.LOADF.code:
+            index = instrctions.readInt(address+1, OprationCodes.LOADF.operandNumber)
+            return f"{OprationCodes.LOADF.mnemonic} #{index}; {bytecode.functions[index]}"
+        if instrctions[address] == OprationCodes.CALL.code:
+            return f"{OprationCodes.CALL.mnemonic} {instrctions[address+1]};"
+        if instrctions[address] == OprationCodes.CALLN.code:
+            return f"{OprationCodes.CALLN.mnemonic} #{instrctions[address+1]} {instrctions[address+2]}; {Natives.NAMES[instrctions[address+1]]}"
+        if instrctions[address] == OprationCodes.RET.code:
+            return f"{OprationCodes.RET.mnemonic};"
+        raise Exception(f"unknow operation code {instrctions[address]}")
 
-class Sizes:
-    I = 4
+class Natives:
+    '''
+    内置函数，CALLN 的第一个操作数是下标
+    '''
+    PRINTLN = 0 # println(a) 输出 a，返回 a
+    NAMES:List[str] = ["println"]
 
 if __name__ == "__main__":
     bytes = Bytes()
@@ -164,7 +222,7 @@ if __name__ == "__main__":
     bytecode = ByteCode()
     bytecode.instrctions.pushByte(OprationCodes.LOADI.code)
     bytecode.instrctions.pushInt(0, 2)
-    bytecode.constPool.pushInt(114514, 4)
+    bytecode.constPool.append(114514)
     print(OprationCodes.string(0, bytecode))
 
     bytecode.instrctions.pushByte(OprationCodes.NOOP.code)
@@ -2,66 +2,227 @@
 编译器
 '''
 import it_interpreter.it_ast as ast # 各种表达式、语句
-from it_compiler.it_code import Bytes, ByteCode, OprationCode, OprationCodes
+from it_compiler.it_code import Bytes, ByteCode, FuncCode, OprationCode, OprationCodes, Natives
 from it_interpreter.it_token import TokenType, TokenTypes
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
 
 class Compiler:
+    '''
+    变量在编译期解析为槽位，VM 采用词法作用域，和解释器的动态作用域不同
+    函数外的变量都放在全局槽位中：顶层 let 的变量按名字分配，函数外代码块中 let 的变量每个声明一个槽位
+    函数的形参和函数中代码块 let 的变量是局部变量，放在调用栈帧中，代码块结束后槽位回收
+    变量的作用域是所在代码块中 let 之后的部分；函数体中还可以引用函数外代码块中之后才声明的变量，以支持递归、互相递归
+    不支持闭包：函数体引用外层函数的局部变量（包括之后才声明的）时编译期报错；解释器中只在调用时可见的变量（动态作用域）在 VM 中不可见
+    同一作用域中重复 let 在编译期报错；其余名字都按全局变量处理，全局槽位按需分配，运行时读写尚未定义的全局变量报 undefined
+    函数体最后一条语句是表达式时返回它的值，没有 return 时返回 0
+    '''
     def __init__(self) -> None:
         self.bytecode:ByteCode = ByteCode()
+        self.code:Union[ByteCode, FuncCode] = self.bytecode # 正在编译的函数，顶层代码是 bytecode 本身
+        self.globalSlots:Dict[str, int] = dict() # 全局变量名到槽位
+        self.constIndexes:Dict[int, int] = dict() # 整数常量到常量池下标
+        self.programNames:Set[str] = set(Natives.NAMES) # 顶层已声明的变量，内置函数和解释器一样视为顶层已声明，不能重新 let
+        self.scopes:List[Dict[str, List]] = [] # 各层代码块中的变量名到 [槽位, 是否已声明]，函数中尚未声明的变量槽位是 None
+        self.nextLocal:int = 0 # 下一个空闲的局部变量槽位
+        self.enclosing:List[Tuple[Union[ByteCode, FuncCode], List[Dict[str, List]], int]] = [] # 外层函数的 code, scopes, nextLocal
+        # 分派表，下标是节点种类 NodeKinds，子类重写的 _compileX 同样生效
+        self.compilers:List[Callable[[ast.Node], None]] = [self._compileUnknown] * ast.NodeKinds.COUNT
+        self.compilers[ast.NodeKinds.PROGRAM_STATEMENT] = self._compileProgram
+        self.compilers[ast.NodeKinds.BLOCK_STATEMENT] = self._compileBlock
+        self.compilers[ast.NodeKinds.LET_STATEMENT] = self._compileLetStatement
+        self.compilers[ast.NodeKinds.ASSIGN_STATEMENT] = self._compileAssignStatement
+        self.compilers[ast.NodeKinds.IF_STATEMENT] = self._compileIfStatement
+        self.compilers[ast.NodeKinds.WHILE_STATEMENT] = self._compileWhileStatement
+        self.compilers[ast.NodeKinds.EXPRESSION_STATEMENT] = self._compileExpressionStatement
+        self.compilers[ast.NodeKinds.EMPTY_STATEMENT] = self._compileEmptyStatement
+        self.compilers[ast.NodeKinds.BINARY_EXPRESSION] = self._compileBinaryExpression
+        self.compilers[ast.NodeKinds.PREFIX_EXPRESSION] = self._compilePrefixExpression
+        self.compilers[ast.NodeKinds.INTEGER_LITERAL_EXPRESSION] = self._compileIntegerLiteral
+        self.compilers[ast.NodeKinds.BOOL_LITERAL_EXPRESSION] = self._compileBoolLiteral
+        self.compilers[ast.NodeKinds.IDENTIFIER_EXPRESSION] = self._compileIdentifier
+        self.compilers[ast.NodeKinds.RETURN_STATEMENT] = self._compileReturnStatement
+        self.compilers[ast.NodeKinds.FUNC_LITERAL_EXPRESSION] = self._compileFuncLiteral
+        self.compilers[ast.NodeKinds.FUNC_CALLER_EXPRESSION] = self._compileFuncCaller
     def compile(self, node:ast.Node) -> None:
-        nodeType = node.nodeType()
-        if nodeType == ast.NodeTypes.PROGRAM_STATEMENT: # program
-            for s in node.treatAs(ast.Program).statements():
-                self.compile(s)
-        elif nodeType == ast.NodeTypes.IF_STATEMENT: # if
-            # if(a){b}else{c} 翻译为 a; JUMPF #1; b; JUMP #2; [#1] c; [#2] end; 
-            ifState = node.treatAs(ast.IfStatement)
-            self.compile(ifState.condition()) # 计算条件
-            self._addInstraction(OprationCodes.JUMPF, Bytes().pushInt(-1, OprationCodes.JUMPF.operandNumber)) # JUMPF 先填充 -1，等知道跳转位置后回写
-            jumpF = self.bytecode.instrctions.size() - OprationCodes.JUMPF.operandNumber # 记录 JUMPF 回写位置
-            self.compile(ifState.consequence()) # consequence 
-            self._addInstraction(OprationCodes.JUMP, Bytes().pushInt(-1, OprationCodes.JUMP.operandNumber))# JUMP 先填充 -1，
-            jump = self.bytecode.instrctions.size() - OprationCodes.JUMP.operandNumber # 记录 JUMP 回写位置
-            self.bytecode.instrctions.replace(jumpF, Bytes().pushInt(self.bytecode.instrctions.size(), OprationCodes.JUMPF.operandNumber)) # 回写 JUMPF
-            self.compile(ifState.alternative())
-            self.bytecode.instrctions.replace(jump, Bytes().pushInt(self.bytecode.instrctions.size(), OprationCodes.JUMP.operandNumber)) # 回写
-        elif nodeType == ast.NodeTypes.BLOCK_STATEMENT: # block
-            for s in node.treatAs(ast.Block).statements():
-                self.compile(s)
-        elif nodeType == ast.NodeTypes.EXPRESSION_STATEMENT: # expr_state 执行完后需要弹栈
-            self.compile(node.treatAs(ast.ExpressionStatement).expression())
-            self._addInstraction(OprationCodes.POPI, Bytes())
-        elif nodeType == ast.NodeTypes.EMPTY_STATEMENT: # empty
-            self._addInstraction(OprationCodes.NOOP, Bytes())
-        elif nodeType == ast.NodeTypes.BINARY_EXPRESSION: # 二元
-            biExpr = node.treatAs(ast.BinaryOperatorExpression)
-            self.compile(biExpr.left())
-            self.compile(biExpr.right())
-            self._addBinaryOpeatorInstraction(biExpr.operatorType())
-        elif nodeType == ast.NodeTypes.PREFIX_EXPRESSION: # 一元
-            preExpr = node.treatAs(ast.PrefixExpression)
-            self.compile(preExpr.rawExpression())
-            if preExpr.prefixType() == TokenTypes.OP_MINUS:
-                self._addInstraction(OprationCodes.MINUSI, Bytes())
-            elif preExpr.prefixType() == TokenTypes.OP_BANG:
-                self._addInstraction(OprationCodes.BANGB, Bytes())
+        self.compilers[node.kind](node)
+    def _compileProgram(self, node:ast.Program) -> None: # program，顶层声明的是全局变量
+        for s in node.statements():
+            self.compile(s)
+    def _compileBlock(self, node:ast.Block) -> None: # block，新的作用域
+        self._compileScope(node.statements(), False)
+    def _compileScope(self, statements:List[ast.Statement], returnsLast:bool) -> None: # returnsLast 时最后一条表达式语句的值留在栈上作为返回值
+        # 预先登记所有 let：函数外的代码块分配全局槽位，函数体可以引用之后才声明的变量；函数中的代码块到 let 时才分配局部槽位，登记是为了内层函数引用时报错
+        scope:Dict[str, List] = dict()
+        inMain = self.code is self.bytecode
+        for s in statements:
+            if s.kind == ast.NodeKinds.LET_STATEMENT and s.identifier().name() not in scope:
+                name = s.identifier().name()
+                scope[name] = [self._newGlobalSlot(name) if inMain else None, False]
+        self.scopes.append(scope)
+        nextLocal = self.nextLocal
+        for i, s in enumerate(statements):
+            if returnsLast and i == len(statements) - 1 and s.kind == ast.NodeKinds.EXPRESSION_STATEMENT:
+                self.compile(s.expression())
+                self._addInstraction(OprationCodes.RET, Bytes())
             else:
-                raise Exception(f"unknown prefix token type {preExpr.prefixType()}")
-        elif nodeType == ast.NodeTypes.INTEGER_LITERAL_EXPRESSION: # int_literal_expr
-            addr = self._addIntConstValue(node.treatAs(ast.IntegerLiteral).integerValue(), 4)
-            self._addInstraction(OprationCodes.LOADI, Bytes().pushInt(addr, OprationCodes.LOADI.operandNumber))
-        elif nodeType == ast.NodeTypes.BOOL_LITERAL_EXPRESSION: # bool_literal_expr
-            self._addInstraction(OprationCodes.PUSHBT if node.treatAs(ast.BoolLiteral).boolValue() else OprationCodes.PUSHBF, Bytes())
+                self.compile(s)
+        self.scopes.pop()
+        self.nextLocal = nextLocal # 回收槽位
+    def _compileLetStatement(self, node:ast.LetStatement) -> None: # let，先计算表达式再声明，表达式中的同名变量是外层的
+        self.compile(node.expression())
+        name = node.identifier().name()
+        if len(self.scopes) == 0: # 顶层
+            if name in self.programNames:
+                raise Exception(f"redifined {name}")
+            self.programNames.add(name)
+            self._addInstraction(OprationCodes.DEFG, Bytes().pushInt(self._globalSlot(name), OprationCodes.DEFG.operandNumber))
+            return
+        scope = self.scopes[-1]
+        if self.code is self.bytecode: # 函数外的代码块，槽位已经预先分配
+            variable = scope[name]
+            if variable[1]:
+                raise Exception(f"redifined {name}")
+            variable[1] = True
+            self._addInstraction(OprationCodes.DEFG, Bytes().pushInt(variable[0], OprationCodes.DEFG.operandNumber))
+            return
+        variable = scope[name]
+        if variable[1]:
+            raise Exception(f"redifined {name}")
+        variable[0] = self._newLocalSlot()
+        variable[1] = True
+        self._addInstraction(OprationCodes.STOREL, Bytes().pushInt(variable[0], OprationCodes.STOREL.operandNumber))
+    def _compileAssignStatement(self, node:ast.AssignStatement) -> None: # assign
+        self.compile(node.expression())
+        isLocal, slot = self._resolve(node.identifier().name())
+        if isLocal:
+            self._addInstraction(OprationCodes.STOREL, Bytes().pushInt(slot, OprationCodes.STOREL.operandNumber))
+        else:
+            self._addInstraction(OprationCodes.STOREG, Bytes().pushInt(slot, OprationCodes.STOREG.operandNumber))
+    def _compileReturnStatement(self, node:ast.ReturnStatement) -> None: # return，函数外的 return 结束执行
+        self.compile(node.expression())
+        self._addInstraction(OprationCodes.RET, Bytes())
+    def _compileIfStatement(self, node:ast.IfStatement) -> None: # if
+        # if(a){b}else{c} 翻译为 a; JUMPF #1; b; JUMP #2; [#1] c; [#2] end; 
+        self.compile(node.condition()) # 计算条件
+        self._addInstraction(OprationCodes.JUMPF, Bytes().pushInt(0, OprationCodes.JUMPF.operandNumber)) # JUMPF 先填充 0，等知道跳转位置后回写
+        jumpF = self.code.instrctions.size() - OprationCodes.JUMPF.operandNumber # 记录 JUMPF 回写位置
+        self.compile(node.consequence()) # consequence 
+        self._addInstraction(OprationCodes.JUMP, Bytes().pushInt(0, OprationCodes.JUMP.operandNumber))# JUMP 先填充 0，
+        jump = self.code.instrctions.size() - OprationCodes.JUMP.operandNumber # 记录 JUMP 回写位置
+        self.code.instrctions.replace(jumpF, Bytes().pushInt(self.code.instrctions.size(), OprationCodes.JUMPF.operandNumber)) # 回写 JUMPF
+        self.compile(node.alternative())
+        self.code.instrctions.replace(jump, Bytes().pushInt(self.code.instrctions.size(), OprationCodes.JUMP.operandNumber)) # 回写
+    def _compileWhileStatement(self, node:ast.WhileStatement) -> None: # while
+        # while(a){b} 翻译为 [#1] a; JUMPF #2; b; JUMP #1; [#2] end;
+        start = self.code.instrctions.size()
+        self.compile(node.condition())
+        self._addInstraction(OprationCodes.JUMPF, Bytes().pushInt(0, OprationCodes.JUMPF.operandNumber)) # JUMPF 先填充 0，等知道跳转位置后回写
+        jumpF = self.code.instrctions.size() - OprationCodes.JUMPF.operandNumber
+        self.compile(node.body())
+        self._addInstraction(OprationCodes.JUMP, Bytes().pushInt(start, OprationCodes.JUMP.operandNumber)) # 向后跳回条件
+        self.code.instrctions.replace(jumpF, Bytes().pushInt(self.code.instrctions.size(), OprationCodes.JUMPF.operandNumber)) # 回写 JUMPF
+    def _compileExpressionStatement(self, node:ast.ExpressionStatement) -> None: # expr_state 执行完后需要弹栈
+        self.compile(node.expression())
+        self._addInstraction(OprationCodes.POPI, Bytes())
+    def _compileEmptyStatement(self, node:ast.EmptyStatement) -> None: # empty
+        self._addInstraction(OprationCodes.NOOP, Bytes())
+    def _compileBinaryExpression(self, node:ast.BinaryOperatorExpression) -> None: # 二元
+        self.compile(node.left())
+        self.compile(node.right())
+        self._addBinaryOpeatorInstraction(node.operatorType())
+    def _compilePrefixExpression(self, node:ast.PrefixExpression) -> None: # 一元
+        self.compile(node.rawExpression())
+        if node.prefixType() == TokenTypes.OP_MINUS:
+            self._addInstraction(OprationCodes.MINUSI, Bytes())
+        elif node.prefixType() == TokenTypes.OP_BANG:
+            self._addInstraction(OprationCodes.BANGB, Bytes())
+        else:
+            raise Exception(f"unknown prefix token type {node.prefixType()}")
+    def _compileIntegerLiteral(self, node:ast.IntegerLiteral) -> None: # int_literal_expr
+        index = self._addIntConstValue(node.integerValue())
+        self._addInstraction(OprationCodes.LOADI, Bytes().pushInt(index, OprationCodes.LOADI.operandNumber))
+    def _compileBoolLiteral(self, node:ast.BoolLiteral) -> None: # bool_literal_expr
+        self._addInstraction(OprationCodes.PUSHBT if node.boolValue() else OprationCodes.PUSHBF, Bytes())
+    def _compileIdentifier(self, node:ast.IdentifierNode) -> None: # identifier
+        isLocal, slot = self._resolve(node.name())
+        if isLocal:
+            self._addInstraction(OprationCodes.LOADL, Bytes().pushInt(slot, OprationCodes.LOADL.operandNumber))
         else:
-            raise Exception(f"unknown node type {nodeType}")
+            self._addInstraction(OprationCodes.LOADG, Bytes().pushInt(slot, OprationCodes.LOADG.operandNumber))
+    def _compileFuncLiteral(self, node:ast.FuncLiteral) -> None: # 函数定义，函数体编译为单独的 FuncCode，这里只把函数入栈
+        parameters = node.parameterNames()
+        function = FuncCode(parameters)
+        index = len(self.bytecode.functions)
+        self.bytecode.functions.append(function)
+        self.enclosing.append((self.code, self.scopes, self.nextLocal))
+        self.code, self.scopes, self.nextLocal = function, [dict()], 0
+        for name in parameters:
+            if name in self.scopes[0]:
+                raise Exception(f"redifined {name}")
+            self.scopes[0][name] = [self._newLocalSlot(), True]
+        self._compileScope(node.body().statements(), True)
+        self._addInstraction(OprationCodes.PUSHBF, Bytes()) # 没有 return 时返回 0
+        self._addInstraction(OprationCodes.RET, Bytes())
+        self.code, self.scopes, self.nextLocal = self.enclosing.pop()
+        self._addInstraction(OprationCodes.LOADF, Bytes().pushInt(index, OprationCodes.LOADF.operandNumber))
+    def _compileFuncCaller(self, node:ast.FuncCaller) -> None: # 函数调用，先入栈函数再入栈实参
+        callee = node.callee()
+        arguments = node.arguments()
+        if len(arguments) > 255: # CALL、CALLN 的实参个数只占 1 字节
+            raise Exception(f"too many arguments, at most 255, got {len(arguments)}")
+        if isinstance(callee, ast.IdentifierNode) and callee.name() in Natives.NAMES and self._lookup(callee.name()) is None: # 内置函数
+            for argument in arguments:
+                self.compile(argument)
+            self._addInstraction(OprationCodes.CALLN, Bytes().pushInt(Natives.NAMES.index(callee.name()), 1).pushInt(len(arguments), 1))
+            return
+        self.compile(callee)
+        for argument in arguments:
+            self.compile(argument)
+        self._addInstraction(OprationCodes.CALL, Bytes().pushInt(len(arguments), OprationCodes.CALL.operandNumber))
+    def _compileUnknown(self, node:ast.Node) -> None:
+        raise Exception(f"unknown node type {node.nodeType()}")
     def _addInstraction(self, oprationCode:OprationCode, operands:Bytes) -> None:
-        self.bytecode.instrctions.pushByte(oprationCode.code)
-        self.bytecode.instrctions.extend(operands)
-    def _addIntConstValue(self, value:int, byteNumber:int) -> int:
-        addr = len(self.bytecode.constPool)
-        self.bytecode.constPool.pushInt(value, byteNumber)
-        return addr
+        self.code.instrctions.pushByte(oprationCode.code)
+        self.code.instrctions.extend(operands)
+    def _resolve(self, name:str) -> Tuple[bool, int]: # 变量是否是局部变量，槽位
+        variable = self._lookup(name)
+        if variable is None:
+            return False, self._globalSlot(name)
+        return variable
+    def _lookup(self, name:str) -> Optional[Tuple[bool, int]]: # 由内向外查找代码块中的变量，不包括顶层变量，没有时返回 None
+        inFunction = self.code is not self.bytecode
+        for scope in reversed(self.scopes):
+            variable = scope.get(name)
+            if variable is not None and variable[1]:
+                return inFunction, variable[0]
+        for code, scopes, _ in reversed(self.enclosing): # 函数体中引用外层的变量
+            for scope in reversed(scopes):
+                variable = scope.get(name)
+                if variable is not None:
+                    if code is not self.bytecode:
+                        raise Exception(f"closure is not supported, {name} is a local variable of the outer function")
+                    return False, variable[0]
+        return None
+    def _globalSlot(self, name:str) -> int: # 顶层变量的全局槽位，按名字分配
+        slot = self.globalSlots.get(name)
+        if slot is None:
+            slot = self.globalSlots[name] = self._newGlobalSlot(name)
+        return slot
+    def _newGlobalSlot(self, name:str) -> int:
+        self.bytecode.globalNames.append(name)
+        return len(self.bytecode.globalNames) - 1
+    def _newLocalSlot(self) -> int: # 当前函数的局部变量槽位
+        slot = self.nextLocal
+        self.nextLocal += 1
+        self.code.localCount = max(self.code.localCount, self.nextLocal)
+        return slot
+    def _addIntConstValue(self, value:int) -> int: # 相同的常量只放一次
+        index = self.constIndexes.get(value)
+        if index is None:
+            index = self.constIndexes[value] = len(self.bytecode.constPool)
+            self.bytecode.constPool.append(value)
+        return index
     def _addBinaryOpeatorInstraction(self, tokenType:TokenType) -> None:
         if tokenType == TokenTypes.OP_PLUS:
             self._addInstraction(OprationCodes.ADDI, Bytes())
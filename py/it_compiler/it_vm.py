@@ -1,103 +1,481 @@
-from it_compiler.it_code import Bytes, ByteCode, OprationCodes, Sizes
+from it_compiler.it_code import Bytes, ByteCode, FuncCode, OprationCodes, Natives
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+Handler = Callable[[int], int] # 预解码后的指令，参数是当前指令的下标，返回下一条指令的下标，-1 表示结束
+Value = Union[int, FuncCode] # 整数、布尔值（1 和 0）或函数
 
 class VM:
+    '''
+    操作数栈 stack 是整数列表，每个元素一个字，压栈、弹栈都是 O(1)；整数不限位数，和解释器一样有负数
+    函数值是 FuncCode 对象：Python 对它做算术、比大小时抛出 TypeError，处理器捕获后按解释器的格式报错，整数运算没有额外开销；== 和 != 不会抛出，要检查类型
+    调用栈 frames 的每个栈帧是 (返回后执行的指令, 返回地址, 基址, 局部变量)，基址是调用时操作数栈的大小
+    code、ip、locals 是正在执行的函数的指令、程序计数器和局部变量
+    step 每次解码、执行一条指令；run 先把顶层代码和所有函数一次性解码为 Handler 列表，再在一个循环中执行到结束
+    '''
     def __init__(self, bytecode:ByteCode) -> None:
         self.bytecode = bytecode
-        self.stack:Bytes = Bytes()
+        self.stack:List[Value] = [] # 操作数栈
+        self.code:Bytes = bytecode.instrctions
         self.ip:int = 0 # 程序计数器
+        self.globals:List[Optional[Value]] = [None] * len(bytecode.globalNames) # 全局变量，None 表示尚未定义
+        self.locals:List[Value] = [0] * bytecode.localCount # 局部变量
+        self.frames:List[Tuple[Bytes, int, int, List[Value]]] = [] # 调用栈
+        self.natives:List[Callable[[List[Value]], Value]] = [VM._println] # 内置函数，下标见 Natives
+        self.program:Optional[List[Handler]] = None # run 使用的预解码指令
+        self.indexes:Dict[int, int] = dict() # 顶层代码的地址到 program 下标
     def hasNext(self) -> bool:
-        return self.ip < len(self.bytecode.instrctions)
+        return self.ip < len(self.code)
     def step(self) -> None:
-        opCode = self.bytecode.instrctions[self.ip]
+        opCode = self.code[self.ip]
         if opCode == OprationCodes.NOOP.code: # noop
             self.ip += OprationCodes.NOOP.length
         elif opCode == OprationCodes.LOADI.code: # loadi
-            constIndex = self.bytecode.instrctions.readInt(self.ip+1, OprationCodes.LOADI.operandNumber)
-            constValue = self.bytecode.constPool.readInt(constIndex, Sizes.I)
-            self.stack.pushInt(constValue, Sizes.I)
+            constIndex = self.code.readInt(self.ip+1, OprationCodes.LOADI.operandNumber)
+            constValue = self.bytecode.constPool[constIndex]
+            self.stack.append(constValue)
             self.ip += OprationCodes.LOADI.length
         elif opCode == OprationCodes.ADDI.code: # addi
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(left + right, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            try:
+                self.stack.append(left + right)
+            except TypeError:
+                raise VM._invalid("+", left, right)
             self.ip += OprationCodes.ADDI.length
         elif opCode == OprationCodes.SUBI.code: # subi
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(left - right, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            try:
+                self.stack.append(left - right)
+            except TypeError:
+                raise VM._invalid("-", left, right)
             self.ip += OprationCodes.SUBI.length
         elif opCode == OprationCodes.MULI.code: # muli
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(left * right, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            try:
+                self.stack.append(left * right)
+            except TypeError:
+                raise VM._invalid("*", left, right)
             self.ip += OprationCodes.MULI.length
         elif opCode == OprationCodes.DIVI.code: # divi
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(left // right, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            try:
+                self.stack.append(left // right)
+            except TypeError:
+                raise VM._invalid("/", left, right)
             self.ip += OprationCodes.DIVI.length
         elif opCode == OprationCodes.POPI.code: # popi
-            self.stack.popInt(Sizes.I)
+            self.stack.pop()
             self.ip += OprationCodes.POPI.length
         elif opCode == OprationCodes.PUSHBT.code: # pushbt
-            self.stack.pushInt(1, Sizes.I)
+            self.stack.append(1)
             self.ip += OprationCodes.PUSHBT.length
         elif opCode == OprationCodes.PUSHBF.code: # pushbf
-            self.stack.pushInt(0, Sizes.I)
+            self.stack.append(0)
             self.ip += OprationCodes.PUSHBF.length
         elif opCode == OprationCodes.EQI.code: # eq
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(1 if left == right else 0, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            if type(left) is FuncCode or type(right) is FuncCode:
+                raise VM._invalid("==", left, right)
+            self.stack.append(1 if left == right else 0)
             self.ip += OprationCodes.EQI.length
         elif opCode == OprationCodes.NEQI.code: # neq
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(1 if left != right else 0, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            if type(left) is FuncCode or type(right) is FuncCode:
+                raise VM._invalid("!=", left, right)
+            self.stack.append(1 if left != right else 0)
             self.ip += OprationCodes.NEQI.length
         elif opCode == OprationCodes.GTI.code: # gt
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(1 if left > right else 0, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            try:
+                self.stack.append(1 if left > right else 0)
+            except TypeError:
+                raise VM._invalid(">", left, right)
             self.ip += OprationCodes.GTI.length
         elif opCode == OprationCodes.GTEI.code: # gte
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(1 if left >= right else 0, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            try:
+                self.stack.append(1 if left >= right else 0)
+            except TypeError:
+                raise VM._invalid(">=", left, right)
             self.ip += OprationCodes.GTEI.length
         elif opCode == OprationCodes.LTI.code: # lt
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(1 if left < right else 0, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            try:
+                self.stack.append(1 if left < right else 0)
+            except TypeError:
+                raise VM._invalid("<", left, right)
             self.ip += OprationCodes.LTI.length
         elif opCode == OprationCodes.LTEI.code: # lte
-            right = self.stack.popInt(Sizes.I)
-            left = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(1 if left <= right else 0, Sizes.I)
+            right = self.stack.pop()
+            left = self.stack.pop()
+            try:
+                self.stack.append(1 if left <= right else 0)
+            except TypeError:
+                raise VM._invalid("<=", left, right)
             self.ip += OprationCodes.LTEI.length
         elif opCode == OprationCodes.MINUSI.code: # minus
-            val = self.stack.popInt(Sizes.I)
-            self.stack.pushInt(-val, Sizes.I)
+            val = self.stack.pop()
+            try:
+                self.stack.append(-val)
+            except TypeError:
+                raise VM._invalid("-", val)
             self.ip += OprationCodes.MINUSI.length
         elif opCode == OprationCodes.BANGB.code: # bang
-            val = self.stack.popInt(Sizes.I)
+            val = self.stack.pop()
             if val != 0 and val != 1:
                 raise Exception(f"BANGB cannot operate on {val}")
-            self.stack.pushInt(1 - val, Sizes.I)
+            self.stack.append(1 - val)
             self.ip += OprationCodes.BANGB.length
         elif opCode == OprationCodes.JUMP.code:
-            addr = self.bytecode.instrctions.readInt(self.ip+1, OprationCodes.JUMP.operandNumber)
+            addr = self.code.readInt(self.ip+1, OprationCodes.JUMP.operandNumber)
             self.ip = addr
         elif opCode == OprationCodes.JUMPF.code:
-            val = self.stack.popInt(Sizes.I)
+            val = self.stack.pop()
             if val != 0 and val != 1:
-                raise Exception(f"BANGB cannot operate on {val}")
+                raise Exception(f"JUMPF cannot operate on {val}")
             if val == 0:
-                addr = self.bytecode.instrctions.readInt(self.ip+1, OprationCodes.JUMPF.operandNumber)
+                addr = self.code.readInt(self.ip+1, OprationCodes.JUMPF.operandNumber)
                 self.ip = addr
             else:
                 self.ip += OprationCodes.JUMPF.length
+        elif opCode == OprationCodes.LOADG.code: # loadg
+            slot = self.code.readInt(self.ip+1, OprationCodes.LOADG.operandNumber)
+            val = self.globals[slot]
+            if val is None:
+                raise Exception(f"undefined {self.bytecode.globalNames[slot]}")
+            self.stack.append(val)
+            self.ip += OprationCodes.LOADG.length
+        elif opCode == OprationCodes.STOREG.code: # storeg
+            slot = self.code.readInt(self.ip+1, OprationCodes.STOREG.operandNumber)
+            if self.globals[slot] is None:
+                raise Exception(f"undefined {self.bytecode.globalNames[slot]}")
+            self.globals[slot] = self.stack.pop()
+            self.ip += OprationCodes.STOREG.length
+        elif opCode == OprationCodes.DEFG.code: # defg
+            slot = self.code.readInt(self.ip+1, OprationCodes.DEFG.operandNumber)
+            self.globals[slot] = self.stack.pop()
+            self.ip += OprationCodes.DEFG.length
+        elif opCode == OprationCodes.LOADL.code: # loadl
+            slot = self.code.readInt(self.ip+1, OprationCodes.LOADL.operandNumber)
+            self.stack.append(self.locals[slot])
+            self.ip += OprationCodes.LOADL.length
+        elif opCode == OprationCodes.STOREL.code: # storel
+            slot = self.code.readInt(self.ip+1, OprationCodes.STOREL.operandNumber)
+            self.locals[slot] = self.stack.pop()
+            self.ip += OprationCodes.STOREL.length
+        elif opCode == OprationCodes.LOADF.code: # loadf
+            index = self.code.readInt(self.ip+1, OprationCodes.LOADF.operandNumber)
+            self.stack.append(self.bytecode.functions[index])
+            self.ip += OprationCodes.LOADF.length
+        elif opCode == OprationCodes.CALL.code: # call
+            argumentNumber = self.code.readInt(self.ip+1, OprationCodes.CALL.operandNumber)
+            arguments = [self.stack.pop() for _ in range(argumentNumber)]
+            arguments.reverse()
+            function = self.stack.pop()
+            if type(function) is not FuncCode:
+                raise Exception(f"{function} is not a function")
+            if argumentNumber < function.parameterCount:
+                raise Exception(f"{function} expects {function.parameterCount} arguments, got {argumentNumber}")
+            locals = arguments[:function.parameterCount] + [0] * (function.localCount - function.parameterCount) # 多余的实参丢弃
+            self.frames.append((self.code, self.ip + OprationCodes.CALL.length, len(self.stack), self.locals))
+            self.code = function.instrctions
+            self.ip = 0
+            self.locals = locals
+        elif opCode == OprationCodes.CALLN.code: # calln
+            index = self.code[self.ip+1]
+            argumentNumber = self.code[self.ip+2]
+            arguments = [self.stack.pop() for _ in range(argumentNumber)]
+            arguments.reverse()
+            self.stack.append(self.natives[index](arguments))
+            self.ip += OprationCodes.CALLN.length
+        elif opCode == OprationCodes.RET.code: # ret
+            val = self.stack.pop()
+            if len(self.frames) == 0: # 顶层 return，结束执行
+                self.stack.append(val)
+                self.ip = len(self.code)
+                return
+            self.code, self.ip, base, self.locals = self.frames.pop()
+            if len(self.stack) > base:
+                del self.stack[base:]
+            self.stack.append(val)
         else:
             raise Exception(f"unknown operation code {opCode}")
+    def run(self) -> None: # 从当前位置执行到结束，结果和反复调用 step 相同
+        if len(self.frames) > 0:
+            raise Exception("cannot run inside a function, use step")
+        if self.program is None:
+            self.program = self._decode()
+        if not self.hasNext():
+            return
+        program = self.program
+        pc = self.indexes[self.ip]
+        while pc >= 0:
+            pc = program[pc](pc)
+        self.ip = len(self.code)
+    def _decode(self) -> List[Handler]:
+        '''
+        把顶层代码和所有函数解码到一个列表中：顶层代码，HALT，函数 0，函数 1 ...
+        操作数、常量在解码时取出，跳转地址换算为列表下标，CALL 直接跳到函数的第一条指令
+        run 中的栈帧是 (返回下标, 基址, 局部变量)
+        '''
+        bytecode = self.bytecode
+        codes = [bytecode.instrctions] + [function.instrctions for function in bytecode.functions]
+        indexes:List[Dict[int, int]] = [] # 每段代码的地址到下标
+        count = 0
+        for i, code in enumerate(codes):
+            index:Dict[int, int] = dict()
+            address = 0
+            while address < len(code):
+                index[address] = count
+                count += 1
+                address += OprationCodes._INDEXES[code[address]].length
+            index[address] = count # 跳转到代码末尾，顶层代码是 HALT
+            if i == 0:
+                count += 1
+            indexes.append(index)
+        self.indexes = indexes[0]
+        entries:Dict[FuncCode, int] = {function:index[0] for function, index in zip(bytecode.functions, indexes[1:])} # 函数的第一条指令
+
+        vm = self
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        globals = self.globals
+        names = bytecode.globalNames
+        functions = bytecode.functions
+        frames = self.frames
+        natives = self.natives
+        # 没有操作数的指令
+        def noop(pc:int) -> int:
+            return pc + 1
+        def addi(pc:int) -> int:
+            right = pop()
+            try:
+                stack[-1] += right
+            except TypeError:
+                raise VM._invalid("+", stack[-1], right)
+            return pc + 1
+        def subi(pc:int) -> int:
+            right = pop()
+            try:
+                stack[-1] -= right
+            except TypeError:
+                raise VM._invalid("-", stack[-1], right)
+            return pc + 1
+        def muli(pc:int) -> int:
+            right = pop()
+            try:
+                stack[-1] *= right
+            except TypeError:
+                raise VM._invalid("*", stack[-1], right)
+            return pc + 1
+        def divi(pc:int) -> int:
+            right = pop()
+            try:
+                stack[-1] //= right
+            except TypeError:
+                raise VM._invalid("/", stack[-1], right)
+            return pc + 1
+        def popi(pc:int) -> int:
+            pop()
+            return pc + 1
+        def pushbt(pc:int) -> int:
+            push(1)
+            return pc + 1
+        def pushbf(pc:int) -> int:
+            push(0)
+            return pc + 1
+        def eqi(pc:int) -> int:
+            right = pop()
+            left = stack[-1]
+            if type(left) is FuncCode or type(right) is FuncCode:
+                raise VM._invalid("==", left, right)
+            stack[-1] = 1 if left == right else 0
+            return pc + 1
+        def neqi(pc:int) -> int:
+            right = pop()
+            left = stack[-1]
+            if type(left) is FuncCode or type(right) is FuncCode:
+                raise VM._invalid("!=", left, right)
+            stack[-1] = 1 if left != right else 0
+            return pc + 1
+        def gti(pc:int) -> int:
+            right = pop()
+            try:
+                stack[-1] = 1 if stack[-1] > right else 0
+            except TypeError:
+                raise VM._invalid(">", stack[-1], right)
+            return pc + 1
+        def gtei(pc:int) -> int:
+            right = pop()
+            try:
+                stack[-1] = 1 if stack[-1] >= right else 0
+            except TypeError:
+                raise VM._invalid(">=", stack[-1], right)
+            return pc + 1
+        def lti(pc:int) -> int:
+            right = pop()
+            try:
+                stack[-1] = 1 if stack[-1] < right else 0
+            except TypeError:
+                raise VM._invalid("<", stack[-1], right)
+            return pc + 1
+        def ltei(pc:int) -> int:
+            right = pop()
+            try:
+                stack[-1] = 1 if stack[-1] <= right else 0
+            except TypeError:
+                raise VM._invalid("<=", stack[-1], right)
+            return pc + 1
+        def minusi(pc:int) -> int:
+            try:
+                stack[-1] = -stack[-1]
+            except TypeError:
+                raise VM._invalid("-", stack[-1])
+            return pc + 1
+        def bangb(pc:int) -> int:
+            val = stack[-1]
+            if val != 0 and val != 1:
+                raise Exception(f"BANGB cannot operate on {val}")
+            stack[-1] = 1 - val
+            return pc + 1
+        def ret(pc:int) -> int:
+            val = pop()
+            if len(frames) == 0: # 顶层 return，结束执行
+                push(val)
+                return -1
+            pc, base, vm.locals = frames.pop()
+            if len(stack) > base:
+                del stack[base:]
+            push(val)
+            return pc
+        def halt(pc:int) -> int:
+            return -1
+        # 有操作数的指令，每条指令一个闭包
+        def loadi(constIndex:int) -> Handler:
+            value = bytecode.constPool[constIndex]
+            def handler(pc:int) -> int:
+                push(value)
+                return pc + 1
+            return handler
+        def jump(target:int) -> Handler:
+            def handler(pc:int) -> int:
+                return target
+            return handler
+        def jumpf(target:int) -> Handler:
+            def handler(pc:int) -> int:
+                val = pop()
+                if val == 0:
+                    return target
+                if val == 1:
+                    return pc + 1
+                raise Exception(f"JUMPF cannot operate on {val}")
+            return handler
+        def loadg(slot:int) -> Handler:
+            def handler(pc:int) -> int:
+                val = globals[slot]
+                if val is None:
+                    raise Exception(f"undefined {names[slot]}")
+                push(val)
+                return pc + 1
+            return handler
+        def storeg(slot:int) -> Handler:
+            def handler(pc:int) -> int:
+                if globals[slot] is None:
+                    raise Exception(f"undefined {names[slot]}")
+                globals[slot] = pop()
+                return pc + 1
+            return handler
+        def defg(slot:int) -> Handler:
+            def handler(pc:int) -> int:
+                globals[slot] = pop()
+                return pc + 1
+            return handler
+        def loadl(slot:int) -> Handler:
+            def handler(pc:int) -> int:
+                push(vm.locals[slot])
+                return pc + 1
+            return handler
+        def storel(slot:int) -> Handler:
+            def handler(pc:int) -> int:
+                vm.locals[slot] = pop()
+                return pc + 1
+            return handler
+        def loadf(index:int) -> Handler:
+            function = functions[index]
+            def handler(pc:int) -> int:
+                push(function)
+                return pc + 1
+            return handler
+        def call(argumentNumber:int) -> Handler:
+            def handler(pc:int) -> int:
+                arguments = stack[len(stack) - argumentNumber:]
+                del stack[len(stack) - argumentNumber:]
+                function = pop()
+                if type(function) is not FuncCode:
+                    raise Exception(f"{function} is not a function")
+                if argumentNumber < function.parameterCount:
+                    raise Exception(f"{function} expects {function.parameterCount} arguments, got {argumentNumber}")
+                frames.append((pc + 1, len(stack), vm.locals))
+                vm.locals = arguments[:function.parameterCount] + [0] * (function.localCount - function.parameterCount) # 多余的实参丢弃
+                return entries[function]
+            return handler
+        def calln(operand:int) -> Handler:
+            native = natives[operand // 256]
+            argumentNumber = operand % 256
+            def handler(pc:int) -> int:
+                arguments = stack[len(stack) - argumentNumber:]
+                del stack[len(stack) - argumentNumber:]
+                push(native(arguments))
+                return pc + 1
+            return handler
+        simples:Dict[int, Handler] = {OprationCodes.NOOP.code:noop, OprationCodes.ADDI.code:addi, OprationCodes.SUBI.code:subi,
+            OprationCodes.MULI.code:muli, OprationCodes.DIVI.code:divi, OprationCodes.POPI.code:popi, OprationCodes.PUSHBT.code:pushbt,
+            OprationCodes.PUSHBF.code:pushbf, OprationCodes.EQI.code:eqi, OprationCodes.NEQI.code:neqi, OprationCodes.GTI.code:gti,
+            OprationCodes.GTEI.code:gtei, OprationCodes.LTI.code:lti, OprationCodes.LTEI.code:ltei, OprationCodes.MINUSI.code:minusi,
+            OprationCodes.BANGB.code:bangb, OprationCodes.RET.code:ret}
+        factories:Dict[int, Callable[[int], Handler]] = {OprationCodes.LOADI.code:loadi, OprationCodes.JUMP.code:jump,
+            OprationCodes.JUMPF.code:jumpf, OprationCodes.LOADG.code:loadg, OprationCodes.STOREG.code:storeg, OprationCodes.DEFG.code:defg,
+            OprationCodes.LOADL.code:loadl, OprationCodes.STOREL.code:storel, OprationCodes.LOADF.code:loadf, OprationCodes.CALL.code:call,
+            OprationCodes.CALLN.code:calln}
+
+        program:List[Handler] = []
+        for i, code in enumerate(codes):
+            address = 0
+            while address < len(code):
+                opCode = code[address]
+                op = OprationCodes._INDEXES[opCode]
+                if opCode in simples:
+                    program.append(simples[opCode])
+                elif opCode in factories:
+                    operand = code.readInt(address+1, op.operandNumber)
+                    if opCode == OprationCodes.JUMP.code or opCode == OprationCodes.JUMPF.code:
+                        operand = indexes[i][operand] # 地址换算为下标
+                    program.append(factories[opCode](operand))
+                else:
+                    raise Exception(f"unknown operation code {opCode}")
+                address += op.length
+            if i == 0:
+                program.append(halt)
+        return program
+    @staticmethod
+    def _invalid(operator:str, *operands:Value) -> Exception: # 和解释器的 operation 报错格式一致
+        if len(operands) == 1:
+            return Exception(f"invalid operation {operator} on {operands[0]}")
+        return Exception(f"invalid operation {operands[0]} {operator} {operands[1]}")
+    @staticmethod
+    def _println(arguments:List[Value]) -> Value: # 和解释器一样只输出、返回第一个实参
+        if len(arguments) == 0:
+            raise Exception(f"{Natives.NAMES[Natives.PRINTLN]} expects 1 arguments, got 0")
+        print(arguments[0])
+        return arguments[0]
     def __str__(self) -> str:
-        return f"[it_VM] ip:{self.ip}\nstack:{self.stack}"
+        return f"[it_VM] ip:{self.ip}\nstack:{self.stack}\nglobals:{self.globals} locals:{self.locals}"
@@ -2,6 +2,14 @@ from . import it_token
 from . import it_tokenizer
 from . import it_ast
 from . import it_prority
+from . import it_tokentable
+from . import it_pratt
 from . import it_parser
 from . import it_object
-from . import it_evaluator
\ No newline at end of file
+from . import it_evaluator
+from . import it_stackeval
+from . import it_memo
+from . import it_optimizer
+from . import it_closure
+from . import it_serializer
+from . import it_cache
\ No newline at end of file
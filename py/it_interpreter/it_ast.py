@@ -23,10 +23,12 @@ BoolLiteral 布尔字面量
 IntegerLiteral 整数字面量
 FuncLiteral 函数字面量 fn(Identifier...){block}
 FuncCaller 函数调用，包括普通的 id(expr...) 和立即函数 FuncLiteral(expr...)
+
+所有节点都使用 __slots__，类属性 kind 是节点种类编号 NodeKinds
 '''
-from it_interpreter.it_token import Token, TokenTypes, TokenType
-from typing import List, Union, TypeVar, Type
-import functools
+from it_interpreter.it_token import Token, TokenTypes, TokenType, FixedTokenMap, SymbolTable
+from typing import Any, Callable, Iterator, List, Optional, Union, TypeVar, Type
+import io
 
 class NodeType(str):
     pass
@@ -50,17 +52,44 @@ class NodeTypes:
     BINARY_EXPRESSION = NodeType("BINARY-EXPRESSION") # 二元运算表达式
     FUNC_CALLER_EXPRESSION = NodeType("FUNC-CALLER-EXPRESSION") # 函数调用表达式
 
+class NodeKinds:
+    '''
+    节点种类编号，与 NodeTypes 一一对应
+    从 0 开始连续编号，可以直接作为分派表的下标，见 Evaluator/Compiler
+    '''
+    EMPTY_STATEMENT = 0
+    ASSIGN_STATEMENT = 1
+    LET_STATEMENT = 2
+    RETURN_STATEMENT = 3
+    EXPRESSION_STATEMENT = 4
+    IF_STATEMENT = 5
+    WHILE_STATEMENT = 6
+    BLOCK_STATEMENT = 7
+    PROGRAM_STATEMENT = 8
+
+    IDENTIFIER_EXPRESSION = 9
+    INTEGER_LITERAL_EXPRESSION = 10
+    BOOL_LITERAL_EXPRESSION = 11
+    FUNC_LITERAL_EXPRESSION = 12
+    PREFIX_EXPRESSION = 13
+    BINARY_EXPRESSION = 14
+    FUNC_CALLER_EXPRESSION = 15
+
+    COUNT = 16
+
 class Node:
     T = TypeVar("T")
     '''
     AST 所有的节点抽象
     '''
-    def tokens(self)->List[Token]:
-        raise NotImplemented
+    __slots__ = ()
+    kind = -1 # 节点种类 NodeKinds，由子类覆盖
+    def tokens(self)->List[Token]: # 节点对应的 token 序列，见 AstWriter
+        return list(AstWriter.iterTokens(self))
     def nodeType(self)->NodeType:
         raise NotImplemented
     def __str__(self) -> str:
-        return " ".join((t.__repr__() for t in self.tokens()))
+        return AstWriter.toString(self)
     def __repr__(self) -> str:
         return str(self)
     def treatAs(self, hint:Type[T])->T: # ide-friendly
@@ -71,36 +100,46 @@ class Node:
 
 
 class Statement(Node):
-    pass
+    __slots__ = ()
 
 class Expression(Node):
-    pass
+    __slots__ = ()
 
 class Block(Statement):
     '''
     代码块
+    declares 表示代码块直接包含 let 语句，不声明变量的代码块执行时不需要新的栈帧
     '''
+    __slots__ = ("_statements", "declares")
+    kind = NodeKinds.BLOCK_STATEMENT
     def __init__(self) -> None:
         super().__init__()
         self._statements:List[Statement] = []
+        self.declares = False
     def nodeType(self)->NodeType:
         return NodeTypes.BLOCK_STATEMENT
     def addStatement(self, s:Statement)->None:
         self._statements.append(s)
+        if s.kind == NodeKinds.LET_STATEMENT:
+            self.declares = True
+    def setStatements(self, statements:List[Statement])->None: # 替换全部语句
+        self._statements = statements
+        self.declares = any(s.kind == NodeKinds.LET_STATEMENT for s in statements)
     def statements(self)->List[Statement]:
         return self._statements
-    def tokens(self)->List[Token]:
-        return [Token(TokenTypes.L_BRACE)] + functools.reduce(lambda a,b:a+b, (s.tokens() for s in self.statements()),[]) + [Token(TokenTypes.R_BRACE)]
 
 class Program(Block):
     '''
     程序，AST 的根节点，就是一个代码块
+    symbols 是解析时使用的符号表，标识符的 symbolId 即其中的编号
     '''
-    def __init__(self, block:Block) -> None:
+    __slots__ = ("symbols",)
+    kind = NodeKinds.PROGRAM_STATEMENT
+    def __init__(self, block:Block, symbols:Optional[SymbolTable] = None) -> None:
         super().__init__()
         self._statements.extend(block.statements())
-    def tokens(self)->List[Token]:
-        return functools.reduce(lambda a,b:a+b, (s.tokens() for s in self.statements()),[])
+        self.declares = block.declares
+        self.symbols = symbols if symbols is not None else SymbolTable()
     def nodeType(self)->NodeType:
         return NodeTypes.PROGRAM_STATEMENT
 
@@ -109,6 +148,8 @@ class PrefixExpression(Expression):
     '''
     前缀表达式
     '''
+    __slots__ = ("prefixToken", "_expression")
+    kind = NodeKinds.PREFIX_EXPRESSION
     def __init__(self, prefixToken:Token, expression:Expression) -> None:
         super().__init__()
         self.prefixToken = prefixToken
@@ -119,77 +160,87 @@ class PrefixExpression(Expression):
         return self._expression
     def nodeType(self)->NodeType:
         return NodeTypes.PREFIX_EXPRESSION
-    def tokens(self)->List[Token]:
-        return [Token(TokenTypes.L_PAREN)] + [self.prefixToken] + self.rawExpression().tokens() + [Token(TokenTypes.R_PAREN)] 
     
 
 class IdentifierNode(Expression):
     '''
     标识符节点，表达式的一种，但是也可以当作左值
     '''
+    __slots__ = ("token", "cacheVersion", "cacheBinding")
+    kind = NodeKinds.IDENTIFIER_EXPRESSION
     def __init__(self, t:Token) -> None:
         self.token = t.checkTokenType(TokenTypes.IDENTIFIER)
         super().__init__()
+        # 内联缓存，由求值器维护：环境版本号和名字的绑定栈
+        self.cacheVersion:int = 0
+        self.cacheBinding:Optional[List[List]] = None
     def name(self)->str:
         return self.token.literal
+    def symbolId(self)->int: # 符号表中的编号，-1 表示未登记
+        return self.token.symbolId
     def nodeType(self)->NodeType:
         return NodeTypes.IDENTIFIER_EXPRESSION
-    def tokens(self)->List[Token]:
-        return [self.token]
 
 class IntegerLiteral(Expression):
     '''
     整数字面量
+    constant 是解释器第一次求值时创建的值对象（见 it_object），之后直接复用
     '''
+    __slots__ = ("token", "constant")
+    kind = NodeKinds.INTEGER_LITERAL_EXPRESSION
     def __init__(self, token:Token) -> None:
         super().__init__()
         self.token = token.checkTokenType(TokenTypes.INTEGER)
+        self.constant:Any = None
     def integerValue(self)->int:
         return int(self.token.literal)
     def nodeType(self)->NodeType:
         return NodeTypes.INTEGER_LITERAL_EXPRESSION
-    def tokens(self)->List[Token]:
-        return [self.token]
 
 class BoolLiteral(Expression):
     '''
     布尔字面量
+    constant 同 IntegerLiteral
     '''
+    __slots__ = ("token", "constant")
+    kind = NodeKinds.BOOL_LITERAL_EXPRESSION
     def __init__(self, token:Token) -> None:
         super().__init__()
         if token.tokenType != TokenTypes.KW_TRUE and token.tokenType != TokenTypes.KW_FALSE:
             raise Exception(f"{token} is not boolean")
         self.token = token
+        self.constant:Any = None
     def boolValue(self)->bool:
         return self.token.tokenType == TokenTypes.KW_TRUE
     def nodeType(self)->NodeType:
         return NodeTypes.BOOL_LITERAL_EXPRESSION
-    def tokens(self)->List[Token]:
-        return [self.token]
     
 class FuncLiteral(Expression):
     '''
     函数字面量
+    预解析模式下 body 为 None，函数体只记录了 token 范围，由 bodyParser 在第一次取 body 时解析并缓存
     '''
-    def __init__(self, identifiers:List[IdentifierNode], body:Block) -> None:
+    __slots__ = ("_parameters", "_parameterNames", "_body", "_bodyParser")
+    kind = NodeKinds.FUNC_LITERAL_EXPRESSION
+    def __init__(self, identifiers:List[IdentifierNode], body:Optional[Block], bodyParser:Optional[Callable[[], Block]] = None) -> None:
         super().__init__()
         self._parameters = identifiers
+        self._parameterNames = [id.name() for id in identifiers]
         self._body = body
+        self._bodyParser = bodyParser
     def nodeType(self)->NodeType:
         return NodeTypes.FUNC_LITERAL_EXPRESSION
     def parameters(self)->List[IdentifierNode]:
         return self._parameters
     def parameterNames(self)->List[str]:
-        return [id.name() for id in self._parameters]
+        return self._parameterNames
     def body(self)->Block:
+        if self._body is None: # 延迟解析的函数体
+            self._body = self._bodyParser()
+            self._bodyParser = None
+        return self._body
+    def parsedBody(self)->Optional[Block]: # 已解析的函数体，尚未解析时返回 None
         return self._body
-    def tokens(self)->List[Token]:
-        ts = [Token(TokenTypes.KW_FUNC), Token(TokenTypes.L_PAREN)] # fn(
-        [ts.extend(id.tokens() + [Token(TokenTypes.COMMA)]) for id in self.parameters()] if len(self.parameters()) > 0 else None
-        ts.pop() if len(self.parameters()) > 0 else None
-        ts.append(Token(TokenTypes.R_PAREN)) # )
-        ts.extend(self.body().tokens()) # block
-        return ts
 
 
 class FuncCaller(Expression):
@@ -197,29 +248,30 @@ class FuncCaller(Expression):
     函数调用
     分为 IdentifierNode(expr...) 和 FuncLiteral(expr...) 两种
     '''
+    __slots__ = ("_callee", "_arguments", "cacheFunc", "cacheParameters", "cachePrintln")
+    kind = NodeKinds.FUNC_CALLER_EXPRESSION
     def __init__(self, callee:Union[IdentifierNode, FuncLiteral], arguments:List[Expression]) -> None:
         super().__init__()
         self._callee = callee
         self._arguments = arguments
+        # 内联缓存，由求值器维护：上次调用的函数对象及其形参，是否调用内置函数 println
+        self.cacheFunc:Any = None
+        self.cacheParameters:List[str] = []
+        self.cachePrintln:Optional[bool] = None
     def callee(self)->Union[IdentifierNode, FuncLiteral]:
         return self._callee
     def arguments(self)->List[Expression]:
         return self._arguments
     def nodeType(self)->NodeType:
         return NodeTypes.FUNC_CALLER_EXPRESSION
-    def tokens(self)->List[Token]:
-        ts = self.callee().tokens()
-        ts.append(Token(TokenTypes.L_PAREN)) # (
-        [ts.extend(a.tokens() + [Token(TokenTypes.COMMA)]) for a in self.arguments()] if len(self.arguments()) > 0 else None
-        ts.pop() if len(self.arguments()) > 0 else None
-        ts.append(Token(TokenTypes.R_PAREN)) # )
-        return ts
 
 
 class BinaryOperatorExpression(Expression):
     '''
     二元运算表达式
     '''
+    __slots__ = ("_left", "_operator", "_right")
+    kind = NodeKinds.BINARY_EXPRESSION
     def __init__(self, left:Expression, operator:Token, right:Expression) -> None:
         super().__init__()
         self._left = left
@@ -235,24 +287,24 @@ class BinaryOperatorExpression(Expression):
         return self._operator.tokenType
     def nodeType(self)->NodeType:
         return NodeTypes.BINARY_EXPRESSION
-    def tokens(self)->List[Token]:
-        return [Token(TokenTypes.L_PAREN)] +  self.left().tokens() + [self.operator()] + self.right().tokens() + [Token(TokenTypes.R_PAREN)]
 
 class EmptyStatement(Statement):
     '''
     空语句
     '''
+    __slots__ = ()
+    kind = NodeKinds.EMPTY_STATEMENT
     def __init__(self) -> None:
         super().__init__()
     def nodeType(self)->NodeType:
         return NodeTypes.EMPTY_STATEMENT
-    def tokens(self)->List[Token]: # ;
-        return [Token(TokenTypes.SEMICOLON)]
 
 class ExpressionStatement(Statement):
     '''
     表达式语句
     '''
+    __slots__ = ("_expression",)
+    kind = NodeKinds.EXPRESSION_STATEMENT
     def __init__(self, expression:Expression) -> None:
         super().__init__()
         self._expression = expression
@@ -260,16 +312,13 @@ class ExpressionStatement(Statement):
         return self._expression
     def nodeType(self)->NodeType:
         return NodeTypes.EXPRESSION_STATEMENT
-    def tokens(self)->List[Token]: # let id = (expr);
-        expr = self._expression.tokens()
-        if expr[0].tokenType == TokenTypes.L_PAREN and expr[-1].tokenType == TokenTypes.R_PAREN:
-            expr = expr[1:-1]
-        return expr + [Token(TokenTypes.SEMICOLON)]
 
 class AssignStatement(Statement):
     '''
     赋值语句
     '''
+    __slots__ = ("_identifier", "_expression")
+    kind = NodeKinds.ASSIGN_STATEMENT
     def __init__(self, identifier:IdentifierNode, expression:Expression) -> None:
         super().__init__()
         self._identifier = identifier
@@ -280,16 +329,13 @@ class AssignStatement(Statement):
         return self._identifier
     def expression(self)->Expression:
         return self._expression
-    def tokens(self)->List[Token]: # id = (expr);
-        expr = self._expression.tokens()
-        if expr[0].tokenType == TokenTypes.L_PAREN and expr[-1].tokenType == TokenTypes.R_PAREN:
-            expr = expr[1:-1]
-        return self._identifier.tokens() + [Token(TokenTypes.OP_ASSIGN)] + expr + [Token(TokenTypes.SEMICOLON)]
     
 class LetStatement(Statement):
     '''
     LET 语句
     '''
+    __slots__ = ("_identifier", "_expression")
+    kind = NodeKinds.LET_STATEMENT
     def __init__(self, identifier:IdentifierNode, expression:Expression) -> None:
         super().__init__()
         self._identifier = identifier
@@ -300,17 +346,13 @@ class LetStatement(Statement):
         return self._identifier
     def expression(self)->Expression:
         return self._expression
-    def tokens(self)->List[Token]: # let id = (expr);
-        expr = self._expression.tokens()
-        if expr[0].tokenType == TokenTypes.L_PAREN and expr[-1].tokenType == TokenTypes.R_PAREN:
-            expr = expr[1:-1]
-        return [Token(TokenTypes.KW_LET)] + self._identifier.tokens() \
-              + [Token(TokenTypes.OP_ASSIGN)] + expr + [Token(TokenTypes.SEMICOLON)]
 
 class ReturnStatement(Statement):
     '''
     RETURN 语句
     '''
+    __slots__ = ("_expression",)
+    kind = NodeKinds.RETURN_STATEMENT
     def __init__(self, expression:Expression) -> None:
         super().__init__()
         self._expression = expression
@@ -318,17 +360,14 @@ class ReturnStatement(Statement):
         return NodeTypes.RETURN_STATEMENT
     def expression(self)->Expression:
         return self._expression
-    def tokens(self)->List[Token]: # return (expr);
-        expr = self._expression.tokens()
-        if expr[0].tokenType == TokenTypes.L_PAREN and expr[-1].tokenType == TokenTypes.R_PAREN:
-            expr = expr[1:-1]
-        return [Token(TokenTypes.KW_RETURN)] + expr + [Token(TokenTypes.SEMICOLON)]
     
 class IfStatement(Statement):
     '''
     IF 语句 if (expt) {block} [else {block}]
     else 可选
     '''
+    __slots__ = ("_condition", "_consequence", "_alternative")
+    kind = NodeKinds.IF_STATEMENT
     def __init__(self, condition:Expression, consequence:Block, alternative:Block) -> None:
         super().__init__()
         self._condition = condition
@@ -342,20 +381,10 @@ class IfStatement(Statement):
         return self._consequence
     def alternative(self)->Block:
         return self._alternative
-    def tokens(self)->List[Token]: # if (expr) {block} else {block}
-        cond = self.condition().tokens()
-        if cond[0].tokenType == TokenTypes.L_PAREN and cond[-1].tokenType == TokenTypes.R_PAREN:
-            cond = cond[1:-1]
-
-        ts = [Token(TokenTypes.KW_IF), Token(TokenTypes.L_PAREN)] # if(
-        ts.extend(cond) # expr
-        ts.append(Token(TokenTypes.R_PAREN)) # )
-        ts.extend(self.consequence().tokens()) # block
-        ts.append(Token(TokenTypes.KW_ELSE)) # else
-        ts.extend(self.alternative().tokens()) # block
-        return ts
 
 class WhileStatement(Statement):
+    __slots__ = ("_condition", "_body")
+    kind = NodeKinds.WHILE_STATEMENT
     def __init__(self, condition:Expression, body:Block) -> None:
         super().__init__()
         self._condition = condition
@@ -366,17 +395,138 @@ class WhileStatement(Statement):
         return self._condition
     def body(self)->Block:
         return self._body
-    def tokens(self)->List[Token]: # while (expr) {block}
-        cond = self.condition().tokens()
-        if cond[0].tokenType == TokenTypes.L_PAREN and cond[-1].tokenType == TokenTypes.R_PAREN:
-            cond = cond[1:-1]
-
-        ts = [Token(TokenTypes.KW_WHILE), Token(TokenTypes.L_PAREN)] # while(
-        ts.extend(cond) # expr
-        ts.append(Token(TokenTypes.R_PAREN)) # )
-        ts.extend(self.body().tokens()) # block
-        return ts
-    
+
+
+class AstWriter:
+    '''
+    AST 输出，把节点还原为 token 序列，以空格分隔写入 out（io.StringIO 或文件）
+    显式栈单遍遍历，线性时间，不递归，任意深的 AST 都可以输出
+    二元、前缀表达式带括号；作为语句、if/while 条件时去掉最外层括号
+    '''
+    FLUSH_TOKENS = 4096 # 攒够这么多 token 写一次
+    _BARE_KINDS = (NodeKinds.BINARY_EXPRESSION, NodeKinds.PREFIX_EXPRESSION) # 去掉最外层括号的节点
+
+    def __init__(self, out:io.TextIOBase) -> None:
+        self.out = out
+        self.started = False # 已经写过 token，之后先写空格
+    def write(self, node:Node) -> None:
+        buffer:List[str] = []
+        for token in AstWriter.iterTokens(node):
+            buffer.append(token.__repr__())
+            if len(buffer) >= AstWriter.FLUSH_TOKENS:
+                self._writeTokens(buffer)
+                buffer.clear()
+        self._writeTokens(buffer)
+    def _writeTokens(self, reprs:List[str]) -> None:
+        if len(reprs) == 0:
+            return
+        if self.started:
+            self.out.write(" ")
+        self.out.write(" ".join(reprs))
+        self.started = True
+    @staticmethod
+    def toString(node:Node) -> str:
+        out = io.StringIO()
+        AstWriter(out).write(node)
+        return out.getvalue()
+
+    @staticmethod
+    def iterTokens(node:Node) -> Iterator[Token]:
+        '''
+        栈中是待输出的 Token、待展开的 Node，或者 (Node,) 表示展开时去掉最外层括号
+        子项逆序入栈，出栈顺序就是输出顺序
+        '''
+        L_PAREN, R_PAREN = FixedTokenMap[TokenTypes.L_PAREN], FixedTokenMap[TokenTypes.R_PAREN]
+        L_BRACE, R_BRACE = FixedTokenMap[TokenTypes.L_BRACE], FixedTokenMap[TokenTypes.R_BRACE]
+        SEMICOLON, COMMA, ASSIGN = FixedTokenMap[TokenTypes.SEMICOLON], FixedTokenMap[TokenTypes.COMMA], FixedTokenMap[TokenTypes.OP_ASSIGN]
+        bareKinds = AstWriter._BARE_KINDS
+        def bare(expression:Expression) -> Union[Expression, tuple]:
+            return (expression,) if expression.kind in bareKinds else expression
+        def pushList(items:List[Union[Node, tuple]], separator:Optional[Token]) -> None: # 逆序入栈，中间加分隔符
+            for i in range(len(items) - 1, -1, -1):
+                push(items[i])
+                if separator is not None and i > 0:
+                    push(separator)
+        stack:List[Union[Token, Node, tuple]] = [node]
+        push, pop = stack.append, stack.pop
+        while stack:
+            item = pop()
+            if isinstance(item, Token):
+                yield item
+                continue
+            parens = True
+            if isinstance(item, tuple):
+                item = item[0]
+                parens = False
+            kind = item.kind
+            if kind == NodeKinds.IDENTIFIER_EXPRESSION or kind == NodeKinds.INTEGER_LITERAL_EXPRESSION or kind == NodeKinds.BOOL_LITERAL_EXPRESSION:
+                yield item.token
+            elif kind == NodeKinds.BINARY_EXPRESSION: # (left op right)
+                if parens:
+                    push(R_PAREN)
+                push(item.right())
+                push(item.operator())
+                push(item.left())
+                if parens:
+                    push(L_PAREN)
+            elif kind == NodeKinds.PREFIX_EXPRESSION: # (op expr)
+                if parens:
+                    push(R_PAREN)
+                push(item.rawExpression())
+                push(item.prefixToken)
+                if parens:
+                    push(L_PAREN)
+            elif kind == NodeKinds.FUNC_CALLER_EXPRESSION: # callee(expr, ...)
+                push(R_PAREN)
+                pushList(item.arguments(), COMMA)
+                push(L_PAREN)
+                push(item.callee())
+            elif kind == NodeKinds.FUNC_LITERAL_EXPRESSION: # fn(id, ...) {block}
+                push(item.body())
+                push(R_PAREN)
+                pushList(item.parameters(), COMMA)
+                push(L_PAREN)
+                push(FixedTokenMap[TokenTypes.KW_FUNC])
+            elif kind == NodeKinds.BLOCK_STATEMENT: # {statement...}
+                push(R_BRACE)
+                pushList(item.statements(), None)
+                push(L_BRACE)
+            elif kind == NodeKinds.PROGRAM_STATEMENT: # statement...
+                pushList(item.statements(), None)
+            elif kind == NodeKinds.EXPRESSION_STATEMENT: # expr;
+                push(SEMICOLON)
+                push(bare(item.expression()))
+            elif kind == NodeKinds.ASSIGN_STATEMENT or kind == NodeKinds.LET_STATEMENT: # [let] id = expr;
+                push(SEMICOLON)
+                push(bare(item.expression()))
+                push(ASSIGN)
+                push(item.identifier())
+                if kind == NodeKinds.LET_STATEMENT:
+                    push(FixedTokenMap[TokenTypes.KW_LET])
+            elif kind == NodeKinds.RETURN_STATEMENT: # return expr;
+                push(SEMICOLON)
+                push(bare(item.expression()))
+                push(FixedTokenMap[TokenTypes.KW_RETURN])
+            elif kind == NodeKinds.IF_STATEMENT: # if (expr) {block} else {block}
+                push(item.alternative())
+                push(FixedTokenMap[TokenTypes.KW_ELSE])
+                push(item.consequence())
+                push(R_PAREN)
+                push(bare(item.condition()))
+                push(L_PAREN)
+                push(FixedTokenMap[TokenTypes.KW_IF])
+            elif kind == NodeKinds.WHILE_STATEMENT: # while (expr) {block}
+                push(item.body())
+                push(R_PAREN)
+                push(bare(item.condition()))
+                push(L_PAREN)
+                push(FixedTokenMap[TokenTypes.KW_WHILE])
+            elif kind == NodeKinds.EMPTY_STATEMENT: # ;
+                yield SEMICOLON
+            else:
+                raise Exception(f"unknown node type {item.nodeType()}")
+
+
 if __name__ == "__main__":
     node:Node = IntegerLiteral(Token(TokenTypes.INTEGER, "123"))
     print(node, node.treatAs(IntegerLiteral).integerValue())
@@ -0,0 +1,130 @@
+'''
+解析结果缓存
+以 sha256(解释器版本 + 原代码) 为键，同一份代码只解析一次
+两层缓存：进程内有容量上限的 LRU，以及源文件旁 __itcache__ 目录下的磁盘缓存（类似 __pycache__）
+磁盘上保存 it_serializer 的紧凑二进制格式
+'''
+from it_interpreter.it_ast import Program
+from it_interpreter.it_tokenizer import FastTokenizer, BufferedSourceReader
+from it_interpreter.it_pratt import PrattParser
+from it_interpreter.it_serializer import serializer
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import os
+import tempfile
+
+
+class ProgramCache:
+    '''
+    load(path) 依次查找内存、磁盘，都没有命中时解析并写回两层缓存
+    磁盘缓存写失败（如目录只读）时只是不缓存，不影响执行
+    '''
+    VERSION = b"it-ast-1" # AST 结构变化时修改，旧缓存自然失效（格式本身的变化由 serializer.MAGIC 区分）
+    DIRECTORY = "__itcache__"
+    SUFFIX = ".itc"
+
+    def __init__(self, capacity:int = 64, directory:Optional[str] = None) -> None:
+        self.capacity = capacity # 内存中最多保留的 Program 个数
+        self.directory = directory # 磁盘缓存目录，None 表示放在源文件旁的 __itcache__ 中
+        self.programs:OrderedDict[str, Program] = OrderedDict()
+        self.memoryHits = 0
+        self.diskHits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source:bytes) -> str:
+        return hashlib.sha256(ProgramCache.VERSION + b"\0" + source).hexdigest()
+    def cachePath(self, path:str, key:str) -> str:
+        directory = self.directory if self.directory is not None else os.path.join(os.path.dirname(os.path.abspath(path)), ProgramCache.DIRECTORY)
+        return os.path.join(directory, key + ProgramCache.SUFFIX)
+
+    def load(self, path:str) -> Program:
+        with open(path, "rb") as f:
+            source = f.read()
+        key = ProgramCache.key(source)
+        program = self.programs.get(key)
+        if program is not None: # 内存命中
+            self.programs.move_to_end(key)
+            self.memoryHits += 1
+            return program
+        cachePath = self.cachePath(path, key)
+        program = ProgramCache.readDisk(cachePath)
+        if program is not None: # 磁盘命中
+            self.diskHits += 1
+        else:
+            self.misses += 1
+            program = PrattParser.fromTokenizer(FastTokenizer(BufferedSourceReader(source))).parse() # 完整解析，缓存中不能有延迟解析的函数体
+            ProgramCache.writeDisk(cachePath, program)
+        self.remember(key, program)
+        return program
+    def remember(self, key:str, program:Program) -> None: # 放入 LRU，超出容量时淘汰最久未使用的
+        self.programs[key] = program
+        self.programs.move_to_end(key)
+        while len(self.programs) > self.capacity:
+            self.programs.popitem(last=False)
+    def clear(self) -> None: # 只清空内存缓存
+        self.programs.clear()
+
+    @staticmethod
+    def readDisk(cachePath:str) -> Optional[Program]: # 缓存文件不存在或损坏时返回 None
+        try:
+            with open(cachePath, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            return serializer.loads(data)
+        except Exception:
+            return None
+    @staticmethod
+    def writeDisk(cachePath:str, program:Program) -> None: # 先写临时文件再改名，并发运行时不会读到写了一半的缓存
+        data = serializer.dumps(program)
+        directory = os.path.dirname(cachePath)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tempPath = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tempPath, cachePath)
+            except OSError:
+                os.remove(tempPath)
+                raise
+        except OSError:
+            pass
+
+    def __str__(self) -> str:
+        return f"memory hits {self.memoryHits}, disk hits {self.diskHits}, misses {self.misses}, cached {len(self.programs)}/{self.capacity}"
+
+# 进程内共用的缓存，同一进程中多次 load 同一份代码时内存命中；it_main.py 每次运行只加载一个文件，只有磁盘缓存起作用
+programCache = ProgramCache()
+
+
+if __name__ == "__main__":
+    import shutil
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "a.it")
+        with open(path, "wb") as f:
+            f.write(b"let a = fn(x) { return x + 1; }; let b = a(41); if (b == 42) { b = -b; }")
+        cache = ProgramCache(capacity=1)
+        first = cache.load(path)
+        print(first)
+        print(cache.load(path) is first, cache)
+        cache.clear()
+        print(str(cache.load(path)) == str(first), cache) # 磁盘命中
+        print(os.listdir(os.path.join(directory, ProgramCache.DIRECTORY)))
+        other = os.path.join(directory, "b.it")
+        with open(other, "wb") as f:
+            f.write(b"1 + 2;")
+        print(cache.load(other), cache) # 容量为 1，a.it 被淘汰
+        print(cache.load(path) is first, cache)
+        with open(path, "rb") as f:
+            cachePath = cache.cachePath(path, ProgramCache.key(f.read()))
+        with open(cachePath, "wb") as f:
+            f.write(b"broken")
+        cache.clear()
+        print(cache.load(path), cache) # 损坏的缓存文件重新解析
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,340 @@
+'''
+闭包编译执行引擎
+把 AST 一次性编译为 Python 闭包树，每个节点一个闭包，闭包之间直接调用并返回值，执行时不再按节点种类分派
+语义和 Evaluator 完全一致（动态作用域、求值结果、println），只是执行方式不同
+语句闭包返回它产生的求值结果，只由空代码块组成的代码块不产生结果，返回 None
+return 通过 ReturnSignal 异常传递，由函数调用或程序捕获
+'''
+from it_interpreter.it_ast import *
+from it_interpreter.it_object import *
+from it_interpreter.it_evaluator import Enviroment, Evaluator
+from typing import Callable, Dict, Iterable, List, Optional
+import operator
+
+Closure = Callable[[], Optional[Object]]
+
+
+class ReturnSignal(Exception):
+    '''
+    执行 return 语句，携带返回值，向上穿过代码块、循环，直到函数调用或程序
+    '''
+    __slots__ = ("value",)
+    def __init__(self, value:Object) -> None:
+        self.value = value
+
+
+class ClosureEngine:
+    '''
+    与 Evaluator 接口一致：eval(node) 之后结果在 result，环境在 env
+    同一个函数体只编译一次，按 Block 对象缓存在 bodies 中
+    '''
+    def __init__(self) -> None:
+        self.env = Enviroment()
+        self.returnMode:bool = False # 顶层执行过 return，之后不再执行
+        self.result:Object = NULL
+        self.bodies:Dict[Block, Closure] = dict()
+        # 分派表只在编译时使用，下标是节点种类 NodeKinds
+        self.compilers:List[Callable[[Node], Closure]] = [self._compileUnknown] * NodeKinds.COUNT
+        self.compilers[NodeKinds.EMPTY_STATEMENT] = self._compileEmptyStatement
+        self.compilers[NodeKinds.ASSIGN_STATEMENT] = self._compileAssignStatement
+        self.compilers[NodeKinds.LET_STATEMENT] = self._compileLetStatement
+        self.compilers[NodeKinds.RETURN_STATEMENT] = self._compileReturnStatement
+        self.compilers[NodeKinds.EXPRESSION_STATEMENT] = self._compileExpressionStatement
+        self.compilers[NodeKinds.IF_STATEMENT] = self._compileIfStatement
+        self.compilers[NodeKinds.WHILE_STATEMENT] = self._compileWhileStatement
+        self.compilers[NodeKinds.BLOCK_STATEMENT] = self._compileBlock
+        self.compilers[NodeKinds.PROGRAM_STATEMENT] = self._compileProgram
+        self.compilers[NodeKinds.IDENTIFIER_EXPRESSION] = self._compileIdentifier
+        self.compilers[NodeKinds.INTEGER_LITERAL_EXPRESSION] = self._compileIntegerLiteral
+        self.compilers[NodeKinds.BOOL_LITERAL_EXPRESSION] = self._compileBoolLiteral
+        self.compilers[NodeKinds.FUNC_LITERAL_EXPRESSION] = self._compileFuncLiteral
+        self.compilers[NodeKinds.PREFIX_EXPRESSION] = self._compilePrefixExpression
+        self.compilers[NodeKinds.BINARY_EXPRESSION] = self._compileBinaryExpression
+        self.compilers[NodeKinds.FUNC_CALLER_EXPRESSION] = self._compileFuncCaller
+        self.env.put(Evaluator.BUILDIN_FUNC_PRINTIN, FuncObject(["obj"], Block()))
+
+    def eval(self, node:Node) -> None:
+        if node.kind == NodeKinds.PROGRAM_STATEMENT:
+            self.evalStatements(node.statements())
+        else:
+            self.evalStatements([node])
+    def evalStatements(self, statements:Iterable[Statement]) -> None: # 执行顶层语句，逐条编译执行，可以传入生成器边解析边执行
+        if self.returnMode:
+            return
+        try:
+            for statement in statements:
+                result = self.compile(statement)()
+                if result is not None:
+                    self.result = result
+        except ReturnSignal as r:
+            self.result = r.value
+            self.returnMode = True
+    def compile(self, node:Node) -> Closure:
+        return self.compilers[node.kind](node)
+    def compileBody(self, body:Block) -> Closure: # 函数体在第一次调用时编译
+        closure = self.bodies.get(body)
+        if closure is None:
+            closure = self.bodies[body] = self.compile(body)
+        return closure
+
+    # statement
+    def _compileEmptyStatement(self, node:EmptyStatement) -> Closure:
+        def empty() -> Object:
+            return NULL
+        return empty
+    def _compileAssignStatement(self, node:AssignStatement) -> Closure:
+        expression = self.compile(node.expression())
+        modify = self.env.modify
+        name = node.identifier().name()
+        def assign() -> Object:
+            value = expression()
+            modify(name, value)
+            return value
+        return assign
+    def _compileLetStatement(self, node:LetStatement) -> Closure:
+        expression = self.compile(node.expression())
+        put = self.env.put
+        name = node.identifier().name()
+        def let() -> Object:
+            value = expression()
+            put(name, value)
+            return value
+        return let
+    def _compileReturnStatement(self, node:ReturnStatement) -> Closure:
+        expression = self.compile(node.expression())
+        def ret() -> Object:
+            raise ReturnSignal(expression())
+        return ret
+    def _compileExpressionStatement(self, node:ExpressionStatement) -> Closure:
+        return self.compile(node.expression())
+    def _compileIfStatement(self, node:IfStatement) -> Closure:
+        condition = self.compile(node.condition())
+        consequence = self.compile(node.consequence())
+        alternative = self.compile(node.alternative())
+        def ifElse() -> Object:
+            value = condition()
+            result = consequence() if (value.value() if type(value) is BoolObject else value.treatAs(BoolObject).value()) else alternative()
+            return value if result is None else result # 分支不产生结果时，结果是条件的值
+        return ifElse
+    def _compileWhileStatement(self, node:WhileStatement) -> Closure:
+        condition = self.compile(node.condition())
+        body = self.compile(node.body())
+        def loop() -> Object:
+            while True:
+                value = condition()
+                if not (value.value() if type(value) is BoolObject else value.treatAs(BoolObject).value()):
+                    return value # 结果是最后一次条件的值
+                body()
+        return loop
+    def _compileBlock(self, node:Block) -> Closure: # 进入代码块前后环境变更
+        statements = [self.compile(s) for s in node.statements()]
+        if not node.declares: # 不声明变量的代码块和外层共用栈帧
+            def sharedBlock() -> Optional[Object]:
+                result = None
+                for statement in statements:
+                    value = statement()
+                    if value is not None:
+                        result = value
+                return result
+            return sharedBlock
+        push, pop = self.env.stackPush, self.env.stackPop
+        def block() -> Optional[Object]:
+            push()
+            try:
+                result = None
+                for statement in statements:
+                    value = statement()
+                    if value is not None:
+                        result = value
+                return result
+            finally:
+                pop()
+        return block
+    def _compileProgram(self, node:Program) -> Closure: # 程序不变更环境，捕获顶层 return
+        statements = [self.compile(s) for s in node.statements()]
+        def program() -> Optional[Object]:
+            result = None
+            try:
+                for statement in statements:
+                    value = statement()
+                    if value is not None:
+                        result = value
+            except ReturnSignal as r:
+                result = r.value
+            return result
+        return program
+
+    # expression
+    def _compileIdentifier(self, node:IdentifierNode) -> Closure:
+        bindings = self.env.bindings # 直接读浅绑定表，见 Enviroment
+        name = node.name()
+        def identifier() -> Object:
+            binding = bindings.get(name)
+            if not binding:
+                raise Exception(f"undefined {name}")
+            return binding[-1][1]
+        return identifier
+    def _compileIntegerLiteral(self, node:IntegerLiteral) -> Closure:
+        value = IntegerObject.of(node.integerValue()) # 对象不可变，编译时取得一次
+        def integer() -> Object:
+            return value
+        return integer
+    def _compileBoolLiteral(self, node:BoolLiteral) -> Closure:
+        value = BoolObject.of(node.boolValue())
+        def boolean() -> Object:
+            return value
+        return boolean
+    def _compileFuncLiteral(self, node:FuncLiteral) -> Closure:
+        parameterNames = node.parameterNames()
+        def function() -> Object:
+            return FuncObject(parameterNames, node.parsedBody(), node) # 延迟解析的函数体到调用时才解析
+        return function
+    def _compilePrefixExpression(self, node:PrefixExpression) -> Closure:
+        expression = self.compile(node.rawExpression())
+        prefixType = node.prefixType()
+        unary = operation.unary
+        def prefix() -> Object:
+            return unary(prefixType, expression())
+        return prefix
+    # 整数运算的快速路径：运算符 -> (Python 运算, 取得结果对象)，其他情况以及报错仍由 operation.binary 处理
+    _INTEGER_OPERATIONS:Dict[TokenType, tuple] = {
+        TokenTypes.OP_PLUS:(operator.add, IntegerObject.of),
+        TokenTypes.OP_MINUS:(operator.sub, IntegerObject.of),
+        TokenTypes.OP_ASTERISK:(operator.mul, IntegerObject.of),
+        TokenTypes.OP_SLASH:(operator.floordiv, IntegerObject.of),
+        TokenTypes.OP_GT:(operator.gt, BoolObject.of),
+        TokenTypes.OP_GTE:(operator.ge, BoolObject.of),
+        TokenTypes.OP_LT:(operator.lt, BoolObject.of),
+        TokenTypes.OP_LTE:(operator.le, BoolObject.of),
+        TokenTypes.OP_EQ:(operator.eq, BoolObject.of),
+        TokenTypes.OP_NEQ:(operator.ne, BoolObject.of),
+    }
+    def _compileBinaryExpression(self, node:BinaryOperatorExpression) -> Closure:
+        left = self.compile(node.left())
+        right = self.compile(node.right())
+        operatorType = node.operatorType()
+        binary = operation.binary
+        integerOperation = ClosureEngine._INTEGER_OPERATIONS.get(operatorType)
+        if integerOperation is None:
+            def binaryOperation() -> Object:
+                leftResult = left()
+                return binary(operatorType, leftResult, right())
+            return binaryOperation
+        function, makeResult = integerOperation
+        def integerBinaryOperation() -> Object:
+            leftResult = left()
+            rightResult = right()
+            if type(leftResult) is IntegerObject and type(rightResult) is IntegerObject:
+                return makeResult(function(leftResult.value(), rightResult.value()))
+            return binary(operatorType, leftResult, rightResult)
+        return integerBinaryOperation
+    def _compileFuncCaller(self, node:FuncCaller) -> Closure:
+        callee = self.compile(node.callee())
+        arguments = [self.compile(a) for a in node.arguments()]
+        isPrintln = isinstance(node.callee(), IdentifierNode) and node.callee().name() == Evaluator.BUILDIN_FUNC_PRINTIN # 内置函数 println
+        env = self.env
+        compileBody = self.compileBody
+        def call() -> Object:
+            funcObj = callee().treatAs(FuncObject)
+            parameters = funcObj.parameters()
+            result:Object = funcObj # 函数体不产生结果时，调用的结果是最后一个实参或函数本身
+            env.stackPush() # 进栈，实参在新栈帧中求值
+            try:
+                for i in range(len(parameters)):
+                    result = arguments[i]()
+                    env.put(parameters[i], result)
+                    if isPrintln:
+                        print(result)
+                try:
+                    value = compileBody(funcObj.body())()
+                except ReturnSignal as r:
+                    value = r.value
+                return result if value is None else value
+            finally:
+                env.stackPop() # 退栈
+        return call
+    def _compileUnknown(self, node:Node) -> Closure:
+        raise Exception(f"unknown node {node} type {node.nodeType()}")
+
+
+if __name__ == "__main__":
+    import io
+    import contextlib
+    from it_interpreter.it_parser import parser
+    def _eval(code:str) -> None:
+        expected = Evaluator()
+        expectedOutput = io.StringIO()
+        with contextlib.redirect_stdout(expectedOutput):
+            expected.eval(parser.parse(io.BytesIO(code.encode("ascii"))))
+        engine = ClosureEngine()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            engine.eval(parser.parse(io.BytesIO(code.encode("ascii"))))
+        assert str(engine.result) == str(expected.result), f"{code} {engine.result} != {expected.result}"
+        assert output.getvalue() == expectedOutput.getvalue() and str(engine.env) == str(expected.env), code
+        print(f"{code}\n==>{engine.result}")
+
+    # 与 it_evaluator 的用例相同
+    _eval("123;")
+    _eval("true;")
+    _eval("false;")
+    _eval("-123;")
+    _eval("!true;")
+    _eval("!false;")
+    _eval("20+30;")
+    _eval("20-30;")
+    _eval("20*30;")
+    _eval("50/20;")
+    _eval("50>20;")
+    _eval("50>100;")
+    _eval("50>=20;")
+    _eval("50>=50;")
+    _eval("50>=100;")
+    _eval("50<=100;")
+    _eval("50<=50;")
+    _eval("50<=40;")
+    _eval("50==40;")
+    _eval("50==50;")
+    _eval("true==true;")
+    _eval("false==true;")
+    _eval("false!=true;")
+    _eval("true!=true;")
+    _eval("50!=50;")
+    _eval("40!=50;")
+    _eval("!false==true;")
+    _eval("1+2+3+4==4+3+2+1;")
+    _eval("if (5>2) {12;} else {21;}")
+    _eval("if (1+1==3) {12;}")
+    _eval("return 1+5;")
+    _eval("if (2+3>5) {return 12;} else {return 21;}")
+    _eval("return 1; return 2;")
+    _eval("1; return 2;")
+    _eval("1; return 2;3;")
+    _eval("if (10>1) { if(10>1) {return 10;} return 1; }")
+    _eval("let a = 123; let b = 312; a;")
+    _eval("let a = 123; let b = 312; a + b;")
+    _eval("let a = 5; let b = a; let c = a + b + 5; c;")
+    _eval("let a = fn(a) {return a+1;}; a(11+11); a;")
+    _eval("let add = fn(a,b,c,d) {return a+b+c+d;}; add(1,2,3,4);")
+    _eval("let max = fn(x,y) {if(x>y){return x;}else{return y;}}; max(5, 10);")
+    _eval("let fa = fn(n) {if(n==0){return 1;}else{return fa(n-1)*n;}}; fa(6);")
+    _eval("fn(a, b) {return a*10+b;} (5,6);")
+    _eval("let a = 5; fn(b) {return a*10+b;} (6);")
+    _eval("let a = 5; let f5 = fn(b) {return a*10+b;}; let b = 7; let f7 = fn(d, f) {return b*100 + f(d);}; f7(6, f5);")
+    _eval("while(true){return 123;}return 321;")
+    _eval("let i = 0; while(true) {i=i+1; if (i==100){return i;}}")
+    _eval("println(123);")
+    # 求值结果的边界情况
+    _eval("1; {{}}")
+    _eval("let f = fn() {}; f();")
+    _eval("let f = fn(a, b) {{}}; f(1, 2);")
+    _eval("let f = fn(a) { a + 1; }; f(1);")
+    _eval("let i = 0; while (i < 3) { i = i + 1; }")
+    _eval("let x = 1; let f = fn() { return x; }; let g = fn(x) { return f(); }; g(2);") # 动态作用域
+    _eval("println(1) + println(2); ;")
+    for code in ["a;", "let a = 1; let a = 2;", "if (1) {}", "1 + true;", "let f = fn(a) {}; f();"]:
+        for engine in [Evaluator(), ClosureEngine()]:
+            try:
+                engine.eval(parser.parse(io.BytesIO(code.encode("ascii"))))
+            except Exception as e:
+                print(code, type(engine).__name__, e)
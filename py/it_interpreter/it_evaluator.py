@@ -5,8 +5,11 @@ evaluator 解释器，解释 AST 树
 from it_interpreter.it_ast import *
 from it_interpreter.it_object import *
 from it_interpreter.it_parser import parser
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
 import io
+import itertools
+if TYPE_CHECKING:
+    from it_interpreter.it_memo import Memoizer
 
 class evaluator:
     @staticmethod
@@ -17,128 +20,279 @@ class evaluator:
         return e.result
 
 class Enviroment:
+    '''
+    运行环境，语言是动态作用域：变量取运行时栈上最近一层声明的值
+    采用浅绑定（shallow binding）：每个变量名一个绑定栈，栈顶就是当前可见的值，get/modify 都是 O(1)，不需要逐层查找栈帧
+    frames 记录每个栈帧声明了哪些变量，退栈时把这些变量的绑定弹出
+    绑定栈中的元素是 [栈帧层数, 值]，层数用于检查同一栈帧中的重复定义
+    每个名字的绑定栈创建后不会被替换，put/modify/退栈只改变其内容，所以求值器的内联缓存可以一直持有绑定栈，用 version 校验属于同一个环境
+    version 取自全局计数器，不同环境不会相同
+    '''
+    versions = itertools.count(1)
     def __init__(self) -> None:
-        self.stack:List[Dict[str, Object]] = [dict()]
-    def currentStackFrame(self) -> Dict[str, Object]:
-        if len(self.stack) == 0:
-            raise Exception("stack empty")
-        return self.stack[-1]
+        self.frames:List[List[str]] = [[]]
+        self.bindings:Dict[str, List[List]] = dict()
+        self.version:int = next(Enviroment.versions)
     def stackPush(self) -> None:
-        self.stack.append(dict())
+        self.frames.append([])
     def stackPop(self) -> None:
-        if len(self.stack) == 0:
+        if len(self.frames) == 0:
             raise Exception("stack empty")
-        self.stack.pop()
+        bindings = self.bindings
+        for name in self.frames.pop():
+            bindings[name].pop()
     def put(self, name:str, object:Object) -> None:
-        if name in self.currentStackFrame():
+        if len(self.frames) == 0:
+            raise Exception("stack empty")
+        level = len(self.frames)
+        binding = self.bindings.get(name)
+        if binding is None:
+            binding = self.bindings[name] = []
+        elif len(binding) > 0 and binding[-1][0] == level:
             raise Exception(f"redifined {name}")
-        self.currentStackFrame()[name] = object
+        binding.append([level, object])
+        self.frames[-1].append(name)
     def modify(self, name:str, object:Object) -> None:
-        for frame in self.stack[::-1]: # 逆序
-            if name in frame:
-                frame[name] = object
-                return
-        raise Exception(f"undefined {name}")
+        binding = self.bindings.get(name)
+        if not binding:
+            raise Exception(f"undefined {name}")
+        binding[-1][1] = object
     def get(self, name:str) -> Object:
-        for frame in self.stack[::-1]: # 逆序
-            if name in frame:
-                return frame[name]
-        raise Exception(f"undefined {name}")
-    def __str__(self) -> str:
-        return str(self.stack)
+        return self.binding(name)[-1][1]
+    def binding(self, name:str) -> List[List]: # 名字的绑定栈，不能为空
+        binding = self.bindings.get(name)
+        if not binding:
+            raise Exception(f"undefined {name}")
+        return binding
+    def currentStackFrame(self) -> Dict[str, Object]: # 当前栈帧中声明的变量
+        if len(self.frames) == 0:
+            raise Exception("stack empty")
+        return {name:self.bindings[name][-1][1] for name in self.frames[-1]}
+    def __str__(self) -> str: # 按栈帧输出，和逐帧存放 dict 时一致
+        depth:Dict[str, int] = dict() # 每个变量已经输出到绑定栈的第几个
+        stack:List[Dict[str, Object]] = []
+        for frame in self.frames:
+            values:Dict[str, Object] = dict()
+            for name in frame:
+                index = depth.get(name, 0)
+                values[name] = self.bindings[name][index][1]
+                depth[name] = index + 1
+            stack.append(values)
+        return str(stack)
 
 class Evaluator:
+    '''
+    尾调用：函数中的 return f(...) 在实参求值后，如果当前调用（调用栈帧及函数体内的代码块栈帧）声明的变量都被 f 的形参覆盖，
+    当前调用的栈帧对 f 不可见，可以提前丢弃：实参暂存在 tailCall 中，按返回模式退出到当前调用，在同一层上执行 f 的函数体（trampoline）
+    这样 return loop(i+1, acc+i) 形式的循环只占固定的 Python 调用栈和环境栈帧；不满足条件时（如声明了局部变量）按普通调用执行
+
+    内联缓存：标识符节点缓存环境版本号和名字的绑定栈，版本号一致时直接读栈顶的值，不查绑定表；赋值、let、退栈只改变绑定栈的内容，缓存仍然有效
+    调用点缓存上次的函数对象和形参列表，callee 求值得到同一个函数对象时跳过类型检查；是否调用 println 只由调用点决定，只判断一次
+    '''
     BUILDIN_FUNC_PRINTIN = "println"
     def __init__(self) -> None:
         self.env = Enviroment()
         self.returnMode:bool = False
-        self.result:Object = NullObject()
+        self.result:Object = NULL
+        self.activations:List[int] = [] # 正在执行的函数调用的栈帧下标
+        self.tailCall:Optional[Tuple[FuncObject, List[Tuple[str, Object]]]] = None # 待执行的尾调用，函数和实参
+        self.tailCalls = 0 # 复用栈帧执行的尾调用次数
+        self.memo:Optional[Memoizer] = None # 纯函数的记忆化，默认关闭，见 it_memo
+        self.identifierHits = 0 # 内联缓存命中、未命中次数
+        self.identifierMisses = 0
+        self.callHits = 0
+        self.callMisses = 0
+        # 分派表，下标是节点种类 NodeKinds，存放绑定方法，子类重写的 _evalX 同样生效
+        self.evaluators:List[Callable[[Node], None]] = [self._evalUnknown] * NodeKinds.COUNT
+        self.evaluators[NodeKinds.EMPTY_STATEMENT] = self._evalEmptyStatement
+        self.evaluators[NodeKinds.ASSIGN_STATEMENT] = self._evalAssignStatement
+        self.evaluators[NodeKinds.LET_STATEMENT] = self._evalLetStatement
+        self.evaluators[NodeKinds.RETURN_STATEMENT] = self._evalReturnStatement
+        self.evaluators[NodeKinds.EXPRESSION_STATEMENT] = self._evalExpressionStatement
+        self.evaluators[NodeKinds.IF_STATEMENT] = self._evalIfStatement
+        self.evaluators[NodeKinds.WHILE_STATEMENT] = self._evalWhileStatement
+        self.evaluators[NodeKinds.BLOCK_STATEMENT] = self._evalBlock
+        self.evaluators[NodeKinds.PROGRAM_STATEMENT] = self._evalProgram
+        self.evaluators[NodeKinds.IDENTIFIER_EXPRESSION] = self._evalIdentifier
+        self.evaluators[NodeKinds.INTEGER_LITERAL_EXPRESSION] = self._evalIntegerLiteral
+        self.evaluators[NodeKinds.BOOL_LITERAL_EXPRESSION] = self._evalBoolLiteral
+        self.evaluators[NodeKinds.FUNC_LITERAL_EXPRESSION] = self._evalFuncLiteral
+        self.evaluators[NodeKinds.PREFIX_EXPRESSION] = self._evalPrefixExpression
+        self.evaluators[NodeKinds.BINARY_EXPRESSION] = self._evalBinaryExpression
+        self.evaluators[NodeKinds.FUNC_CALLER_EXPRESSION] = self._evalFuncCaller
         self._init()
     def eval(self, node:Node) -> None:
-        # switch node type
-        nodeType = node.nodeType()
-        # satatement
-        if nodeType == NodeTypes.EMPTY_STATEMENT:
-            self.result = NullObject()
-        elif nodeType == NodeTypes.ASSIGN_STATEMENT: # assign
-            assignSate = node.treatAs(AssignStatement)
-            self.eval(assignSate.expression())
-            self.env.modify(assignSate.identifier().name(), self.result)
-        elif nodeType == NodeTypes.LET_STATEMENT: # let
-            letState = node.treatAs(LetStatement)
-            self.eval(letState.expression())
-            self.env.put(letState.identifier().name(), self.result)
-        elif nodeType == NodeTypes.RETURN_STATEMENT: # return
-            self.eval(node.treatAs(ReturnStatement).expression())
-            self.returnMode = True # 进入返回模式
-        elif nodeType == NodeTypes.EXPRESSION_STATEMENT: # 表达式
-            self.eval(node.treatAs(ExpressionStatement).expression())
-        elif nodeType == NodeTypes.IF_STATEMENT:
-            ifState = node.treatAs(IfStatement) # if
-            self.eval(ifState.condition())
-            if self.result.treatAs(BoolObject).value():
-                self.eval(ifState.consequence())
-            else:
-                self.eval(ifState.alternative())
-        elif nodeType == NodeTypes.WHILE_STATEMENT: # while
-            whileState = node.treatAs(WhileStatement)
-            while True:
-                self.eval(whileState.condition())
-                if not self.result.treatAs(BoolObject).value():
-                    break
-                self.eval(whileState.body())
-                if self.returnMode: # 循环体需要检查 return 标识，否则空转
-                    break
-        elif nodeType == NodeTypes.BLOCK_STATEMENT: # 代码块，注意检查 return 标识，注意进入前后环境变更
-            self.env.stackPush()
-            for statement in node.treatAs(Block).statements():
+        self.evaluators[node.kind](node)
+    # 以下对子节点求值直接查分派表，不经过 eval，每层 AST 只占一层 Python 调用栈
+    # satatement
+    def _evalEmptyStatement(self, node:EmptyStatement) -> None:
+        self.result = NULL
+    def _evalAssignStatement(self, node:AssignStatement) -> None: # assign
+        expression = node.expression()
+        self.evaluators[expression.kind](expression)
+        self.env.modify(node.identifier().name(), self.result)
+    def _evalLetStatement(self, node:LetStatement) -> None: # let
+        expression = node.expression()
+        self.evaluators[expression.kind](expression)
+        self.env.put(node.identifier().name(), self.result)
+    def _evalReturnStatement(self, node:ReturnStatement) -> None: # return
+        expression = node.expression()
+        if expression.kind == NodeKinds.FUNC_CALLER_EXPRESSION and self.activations:
+            self._evalTailCall(expression) # 函数中的尾调用
+        else:
+            self.evaluators[expression.kind](expression)
+        self.returnMode = True # 进入返回模式
+    def _evalExpressionStatement(self, node:ExpressionStatement) -> None: # 表达式
+        expression = node.expression()
+        self.evaluators[expression.kind](expression)
+    def _evalIfStatement(self, node:IfStatement) -> None: # if
+        condition = node.condition()
+        self.evaluators[condition.kind](condition)
+        if self.result.treatAs(BoolObject).value():
+            self._evalBlock(node.consequence())
+        else:
+            self._evalBlock(node.alternative())
+    def _evalWhileStatement(self, node:WhileStatement) -> None: # while
+        condition = node.condition()
+        evalCondition = self.evaluators[condition.kind]
+        body = node.body()
+        while True:
+            evalCondition(condition)
+            if not self.result.treatAs(BoolObject).value():
+                break
+            self._evalBlock(body)
+            if self.returnMode: # 循环体需要检查 return 标识，否则空转
+                break
+    def _evalBlock(self, node:Block) -> None: # 代码块，注意检查 return 标识，注意进入前后环境变更
+        evaluators = self.evaluators
+        if not node.declares: # 不声明变量的代码块和外层共用栈帧
+            for statement in node.statements():
                 if self.returnMode:
                     break
-                self.eval(statement)
+                evaluators[statement.kind](statement)
+            return
+        self.env.stackPush()
+        for statement in node.statements():
+            if self.returnMode:
+                break
+            evaluators[statement.kind](statement)
+        self.env.stackPop()
+    def _evalProgram(self, node:Program) -> None: # 程序，注意和代码块的区别，进入代码块需要前后环境变更
+        self.evalStatements(node.statements())
+    # expression
+    def _evalIdentifier(self, node:IdentifierNode) -> None: # 标识符
+        env = self.env
+        if node.cacheVersion == env.version: # 内联缓存命中
+            binding = node.cacheBinding
+            if binding: # 绑定栈为空时按未命中处理，报告 undefined
+                self.identifierHits += 1
+                self.result = binding[-1][1]
+                return
+        self.identifierMisses += 1
+        binding = node.cacheBinding = env.binding(node.name())
+        node.cacheVersion = env.version
+        self.result = binding[-1][1]
+    def _evalIntegerLiteral(self, node:IntegerLiteral) -> None: # 整形字面量
+        value = node.constant
+        if value is None:
+            value = node.constant = IntegerObject.of(node.integerValue())
+        self.result = value
+    def _evalBoolLiteral(self, node:BoolLiteral) -> None: # 布尔字面量
+        self.result = TRUE if node.boolValue() else FALSE
+    def _evalFuncLiteral(self, node:FuncLiteral) -> None: # 函数定义
+        self.result = FuncObject(node.parameterNames(), node.parsedBody(), node) # 延迟解析的函数体到调用时才解析
+    def _evalPrefixExpression(self, node:PrefixExpression) -> None: # 前缀运算
+        expression = node.rawExpression()
+        self.evaluators[expression.kind](expression)
+        self.result = operation.unary(node.prefixType(), self.result)
+    def _evalBinaryExpression(self, node:BinaryOperatorExpression) -> None: # 二元运算
+        left, right = node.left(), node.right()
+        self.evaluators[left.kind](left)
+        leftResult = self.result
+        self.evaluators[right.kind](right)
+        rightResult = self.result
+        self.result = operation.binary(node.operatorType(), leftResult, rightResult)
+    def _evalFuncCaller(self, node:FuncCaller) -> None: # 函数调用
+        self._callBody(self._evalArguments(node))
+    def _callBody(self, funcObj:FuncObject) -> None: # 实参已在栈顶栈帧中，计算函数体后退栈
+        key = None
+        if self.memo is not None:
+            key = self.memo.key(funcObj, self.env.currentStackFrame().values())
+            if key is not None:
+                result = self.memo.get(key)
+                if result is not None: # 命中，不执行函数体
+                    self.env.stackPop()
+                    self.result = result
+                    self.returnMode = False
+                    return
+        self.activations.append(len(self.env.frames) - 1)
+        self._evalBlock(funcObj.body()) # 计算函数体
+        while self.tailCall is not None: # 函数体以尾调用返回，在同一层执行被调函数
+            funcObj, arguments = self.tailCall
+            self.tailCall = None
             self.env.stackPop()
-        elif nodeType == NodeTypes.PROGRAM_STATEMENT: # 程序，注意和代码块的区别，进入代码块需要前后环境变更
-            for statement in node.treatAs(Block).statements():
-                if self.returnMode:
-                    break
-                self.eval(statement)
-        # expression
-        elif nodeType == NodeTypes.IDENTIFIER_EXPRESSION: # 标识符
-            name = node.treatAs(IdentifierNode).name()
-            self.result = self.env.get(name)
-        elif nodeType == NodeTypes.INTEGER_LITERAL_EXPRESSION: # 整形字面量
-            self.result = IntegerObject(node.treatAs(IntegerLiteral).integerValue())
-        elif nodeType == NodeTypes.BOOL_LITERAL_EXPRESSION: # 布尔字面量
-            self.result = BoolObject(node.treatAs(BoolLiteral).boolValue())
-        elif nodeType == NodeTypes.FUNC_LITERAL_EXPRESSION: # 函数定义
-            funcLit = node.treatAs(FuncLiteral)
-            self.result = FuncObject(funcLit.parameterNames(), funcLit.body())
-        elif nodeType == NodeTypes.PREFIX_EXPRESSION: # 前缀运算
-            prefixExpr = node.treatAs(PrefixExpression)
-            self.eval(prefixExpr.rawExpression())
-            self.result = operation.unary(prefixExpr.prefixType(), self.result)
-        elif nodeType == NodeTypes.BINARY_EXPRESSION: # 二元运算
-            binaryExpr = node.treatAs(BinaryOperatorExpression)
-            self.eval(binaryExpr.left())
-            leftResult = self.result
-            self.eval(binaryExpr.right())
-            rightResult = self.result
-            self.result = operation.binary(binaryExpr.operatorType(), leftResult, rightResult)
-        elif nodeType == NodeTypes.FUNC_CALLER_EXPRESSION: # 函数调用
-            callerExpr = node.treatAs(FuncCaller)
-            self.eval(callerExpr.callee())
-            funcObj = self.result.treatAs(FuncObject) # 对 callee 求职就拿到了 funcObj
-            self.env.stackPush() # 进栈
-            for i in range(len(funcObj.parameters())): # 准备实参
-                self.eval(callerExpr.arguments()[i])
-                self.env.put(funcObj.parameters()[i], self.result)
-                # 对于内置函数 println 处理
-                if isinstance(callerExpr.callee(), IdentifierNode) and callerExpr.callee().treatAs(IdentifierNode).name() == Evaluator.BUILDIN_FUNC_PRINTIN:
-                    print(self.result)
-            self.eval(funcObj.body()) # 计算函数体
-            self.env.stackPop() # 退栈
-            self.returnMode = False # 退出返回模式
+            self.env.stackPush()
+            for name, value in arguments:
+                self.env.put(name, value)
+            self.returnMode = False
+            self._evalBlock(funcObj.body())
+        self.activations.pop()
+        self.env.stackPop() # 退栈
+        self.returnMode = False # 退出返回模式
+        if key is not None:
+            self.memo.put(key, self.result)
+    def _evalArguments(self, node:FuncCaller) -> FuncObject: # 对 callee 求值，进栈后在新栈帧中准备实参
+        callee = node.callee()
+        self.evaluators[callee.kind](callee)
+        funcObj = self.result # 对 callee 求职就拿到了 funcObj
+        if funcObj is node.cacheFunc: # 调用点缓存命中
+            self.callHits += 1
+            parameters = node.cacheParameters
         else:
-            raise Exception(f"unknown node {node} type {nodeType}")
+            self.callMisses += 1
+            funcObj = funcObj.treatAs(FuncObject)
+            parameters = node.cacheParameters = funcObj.parameters()
+            node.cacheFunc = funcObj
+        isPrintln = node.cachePrintln
+        if isPrintln is None:
+            isPrintln = node.cachePrintln = isinstance(callee, IdentifierNode) and callee.name() == Evaluator.BUILDIN_FUNC_PRINTIN # 内置函数 println
+        arguments = node.arguments()
+        env = self.env
+        env.stackPush() # 进栈
+        for i in range(len(parameters)): # 准备实参
+            argument = arguments[i]
+            self.evaluators[argument.kind](argument)
+            env.put(parameters[i], self.result)
+            if isPrintln:
+                print(self.result)
+        return funcObj
+    def _evalTailCall(self, node:FuncCaller) -> None: # return 中的函数调用
+        funcObj = self._evalArguments(node)
+        frames = self.env.frames
+        parameters = frames[-1]
+        if all(name in parameters for frame in frames[self.activations[-1]:-1] for name in frame): # 当前调用的变量都被形参覆盖
+            arguments = [(name, self.env.bindings[name][-1][1]) for name in parameters]
+            self.env.stackPop()
+            self.tailCall = (funcObj, arguments)
+            self.tailCalls += 1
+            return
+        self._callBody(funcObj) # 按普通调用执行
+    def cacheStats(self) -> str: # 内联缓存命中率
+        def rate(hits:int, misses:int) -> str:
+            total = hits + misses
+            return f"{hits}/{total} ({hits / total:.1%})" if total else "0/0"
+        return f"identifier cache hits {rate(self.identifierHits, self.identifierMisses)}, call site cache hits {rate(self.callHits, self.callMisses)}"
+    def _evalUnknown(self, node:Node) -> None:
+        raise Exception(f"unknown node {node} type {node.nodeType()}")
+    def evalStatements(self, statements:Iterable[Statement]) -> None: # 执行顶层语句，可以传入生成器边解析边执行
+        if self.returnMode:
+            return
+        self.activations.clear() # 之前执行报错时可能留下
+        self.tailCall = None
+        for statement in statements:
+            self.eval(statement)
+            if self.returnMode:
+                break
     def _init(self) -> None:
         # 加入内置函数 println(a)
         if True:
@@ -197,4 +351,8 @@ if __name__ == "__main__":
     _eval("let a = 5; let f5 = fn(b) {return a*10+b;}; let b = 7; let f7 = fn(d, f) {return b*100 + f(d);}; f7(6, f5);")
     _eval("while(true){return 123;}return 321;")
     _eval("let i = 0; while(true) {i=i+1; if (i==100){return i;}}")
-    _eval("println(123);")
\ No newline at end of file
+    _eval("println(123);")
+    _eval("let loop = fn(i, acc) { if (i == 0) { return acc; } return loop(i - 1, acc + i); }; loop(10000, 0);") # 尾调用，不受递归深度限制
+    _eval("let f = fn(n) { let x = n; return g(n); }; let g = fn(n) { return x + n; }; f(5);") # x 对 g 可见，不能复用栈帧
+    _eval("let x = 1; let f = fn() { return x; }; let a = f(); x = 2; let b = f(); { let x = 3; b = b * 10 + f(); } b * 10 + f();") # 赋值、遮蔽、退栈后缓存失效
+    _eval("let f = fn(n) { return n + 1; }; let g = fn(h) { return h(1); }; let a = g(f); f = fn(n) { return n * 10; }; a * 100 + g(f);") # callee 重新绑定
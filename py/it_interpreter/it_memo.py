@@ -0,0 +1,204 @@
+'''
+纯函数的自动记忆化
+PurityAnalyzer 分析整个程序，找出纯函数字面量；Memoizer 为每个纯函数维护一个有容量上限的 LRU，以实参为键缓存调用结果
+语言是动态作用域，函数体中读到的自由变量取决于调用时的运行时栈，所以纯函数的条件比较严格：
+1. 函数体只读写自己的变量（形参，以及读写之前已在函数体内 let 声明的变量），不能 println
+2. 函数体只调用稳定函数名，且这些函数也是纯的；稳定函数名是整个程序中只 let 一次、绑定到函数字面量、从不被赋值、从不用作形参的名字，
+   无论运行时栈是什么样，这个名字只会绑定到这个函数字面量
+3. 函数体中没有函数字面量（保守处理）
+只有实参全是整数、布尔值的调用会被缓存
+'''
+from it_interpreter.it_ast import *
+from it_interpreter.it_object import Object, IntegerObject, BoolObject, FuncObject
+from it_interpreter.it_evaluator import Evaluator
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class PurityAnalyzer:
+    '''
+    analyze(program) 返回纯函数字面量，以及稳定函数名到函数字面量的映射
+    延迟解析的函数体会在这里解析
+    '''
+    def __init__(self) -> None:
+        self.letCounts:Dict[str, int] = dict() # 每个名字被 let 的次数
+        self.letLiterals:Dict[str, FuncLiteral] = dict() # let 绑定到函数字面量的名字
+        self.assigned:Set[str] = set() # 被赋值过的名字
+        self.parameters:Set[str] = set() # 用作形参的名字
+        self.literals:List[FuncLiteral] = []
+        self.functions:Dict[str, FuncLiteral] = dict() # 稳定函数名
+        self._callees:Set[FuncLiteral] = set()
+
+    def analyze(self, program:Program) -> Set[FuncLiteral]:
+        for statement in program.statements():
+            self._collect(statement)
+        self.functions = {name:literal for name, literal in self.letLiterals.items()
+            if self.letCounts[name] == 1 and name not in self.assigned and name not in self.parameters and name != Evaluator.BUILDIN_FUNC_PRINTIN}
+        callees:Dict[FuncLiteral, Set[FuncLiteral]] = dict()
+        for literal in self.literals:
+            self._callees = set()
+            if self._check(literal.body(), [set(literal.parameterNames())]):
+                callees[literal] = self._callees
+        # 先假设局部检查通过的都是纯函数，再逐步去掉调用了非纯函数的，处理递归、互相递归
+        pure = set(callees)
+        changed = True
+        while changed:
+            changed = False
+            for literal in list(pure):
+                if not callees[literal] <= pure:
+                    pure.discard(literal)
+                    changed = True
+        return pure
+
+    def _collect(self, node:Node) -> None: # 统计 let、赋值、形参和所有函数字面量
+        kind = node.kind
+        if kind == NodeKinds.LET_STATEMENT or kind == NodeKinds.ASSIGN_STATEMENT:
+            name = node.identifier().name()
+            if kind == NodeKinds.LET_STATEMENT:
+                self.letCounts[name] = self.letCounts.get(name, 0) + 1
+                if node.expression().kind == NodeKinds.FUNC_LITERAL_EXPRESSION:
+                    self.letLiterals[name] = node.expression()
+            else:
+                self.assigned.add(name)
+            self._collect(node.expression())
+        elif kind == NodeKinds.FUNC_LITERAL_EXPRESSION:
+            self.literals.append(node)
+            self.parameters.update(node.parameterNames())
+            self._collect(node.body())
+        else:
+            for child in PurityAnalyzer.children(node):
+                self._collect(child)
+
+    def _check(self, node:Node, scopes:List[Set[str]]) -> bool: # 函数体的局部检查，scopes 是函数内各层栈帧已声明的变量
+        kind = node.kind
+        if kind == NodeKinds.BLOCK_STATEMENT:
+            scopes.append(set())
+            pure = all(self._check(s, scopes) for s in node.statements())
+            scopes.pop()
+            return pure
+        if kind == NodeKinds.LET_STATEMENT:
+            if not self._check(node.expression(), scopes):
+                return False
+            scopes[-1].add(node.identifier().name())
+            return True
+        if kind == NodeKinds.ASSIGN_STATEMENT: # 只能给自己的变量赋值
+            return PurityAnalyzer._declared(node.identifier().name(), scopes) and self._check(node.expression(), scopes)
+        if kind == NodeKinds.IDENTIFIER_EXPRESSION:
+            name = node.name()
+            return PurityAnalyzer._declared(name, scopes) or name in self.functions
+        if kind == NodeKinds.FUNC_CALLER_EXPRESSION: # 只能调用稳定函数名
+            callee = node.callee()
+            if callee.kind != NodeKinds.IDENTIFIER_EXPRESSION or PurityAnalyzer._declared(callee.name(), scopes):
+                return False
+            literal = self.functions.get(callee.name())
+            if literal is None:
+                return False
+            self._callees.add(literal)
+            return all(self._check(a, scopes) for a in node.arguments())
+        if kind == NodeKinds.FUNC_LITERAL_EXPRESSION:
+            return False
+        return all(self._check(child, scopes) for child in PurityAnalyzer.children(node))
+
+    @staticmethod
+    def _declared(name:str, scopes:List[Set[str]]) -> bool:
+        return any(name in scope for scope in scopes)
+    @staticmethod
+    def children(node:Node) -> Iterable[Node]: # 子节点，不包括函数字面量的形参和函数体
+        kind = node.kind
+        if kind == NodeKinds.BLOCK_STATEMENT or kind == NodeKinds.PROGRAM_STATEMENT:
+            return node.statements()
+        if kind == NodeKinds.ASSIGN_STATEMENT or kind == NodeKinds.LET_STATEMENT or kind == NodeKinds.RETURN_STATEMENT or kind == NodeKinds.EXPRESSION_STATEMENT:
+            return (node.expression(),)
+        if kind == NodeKinds.IF_STATEMENT:
+            return (node.condition(), node.consequence(), node.alternative())
+        if kind == NodeKinds.WHILE_STATEMENT:
+            return (node.condition(), node.body())
+        if kind == NodeKinds.PREFIX_EXPRESSION:
+            return (node.rawExpression(),)
+        if kind == NodeKinds.BINARY_EXPRESSION:
+            return (node.left(), node.right())
+        if kind == NodeKinds.FUNC_CALLER_EXPRESSION:
+            return [node.callee()] + node.arguments()
+        return ()
+
+
+class Memoizer:
+    '''
+    设置为 Evaluator.memo 后生效：调用纯函数时，实参求值之后先查缓存，命中则不执行函数体
+    每个纯函数一个 LRU，最多 capacity 项，超出时淘汰最久未使用的
+    '''
+    def __init__(self, program:Program, capacity:int = 1024) -> None:
+        self.capacity = capacity
+        analyzer = PurityAnalyzer()
+        self.caches:Dict[FuncLiteral, OrderedDict[tuple, Object]] = {literal:OrderedDict() for literal in analyzer.analyze(program)}
+        self.names:Dict[FuncLiteral, str] = {literal:name for name, literal in analyzer.functions.items()}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, funcObj:FuncObject, arguments:Iterable[Object]) -> Optional[tuple]: # 缓存键，不是纯函数或实参不全是整数、布尔值时返回 None
+        literal = funcObj.literal()
+        if literal not in self.caches:
+            return None
+        key:List = [literal]
+        for argument in arguments:
+            argumentType = type(argument)
+            if argumentType is not IntegerObject and argumentType is not BoolObject:
+                return None
+            key.append(argumentType) # 区分 1 和 true
+            key.append(argument.value())
+        return tuple(key)
+    def get(self, key:tuple) -> Optional[Object]:
+        cache = self.caches[key[0]]
+        result = cache.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            cache.move_to_end(key)
+            self.hits += 1
+        return result
+    def put(self, key:tuple, result:Object) -> None:
+        cache = self.caches[key[0]]
+        cache[key] = result
+        if len(cache) > self.capacity:
+            cache.popitem(last=False)
+            self.evictions += 1
+
+    def pureFunctions(self) -> List[str]:
+        return sorted(self.names.get(literal, "fn") for literal in self.caches)
+    def __str__(self) -> str:
+        return f"memo hits {self.hits}, misses {self.misses}, evictions {self.evictions}, pure functions {self.pureFunctions()}"
+
+
+if __name__ == "__main__":
+    import io
+    import contextlib
+    from it_interpreter.it_parser import parser
+    def _memoize(code:str, capacity:int = 1024) -> None:
+        program = parser.parse(io.BytesIO(code.encode("ascii")))
+        expected = Evaluator()
+        expectedOutput = io.StringIO()
+        with contextlib.redirect_stdout(expectedOutput):
+            expected.eval(program)
+        evaluator = Evaluator()
+        evaluator.memo = Memoizer(program, capacity)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            evaluator.eval(program)
+        assert str(evaluator.result) == str(expected.result), f"{code} {evaluator.result} != {expected.result}"
+        assert output.getvalue() == expectedOutput.getvalue() and str(evaluator.env) == str(expected.env), code
+        print(f"{code}\n==>{evaluator.result}  ({evaluator.memo})")
+
+    _memoize("let fib = fn(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }; fib(18);")
+    _memoize("let fib = fn(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }; fib(18);", 2)
+    _memoize("let c = fn(n, k) { if (k == 0) { return 1; } if (k == n) { return 1; } return c(n - 1, k - 1) + c(n - 1, k); }; c(14, 7);")
+    _memoize("let even = fn(n) { if (n == 0) { return true; } return odd(n - 1); }; let odd = fn(n) { if (n == 0) { return false; } return even(n - 1); }; even(10) == odd(9);")
+    _memoize("let sum = fn(n) { let s = 0; let i = 0; while (i < n) { i = i + 1; s = s + i; } return s; }; sum(10) + sum(10);")
+    # 不是纯函数
+    _memoize("let x = 1; let f = fn(n) { return n + x; }; f(1); x = 2; f(1);") # 读自由变量
+    _memoize("let f = fn(n) { println(n); return n; }; f(1); f(1);") # println
+    _memoize("let x = 1; let f = fn(n) { x = x + n; return x; }; f(1); f(1);") # 给非局部变量赋值
+    _memoize("let f = fn(n) { { let y = 1; } y = n; return n; }; let y = 0; f(3); y;") # y 已退栈，赋值的是调用者的 y
+    _memoize("let g = fn(n) { return n; }; let f = fn(n) { return g(n); }; let h = fn(g) { return f(1); }; h(fn(n) { return 2; });") # g 用作形参，不是稳定函数名
+    _memoize("let g = fn(n) { return n; }; let f = fn(n) { return g(n); }; f(1); g = fn(n) { return 0; }; f(1);") # g 被赋值
+    _memoize("let id = fn(a) { return a; }; id(1); id(true); id(id);") # 1 和 true 区分，函数实参不缓存
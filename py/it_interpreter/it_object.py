@@ -3,11 +3,12 @@
 IntegerObject 整形对象
 BoolObject 布尔对象
 NullObject 空对象，出现在非表达式求值时
+对象都不可变，可以共享：布尔值和空值只有 TRUE/FALSE/NULL 三个对象，小整数预先创建，分别用 BoolObject.of、IntegerObject.of 获取
 '''
 
 from it_interpreter.it_token import TokenTypes, TokenType
-from it_interpreter.it_ast import Block
-from typing import Any, TypeVar, Type, List
+from it_interpreter.it_ast import Block, FuncLiteral
+from typing import Any, Callable, Dict, TypeVar, Type, List, Optional, Tuple
 
 class ObjectType(str):
     '''
@@ -22,6 +23,7 @@ class ObjectTypes:
     NULL = ObjectType("NULL")
 
 class Object:
+    __slots__ = ()
     T = TypeVar("T")
     def objectType(self):
         raise NotImplementedError
@@ -36,9 +38,16 @@ class Object:
             raise Exception(f"{self} if not {hint.__name__}")
 
 class IntegerObject(Object):
+    __slots__ = ("_value",)
+    SMALL_MIN = -128 # 预先创建的小整数范围 [SMALL_MIN, SMALL_MAX]
+    SMALL_MAX = 1024
     def __init__(self, value:int) -> None:
-        super().__init__()
         self._value = value
+    @staticmethod
+    def of(value:int) -> "IntegerObject": # 小整数返回共享的对象
+        if IntegerObject.SMALL_MIN <= value <= IntegerObject.SMALL_MAX:
+            return SMALL_INTEGERS[value - IntegerObject.SMALL_MIN]
+        return IntegerObject(value)
     def objectType(self)->ObjectType:
         return ObjectTypes.INTEGRE
     def value(self)->int:
@@ -47,9 +56,12 @@ class IntegerObject(Object):
         return str(self._value)
     
 class BoolObject(Object):
+    __slots__ = ("_value",)
     def __init__(self, value:bool) -> None:
-        super().__init__()
         self._value = value
+    @staticmethod
+    def of(value:bool) -> "BoolObject":
+        return TRUE if value else FALSE
     def objectType(self)->ObjectType:
         return ObjectTypes.BOOL
     def value(self)->bool:
@@ -58,66 +70,74 @@ class BoolObject(Object):
         return "true" if self._value else "false"
 
 class FuncObject(Object):
-    def __init__(self, parameters:List[str], body:Block) -> None:
-        super().__init__()
+    '''
+    body 为 None 时函数体尚未解析，第一次调用时从 literal 取得（解析结果缓存在 FuncLiteral 上）
+    '''
+    __slots__ = ("_parameters", "_body", "_literal")
+    def __init__(self, parameters:List[str], body:Optional[Block], literal:Optional[FuncLiteral] = None) -> None:
         self._parameters = parameters
         self._body = body
+        self._literal = literal
     def objectType(self)->ObjectType:
         return ObjectTypes.FUNC
     def parameters(self) -> List[str]:
         return self._parameters
     def body(self) -> Block:
+        if self._body is None:
+            self._body = self._literal.body()
         return self._body
+    def literal(self) -> Optional[FuncLiteral]: # 创建它的函数字面量，内置函数没有
+        return self._literal
     def __str__(self) -> str:
         return "func"
 
 class NullObject(Object):
-    def __init__(self) -> None:
-        super().__init__()
+    __slots__ = ()
     def objectType(self)->ObjectType:
         return ObjectTypes.NULL
     def __str__(self) -> str:
         return "null"
+
+TRUE = BoolObject(True)
+FALSE = BoolObject(False)
+NULL = NullObject()
+SMALL_INTEGERS:List[IntegerObject] = [IntegerObject(v) for v in range(IntegerObject.SMALL_MIN, IntegerObject.SMALL_MAX + 1)]
     
 class operation:
+    '''
+    运算按 (运算符, 操作数类型...) 查表，表中是直接对值运算的函数，没有的组合报错
+    '''
+    UNARY:Dict[Tuple[TokenType, type], Callable[[Any], Object]] = {
+        (TokenTypes.OP_MINUS, IntegerObject):lambda a: IntegerObject.of(-a), # 负号
+        (TokenTypes.OP_BANG, BoolObject):lambda a: FALSE if a else TRUE, # 否定
+    }
+    BINARY:Dict[Tuple[TokenType, type, type], Callable[[Any, Any], Object]] = { # 四则运算，大于小于等于不等于
+        (TokenTypes.OP_PLUS, IntegerObject, IntegerObject):lambda a, b: IntegerObject.of(a + b),
+        (TokenTypes.OP_MINUS, IntegerObject, IntegerObject):lambda a, b: IntegerObject.of(a - b),
+        (TokenTypes.OP_ASTERISK, IntegerObject, IntegerObject):lambda a, b: IntegerObject.of(a * b),
+        (TokenTypes.OP_SLASH, IntegerObject, IntegerObject):lambda a, b: IntegerObject.of(a // b),
+        (TokenTypes.OP_GT, IntegerObject, IntegerObject):lambda a, b: TRUE if a > b else FALSE,
+        (TokenTypes.OP_GTE, IntegerObject, IntegerObject):lambda a, b: TRUE if a >= b else FALSE,
+        (TokenTypes.OP_LT, IntegerObject, IntegerObject):lambda a, b: TRUE if a < b else FALSE,
+        (TokenTypes.OP_LTE, IntegerObject, IntegerObject):lambda a, b: TRUE if a <= b else FALSE,
+        (TokenTypes.OP_EQ, IntegerObject, IntegerObject):lambda a, b: TRUE if a == b else FALSE,
+        (TokenTypes.OP_EQ, BoolObject, BoolObject):lambda a, b: TRUE if a == b else FALSE,
+        (TokenTypes.OP_NEQ, IntegerObject, IntegerObject):lambda a, b: TRUE if a != b else FALSE,
+        (TokenTypes.OP_NEQ, BoolObject, BoolObject):lambda a, b: TRUE if a != b else FALSE,
+    }
     @staticmethod
     def unary(operator:TokenType, object:Object) -> Object:
+        function = operation.UNARY.get((operator, type(object)))
+        if function is not None:
+            return function(object._value)
         if object.objectType() == ObjectTypes.NULL:
             raise Exception(f"operate {operator} on null value")
-        if operator == TokenTypes.OP_MINUS and object.objectType() == ObjectTypes.INTEGRE: # 负号
-            return IntegerObject(-object.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_BANG and object.objectType() == ObjectTypes.BOOL: # 否定
-            return BoolObject(not object.treatAs(BoolObject).value())
         raise Exception(f"invalid operation {operator} on {object}")
     @staticmethod
-    def binary(operator:TokenType, left:Object, right:Object) -> Object: # 四则运算，大于小于等于不等于
+    def binary(operator:TokenType, left:Object, right:Object) -> Object:
+        function = operation.BINARY.get((operator, type(left), type(right)))
+        if function is not None:
+            return function(left._value, right._value)
         if left.objectType() == ObjectTypes.NULL or right.objectType() == ObjectTypes.NULL:
             raise Exception(f"operate {operator} on null value")
-        if operator == TokenTypes.OP_PLUS and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # +
-            return IntegerObject(left.treatAs(IntegerObject).value() + right.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_MINUS and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # -
-            return IntegerObject(left.treatAs(IntegerObject).value() - right.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_ASTERISK and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # *
-            return IntegerObject(left.treatAs(IntegerObject).value() * right.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_SLASH and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # /
-            return IntegerObject(left.treatAs(IntegerObject).value() // right.treatAs(IntegerObject).value())
-        
-        if operator == TokenTypes.OP_GT and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # >
-            return BoolObject(left.treatAs(IntegerObject).value() > right.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_GTE and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # >=
-            return BoolObject(left.treatAs(IntegerObject).value() >= right.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_LT and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # <
-            return BoolObject(left.treatAs(IntegerObject).value() < right.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_LTE and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # <=
-            return BoolObject(left.treatAs(IntegerObject).value() <= right.treatAs(IntegerObject).value())
-        
-        if operator == TokenTypes.OP_EQ and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # == int
-            return BoolObject(left.treatAs(IntegerObject).value() == right.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_EQ and left.objectType() == ObjectTypes.BOOL and right.objectType() == ObjectTypes.BOOL: # == bool
-            return BoolObject(left.treatAs(BoolObject).value() == right.treatAs(BoolObject).value())
-
-        if operator == TokenTypes.OP_NEQ and left.objectType() == ObjectTypes.INTEGRE and right.objectType() == ObjectTypes.INTEGRE: # != int
-            return BoolObject(left.treatAs(IntegerObject).value() != right.treatAs(IntegerObject).value())
-        if operator == TokenTypes.OP_NEQ and left.objectType() == ObjectTypes.BOOL and right.objectType() == ObjectTypes.BOOL: # != bool
-            return BoolObject(left.treatAs(BoolObject).value() != right.treatAs(BoolObject).value())
-        raise Exception(f"invalid operation {left} {operator} {right}")
\ No newline at end of file
+        raise Exception(f"invalid operation {left} {operator} {right}")
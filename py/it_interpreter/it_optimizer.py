@@ -0,0 +1,212 @@
+'''
+AST 优化，位于解析和求值/编译之间
+常量折叠：操作数都是字面量的前缀、二元表达式，按 operation.unary/binary 的语义在编译期算出结果
+死分支消除：条件为常量的 if 只保留被选中的分支，条件为 false 的 while 删除循环体
+return 之后的语句不会执行，直接删除
+除零、类型不匹配等运行期错误不折叠，保留到运行时报告；也不做 x*1 之类的代数化简，x 不一定是整数
+'''
+from it_interpreter.it_ast import *
+from it_interpreter.it_object import Object, IntegerObject, BoolObject, ObjectTypes, operation
+from typing import Callable, List, Optional
+
+
+class Optimizer:
+    '''
+    optimize 返回优化后的节点，不修改原 AST（原 AST 可能在缓存中共享），子树没有变化时直接复用
+    尚未解析的延迟函数体保持原样
+    '''
+    def __init__(self) -> None:
+        # 分派表，下标是节点种类 NodeKinds，没有列出的节点原样返回
+        self.optimizers:List[Callable[[Node], Node]] = [self._keep] * NodeKinds.COUNT
+        self.optimizers[NodeKinds.PROGRAM_STATEMENT] = self._optimizeProgram
+        self.optimizers[NodeKinds.BLOCK_STATEMENT] = self._optimizeBlock
+        self.optimizers[NodeKinds.ASSIGN_STATEMENT] = self._optimizeAssignStatement
+        self.optimizers[NodeKinds.LET_STATEMENT] = self._optimizeLetStatement
+        self.optimizers[NodeKinds.RETURN_STATEMENT] = self._optimizeReturnStatement
+        self.optimizers[NodeKinds.EXPRESSION_STATEMENT] = self._optimizeExpressionStatement
+        self.optimizers[NodeKinds.IF_STATEMENT] = self._optimizeIfStatement
+        self.optimizers[NodeKinds.WHILE_STATEMENT] = self._optimizeWhileStatement
+        self.optimizers[NodeKinds.PREFIX_EXPRESSION] = self._optimizePrefixExpression
+        self.optimizers[NodeKinds.BINARY_EXPRESSION] = self._optimizeBinaryExpression
+        self.optimizers[NodeKinds.FUNC_LITERAL_EXPRESSION] = self._optimizeFuncLiteral
+        self.optimizers[NodeKinds.FUNC_CALLER_EXPRESSION] = self._optimizeFuncCaller
+        self.folded = 0 # 折叠的表达式个数
+        self.pruned = 0 # 删除的分支、语句个数
+    def optimize(self, node:Node) -> Node:
+        return self.optimizers[node.kind](node)
+    def _keep(self, node:Node) -> Node:
+        return node
+
+    # statement
+    def _optimizeStatements(self, statements:List[Statement]) -> List[Statement]:
+        optimized:List[Statement] = []
+        for i, statement in enumerate(statements):
+            statement = self.optimize(statement)
+            optimized.append(statement)
+            if Optimizer.alwaysReturns(statement): # 之后的语句不会执行
+                self.pruned += len(statements) - i - 1
+                break
+        return optimized
+    def _optimizeProgram(self, node:Program) -> Program:
+        statements = self._optimizeStatements(node.statements())
+        if Optimizer._same(statements, node.statements()):
+            return node
+        block = Block()
+        block.setStatements(statements)
+        return Program(block, node.symbols)
+    def _optimizeBlock(self, node:Block) -> Block:
+        statements = self._optimizeStatements(node.statements())
+        if Optimizer._same(statements, node.statements()):
+            return node
+        block = Block()
+        for statement in statements:
+            block.addStatement(statement)
+        return block
+    def _optimizeAssignStatement(self, node:AssignStatement) -> AssignStatement:
+        expression = self.optimize(node.expression())
+        return node if expression is node.expression() else AssignStatement(node.identifier(), expression)
+    def _optimizeLetStatement(self, node:LetStatement) -> LetStatement:
+        expression = self.optimize(node.expression())
+        return node if expression is node.expression() else LetStatement(node.identifier(), expression)
+    def _optimizeReturnStatement(self, node:ReturnStatement) -> ReturnStatement:
+        expression = self.optimize(node.expression())
+        return node if expression is node.expression() else ReturnStatement(expression)
+    def _optimizeExpressionStatement(self, node:ExpressionStatement) -> ExpressionStatement:
+        expression = self.optimize(node.expression())
+        return node if expression is node.expression() else ExpressionStatement(expression)
+    def _optimizeIfStatement(self, node:IfStatement) -> Statement:
+        condition = self.optimize(node.condition())
+        value = Optimizer.constant(condition)
+        if value is not None and value.objectType() == ObjectTypes.BOOL: # 常量条件，只保留一个分支
+            self.pruned += 1
+            branch = self.optimize(node.consequence() if value.treatAs(BoolObject).value() else node.alternative())
+            if Optimizer.setsResult(branch):
+                return branch # 仍然是代码块，作用域不变
+            return ExpressionStatement(condition) # 分支不产生结果时，if 的结果是条件的值
+        consequence = self.optimize(node.consequence())
+        alternative = self.optimize(node.alternative())
+        if condition is node.condition() and consequence is node.consequence() and alternative is node.alternative():
+            return node
+        return IfStatement(condition, consequence, alternative)
+    def _optimizeWhileStatement(self, node:WhileStatement) -> Statement:
+        condition = self.optimize(node.condition())
+        value = Optimizer.constant(condition)
+        if value is not None and value.objectType() == ObjectTypes.BOOL and not value.treatAs(BoolObject).value():
+            self.pruned += 1
+            return ExpressionStatement(condition) # 循环体一次都不执行，结果是条件的值
+        body = self.optimize(node.body())
+        if condition is node.condition() and body is node.body():
+            return node
+        return WhileStatement(condition, body)
+
+    # expression
+    def _optimizePrefixExpression(self, node:PrefixExpression) -> Expression:
+        expression = self.optimize(node.rawExpression())
+        if expression.kind == NodeKinds.INTEGER_LITERAL_EXPRESSION and node.prefixType() == TokenTypes.OP_MINUS:
+            return node if expression is node.rawExpression() else PrefixExpression(node.prefixToken, expression) # 负数字面量
+        value = Optimizer.constant(expression)
+        if value is not None:
+            try:
+                result = operation.unary(node.prefixType(), value)
+            except Exception: # 运行时报错
+                result = None
+            if result is not None:
+                self.folded += 1
+                return Optimizer.literal(result)
+        return node if expression is node.rawExpression() else PrefixExpression(node.prefixToken, expression)
+    def _optimizeBinaryExpression(self, node:BinaryOperatorExpression) -> Expression:
+        left = self.optimize(node.left())
+        right = self.optimize(node.right())
+        leftValue = Optimizer.constant(left)
+        rightValue = Optimizer.constant(right) if leftValue is not None else None
+        if rightValue is not None:
+            try:
+                result = operation.binary(node.operatorType(), leftValue, rightValue)
+            except Exception: # 除零、类型不匹配等运行时报错
+                result = None
+            if result is not None:
+                self.folded += 1
+                return Optimizer.literal(result)
+        if left is node.left() and right is node.right():
+            return node
+        return BinaryOperatorExpression(left, node.operator(), right)
+    def _optimizeFuncLiteral(self, node:FuncLiteral) -> FuncLiteral:
+        body = node.parsedBody()
+        if body is None: # 延迟解析的函数体不在这里解析
+            return node
+        optimized = self.optimize(body)
+        return node if optimized is body else FuncLiteral(node.parameters(), optimized)
+    def _optimizeFuncCaller(self, node:FuncCaller) -> FuncCaller:
+        callee = self.optimize(node.callee())
+        arguments = [self.optimize(a) for a in node.arguments()]
+        if callee is node.callee() and Optimizer._same(arguments, node.arguments()):
+            return node
+        return FuncCaller(callee, arguments)
+
+    @staticmethod
+    def constant(expression:Expression) -> Optional[Object]: # 字面量的值，不是字面量时返回 None
+        kind = expression.kind
+        if kind == NodeKinds.INTEGER_LITERAL_EXPRESSION:
+            return IntegerObject.of(expression.integerValue())
+        if kind == NodeKinds.BOOL_LITERAL_EXPRESSION:
+            return BoolObject.of(expression.boolValue())
+        if kind == NodeKinds.PREFIX_EXPRESSION and expression.prefixType() == TokenTypes.OP_MINUS \
+                and expression.rawExpression().kind == NodeKinds.INTEGER_LITERAL_EXPRESSION: # 负数字面量
+            return IntegerObject.of(-expression.rawExpression().integerValue())
+        return None
+    @staticmethod
+    def literal(value:Object) -> Expression: # 常量转回字面量，负数表示为 -字面量
+        if value.objectType() == ObjectTypes.BOOL:
+            return BoolLiteral(FixedTokenMap[TokenTypes.KW_TRUE if value.treatAs(BoolObject).value() else TokenTypes.KW_FALSE])
+        integer = value.treatAs(IntegerObject).value()
+        if integer < 0:
+            return PrefixExpression(FixedTokenMap[TokenTypes.OP_MINUS], IntegerLiteral(Token(TokenTypes.INTEGER, str(-integer))))
+        return IntegerLiteral(Token(TokenTypes.INTEGER, str(integer)))
+    @staticmethod
+    def alwaysReturns(statement:Statement) -> bool: # 执行后一定处于返回模式
+        kind = statement.kind
+        if kind == NodeKinds.RETURN_STATEMENT:
+            return True
+        if kind == NodeKinds.BLOCK_STATEMENT:
+            return any(Optimizer.alwaysReturns(s) for s in statement.statements())
+        if kind == NodeKinds.IF_STATEMENT:
+            return Optimizer.alwaysReturns(statement.consequence()) and Optimizer.alwaysReturns(statement.alternative())
+        return False
+    @staticmethod
+    def setsResult(block:Block) -> bool: # 执行代码块一定会更新求值结果，只由空代码块组成的代码块不会
+        return any(s.kind != NodeKinds.BLOCK_STATEMENT or Optimizer.setsResult(s) for s in block.statements())
+    @staticmethod
+    def _same(a:List[Node], b:List[Node]) -> bool:
+        return len(a) == len(b) and all(x is y for x, y in zip(a, b))
+
+
+if __name__ == "__main__":
+    import io
+    from it_interpreter.it_parser import parser
+    from it_interpreter.it_evaluator import Evaluator
+    def _optimize(code:str) -> None:
+        program = parser.parse(io.BytesIO(code.encode("ascii")))
+        optimizer = Optimizer()
+        optimized = optimizer.optimize(program)
+        expected, actual = Evaluator(), Evaluator()
+        expected.eval(program)
+        actual.eval(optimized)
+        assert str(expected.result) == str(actual.result) and str(expected.env) == str(actual.env), f"{expected.result} != {actual.result}"
+        print(f"{code}\n==> {optimized}  (folded {optimizer.folded}, pruned {optimizer.pruned})")
+
+    _optimize("(2 + 3) * 4;")
+    _optimize("let a = 1 - 5 * 2; a = -a + --3; !(1 > 0 == true);")
+    _optimize("if (1 > 0) { 12; } else { 21; }")
+    _optimize("if (1 < 0) { 12; }")
+    _optimize("if (1 < 0) { 12; } else { {} }")
+    _optimize("let x = 3; if (x > 2) { x = x * 1; }")
+    _optimize("while (1 > 2) { 3; } 4;")
+    _optimize("let f = fn(n) { if (true) { return n + 2 * 3; } return 0; n; }; f(1);")
+    _optimize("1; return 2 + 3; 4; 5;")
+    _optimize("if (2 > 1) { return 1; } else { 2; } 3;")
+    _optimize("{ return 10 / 3; } 1;")
+    _optimize("let a = 1; if (a == 1) { return 1; } else { return 2; } 3;")
+    for code in ["1 / 0;", "1 + true;", "-true;", "if (1) { 2; }"]: # 运行时错误不折叠
+        program = parser.parse(io.BytesIO(code.encode("ascii")))
+        optimized = Optimizer().optimize(program)
+        print(code, "==>", optimized, optimized is program)
@@ -3,11 +3,13 @@ parser 语法分析
 Syntax analysis (also known as parsing) involves parsing the token sequence to identify the syntactic structure of the program.
 词法分析，或 parsing，将 token 序列转为语法结构
 '''
-from it_interpreter.it_tokenizer import Tokenizer, SourceReader
-from it_interpreter.it_token import Token, TokenTypes
+from it_interpreter.it_tokenizer import Tokenizer, FastTokenizer, SourceReader, BufferedSourceReader
+from it_interpreter.it_token import Token, TokenType, TokenTypes, TokenTypeList, FixedTokenMap, SymbolTable
+from it_interpreter.it_tokentable import TokenTable
 from it_interpreter.it_ast import *
 from it_interpreter.it_prority import Priority
-from typing import Union, List
+from it_interpreter.it_pratt import PrattParser, IterativeParser
+from typing import Iterator, Union, List
 from queue import Queue
 import io
 
@@ -16,16 +18,32 @@ class parser:
     def isPrefixOperator(token:Token)->bool: # 是否前缀运算符 -/!
         return token.tokenType == TokenTypes.OP_MINUS or token.tokenType == TokenTypes.OP_BANG
     @staticmethod
-    def parse(input:io.IOBase)->Program:
-        sr = SourceReader(input)
+    def parse(input:io.IOBase, iterative:bool = False, lazy:bool = False)->Program: # iterative 使用显式栈解析，支持任意深的嵌套；lazy 函数体推迟到第一次调用时解析
+        parserClass = IterativeParser if iterative else PrattParser
+        return parserClass.fromTokenizer(FastTokenizer(BufferedSourceReader.fromInput(input)), lazy).parse()
+    @staticmethod
+    def parseFile(path:str, iterative:bool = False, lazy:bool = False)->Program: # 文件使用 mmap 读取，解析完关闭（延迟解析的函数体只引用 token）
+        parserClass = IterativeParser if iterative else PrattParser
+        with BufferedSourceReader.fromFile(path) as reader:
+            return parserClass.fromTokenizer(FastTokenizer(reader), lazy).parse()
+    @staticmethod
+    def streamFile(path:str)->Iterator[Statement]: # 流式解析文件，逐条产生顶层语句，读完或生成器被丢弃时关闭文件
+        with BufferedSourceReader.fromFile(path) as reader:
+            yield from Parser(FastTokenizer(reader)).parseStatements()
+    @staticmethod
+    def parseReader(sr:SourceReader)->Program:
         tn = Tokenizer(sr)
         ps = Parser(tn)
         return ps.parse()
+    @staticmethod
+    def parseTable(source:TokenTable.Source)->Program: # 先构建 TokenTable，再用游标解析
+        return TableParser(TokenTable.build(source)).parse()
     
 
 class Parser:
-    def __init__(self, tokenizer:Tokenizer) -> None:
+    def __init__(self, tokenizer:Union[Tokenizer, FastTokenizer]) -> None:
         self.tokenizer = tokenizer
+        self.symbols:SymbolTable = tokenizer.symbols
         self.unreadStack:List[Token] = []
         self.TailQueue:Queue[Token] = Queue()
     def nextToken(self)->Token: # 读下一个 token
@@ -39,42 +57,50 @@ class Parser:
         t = self.nextToken()
         self.unreadToken(t)
         return t
+    def topType(self)->TokenType: # 查看下一个 token 的类型
+        return self.topToken().tokenType
     def tailAppend(self, token:Token)->None:
         self.TailQueue.put(token)
     def parse(self)->Program: # 解析程序
-        self.unreadToken(Token(TokenTypes.L_BRACE))
-        self.tailAppend(Token(TokenTypes.R_BRACE))
-        program = Program(self.parseBlock())
+        self.unreadToken(FixedTokenMap[TokenTypes.L_BRACE])
+        self.tailAppend(FixedTokenMap[TokenTypes.R_BRACE])
+        program = Program(self.parseBlock(), self.symbols)
         eofToken = self.nextToken().checkTokenType(TokenTypes.EOF)
         return program
+    def parseStatements(self)->Iterator[Statement]: # 流式解析程序，逐条产生顶层语句，不构建 Program
+        while self.topType() != TokenTypes.EOF:
+            yield self.parseStatement()
     def parseBlock(self)->Block:
         leftBraceToken = self.nextToken().checkTokenType(TokenTypes.L_BRACE)
         block = Block()
-        while self.topToken().tokenType != TokenTypes.R_BRACE: # topToken 不是右大括号 }
-            if self.topToken().tokenType == TokenTypes.KW_LET: # 解析 LET 语句
-                block.addStatement(self.parseLetStatement())
-            elif self.topToken().tokenType == TokenTypes.KW_RETURN: # 解析 RETURN 语句
-                block.addStatement(self.parseReturnStatement())
-            elif self.topToken().tokenType == TokenTypes.KW_IF: # 解析 IF 语句
-                block.addStatement(self.parseIfStatement())
-            elif self.topToken().tokenType == TokenTypes.KW_WHILE: # 解析 IF 语句
-                block.addStatement(self.parseWhileStatement())                
-            elif self.topToken().tokenType == TokenTypes.L_BRACE: # 解析 block 语句
-                block.addStatement(self.parseBlock())
-            elif self.topToken().tokenType == TokenTypes.SEMICOLON: # 空语句
-                block.addStatement(self.parseEmptyStatement())
-            elif self.topToken().tokenType == TokenTypes.IDENTIFIER: # 赋值语句
-                identifierToken = self.nextToken().checkTokenType(TokenTypes.IDENTIFIER)
-                if self.topToken().tokenType == TokenTypes.OP_ASSIGN: 
-                    self.unreadToken(identifierToken)
-                    block.addStatement(self.parseAssignStatement())
-                else: # 表达式语句
-                    self.unreadToken(identifierToken)
-                    block.addStatement(self.parseExpressionStatement())
-            else: # 表达式语句
-                block.addStatement(self.parseExpressionStatement())
+        while self.topType() != TokenTypes.R_BRACE: # topToken 不是右大括号 }
+            block.addStatement(self.parseStatement())
         rightBraceToken = self.nextToken().checkTokenType(TokenTypes.R_BRACE)
         return block
+    def parseStatement(self)->Statement: # 解析一条语句
+        topType = self.topType()
+        if topType == TokenTypes.KW_LET: # 解析 LET 语句
+            return self.parseLetStatement()
+        elif topType == TokenTypes.KW_RETURN: # 解析 RETURN 语句
+            return self.parseReturnStatement()
+        elif topType == TokenTypes.KW_IF: # 解析 IF 语句
+            return self.parseIfStatement()
+        elif topType == TokenTypes.KW_WHILE: # 解析 IF 语句
+            return self.parseWhileStatement()
+        elif topType == TokenTypes.L_BRACE: # 解析 block 语句
+            return self.parseBlock()
+        elif topType == TokenTypes.SEMICOLON: # 空语句
+            return self.parseEmptyStatement()
+        elif topType == TokenTypes.IDENTIFIER: # 赋值语句
+            identifierToken = self.nextToken().checkTokenType(TokenTypes.IDENTIFIER)
+            if self.topType() == TokenTypes.OP_ASSIGN: 
+                self.unreadToken(identifierToken)
+                return self.parseAssignStatement()
+            else: # 表达式语句
+                self.unreadToken(identifierToken)
+                return self.parseExpressionStatement()
+        else: # 表达式语句
+            return self.parseExpressionStatement()
     def parseEmptyStatement(self)->EmptyStatement:
         semicolumnToken = self.nextToken().checkTokenType(TokenTypes.SEMICOLON) # 要求下一 token 是分号
         return EmptyStatement()
@@ -102,7 +128,7 @@ class Parser:
         condition = self.parseExpression(Priority.LOWEST)
         consequence = self.parseBlock()
         alternative = Block()
-        if self.topToken().tokenType == TokenTypes.KW_ELSE:
+        if self.topType() == TokenTypes.KW_ELSE:
             elseToken = self.nextToken().checkTokenType(TokenTypes.KW_ELSE)
             alternative = self.parseBlock()
         return IfStatement(condition, consequence, alternative)
@@ -117,13 +143,13 @@ class Parser:
     def parseFuncArguments(self)->List[Expression]: # 解析函数实参 (expr...)
         leftParenToken = self.nextToken().checkTokenType(TokenTypes.L_PAREN) # 读到 (
         arguments:List[Expression] = [] # 实参
-        if self.topToken().tokenType == TokenTypes.R_PAREN: # 马上读到 )，说明没有实参
+        if self.topType() == TokenTypes.R_PAREN: # 马上读到 )，说明没有实参
             rightParenToken = self.nextToken().checkTokenType(TokenTypes.R_PAREN)
             return []
         else: # 说明存在实参
             while True:
                 arguments.append(self.parseExpression(Priority.LOWEST)) # 读一个表达式
-                if self.topToken().tokenType == TokenTypes.R_PAREN: # 读到 )，实参读完
+                if self.topType() == TokenTypes.R_PAREN: # 读到 )，实参读完
                     rightParenToken = self.nextToken().checkTokenType(TokenTypes.R_PAREN)
                     return arguments
                 else: # 读一个逗号 , 继续循环
@@ -132,14 +158,14 @@ class Parser:
         funcToken = self.nextToken().checkTokenType(TokenTypes.KW_FUNC)
         leftParenToken = self.nextToken().checkTokenType(TokenTypes.L_PAREN)
         identifiers:List[IdentifierNode] = [] # 形参
-        while self.topToken().tokenType == TokenTypes.IDENTIFIER:
+        while self.topType() == TokenTypes.IDENTIFIER:
             identifiers.append(IdentifierNode(self.nextToken().checkTokenType(TokenTypes.IDENTIFIER)))
-            if self.topToken().tokenType == TokenTypes.R_PAREN:
+            if self.topType() == TokenTypes.R_PAREN:
                 break
             commaToken = self.nextToken().checkTokenType(TokenTypes.COMMA)
         rightParenToken = self.nextToken().checkTokenType(TokenTypes.R_PAREN)
         body = self.parseBlock() # 读函数体
-        if self.topToken().tokenType == TokenTypes.L_PAREN: # 读到 (，说明是立即函数
+        if self.topType() == TokenTypes.L_PAREN: # 读到 (，说明是立即函数
             return FuncCaller(FuncLiteral(identifiers, body), self.parseFuncArguments())
         else:
             return FuncLiteral(identifiers, body)
@@ -147,7 +173,7 @@ class Parser:
         # 首先解析出左操作数
         left = self.parseLeftOprand()
         # 然后组装二元运算符，注意只有优先级高才组合
-        while Priority.of(self.topToken().tokenType) > currentPriority:
+        while Priority.of(self.topType()) > currentPriority:
             operator = self.nextToken()
             left = BinaryOperatorExpression(left, operator, self.parseExpression(Priority.of(operator.tokenType)))
         return left
@@ -162,7 +188,7 @@ class Parser:
             elif firstToken.tokenType == TokenTypes.KW_TRUE or firstToken.tokenType == TokenTypes.KW_FALSE: # true/false 字面量
                 return BoolLiteral(firstToken)
             elif firstToken.tokenType == TokenTypes.IDENTIFIER: # 标识符
-                if self.topToken().tokenType == TokenTypes.L_PAREN: # 函数调用
+                if self.topType() == TokenTypes.L_PAREN: # 函数调用
                     self.unreadToken(firstToken)
                     return self.parseFuncCall()
                 else:
@@ -178,6 +204,33 @@ class Parser:
                 raise Exception(f"unexcept token {firstToken}")
 
 
+class TableParser(Parser):
+    '''
+    游标式语法分析器，直接消费 TokenTable
+    查看下一个 token 只读 kinds 数组，仅在构建 AST 需要时才创建 Token 对象
+    unreadToken 只能放回刚刚读出的 token
+    '''
+    def __init__(self, table:TokenTable) -> None:
+        self.table = table
+        self.symbols = table.symbols
+        self.kinds = table.kinds
+        self.last = len(table) - 1 # EOF 或 ILLEGAL，读到末尾后一直返回它
+        self.cursor = 0
+    def nextToken(self)->Token:
+        index = self.cursor
+        self.cursor = index + 1
+        return self.table.token(index if index < self.last else self.last)
+    def unreadToken(self, t:Token)->None:
+        self.cursor -= 1
+    def topToken(self)->Token:
+        return self.table.token(self.cursor if self.cursor < self.last else self.last)
+    def topType(self)->TokenType:
+        return TokenTypeList[self.kinds[self.cursor if self.cursor < self.last else self.last]]
+    def parse(self)->Program: # 不需要像 Parser 那样补充首尾大括号
+        block = Block()
+        for statement in self.parseStatements():
+            block.addStatement(statement)
+        return Program(block, self.symbols)
 
 
 if __name__ == "__main__":
@@ -189,6 +242,8 @@ if __name__ == "__main__":
         parser = Parser(tn)
         program = parser.parse()
         print(program)
+        assert str(TableParser(TokenTable.build(code.encode("ascii"))).parse()) == str(program)
+        assert [str(s) for s in Parser(Tokenizer(SourceReader(io.BytesIO(code.encode("ascii"))))).parseStatements()] == [str(s) for s in program.statements()]
         if len(program.statements()) > 1:
             for s in program.statements():
                 print(s.nodeType(), s.tokens())
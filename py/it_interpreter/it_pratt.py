@@ -0,0 +1,350 @@
+'''
+Pratt 语法分析器
+token 预先全部读入列表，向前查看只是下标访问，不再 nextToken/unreadToken 往返
+语句和前缀表达式通过 dict 分派表选择解析函数，二元运算符的优先级查 Priority.TABLE
+产生的 AST 与 Parser 完全一致
+'''
+from it_interpreter.it_tokenizer import FastTokenizer
+from it_interpreter.it_token import Token, TokenType, TokenTypes, SymbolTable, FixedTokenMap
+from it_interpreter.it_ast import *
+from it_interpreter.it_prority import Priority
+from typing import Callable, Dict, List, Union
+import functools
+
+
+class PrattParser:
+    '''
+    tokens 以 EOF 或 ILLEGAL 结尾，types 是与之平行的 token 类型列表，pos 是当前下标
+    '''
+    def __init__(self, tokens:List[Token], symbols:SymbolTable, lazy:bool = False) -> None:
+        self.tokens = tokens + [tokens[-1]] # 多放一个结尾 token，pos+1 的查看不会越界
+        self.types:List[TokenType] = [t.tokenType for t in self.tokens]
+        self.last = len(tokens) - 1
+        self.pos = 0
+        self.symbols = symbols
+        self.lazy = lazy # 预解析模式，函数体只做括号匹配，第一次调用时才解析
+        # 分派表，存放绑定方法，子类重写的解析函数同样生效
+        self.statementParsers:Dict[TokenType, Callable[[], Statement]] = {
+            TokenTypes.KW_LET:self.parseLetStatement,
+            TokenTypes.KW_RETURN:self.parseReturnStatement,
+            TokenTypes.KW_IF:self.parseIfStatement,
+            TokenTypes.KW_WHILE:self.parseWhileStatement,
+            TokenTypes.L_BRACE:self.parseBlock,
+            TokenTypes.SEMICOLON:self.parseEmptyStatement,
+        }
+        self.prefixParsers:Dict[TokenType, Callable[[Token], Expression]] = {
+            TokenTypes.OP_MINUS:self.parsePrefixExpression,
+            TokenTypes.OP_BANG:self.parsePrefixExpression,
+            TokenTypes.INTEGER:self.parseIntegerLiteral,
+            TokenTypes.KW_TRUE:self.parseBoolLiteral,
+            TokenTypes.KW_FALSE:self.parseBoolLiteral,
+            TokenTypes.IDENTIFIER:self.parseIdentifier,
+            TokenTypes.L_PAREN:self.parseGroup,
+            TokenTypes.KW_FUNC:self.parseFunction,
+        }
+    @classmethod
+    def fromTokenizer(cls, tk:FastTokenizer, lazy:bool = False) -> 'PrattParser':
+        tokens:List[Token] = []
+        while True:
+            t = tk.nextToken()
+            tokens.append(t)
+            if t.tokenType == TokenTypes.EOF or t.tokenType == TokenTypes.ILLEGAL:
+                return cls(tokens, tk.symbols, lazy)
+    @classmethod
+    def parseRange(cls, tokens:List[Token], start:int, end:int, symbols:SymbolTable) -> Block: # 解析 tokens[start:end] 范围内的函数体
+        return cls(tokens[start:end] + [FixedTokenMap[TokenTypes.EOF]], symbols, True).parseBlock()
+    def nextToken(self) -> Token: # 读下一个 token，读到末尾后一直返回结尾 token
+        pos = self.pos
+        if pos < self.last:
+            self.pos = pos + 1
+        return self.tokens[pos]
+    def expect(self, tokenType:TokenType) -> Token: # 读下一个 token 并检查类型
+        return self.nextToken().checkTokenType(tokenType)
+    def parse(self) -> Program:
+        block = Block()
+        types = self.types
+        while types[self.pos] != TokenTypes.EOF:
+            block.addStatement(self.parseStatement())
+        return Program(block, self.symbols)
+    def parseStatement(self) -> Statement:
+        topType = self.types[self.pos]
+        handler = self.statementParsers.get(topType)
+        if handler is not None:
+            return handler()
+        if topType == TokenTypes.IDENTIFIER and self.types[self.pos + 1] == TokenTypes.OP_ASSIGN: # 赋值语句
+            return self.parseAssignStatement()
+        return self.parseExpressionStatement() # 表达式语句
+    def parseBlock(self) -> Block:
+        self.expect(TokenTypes.L_BRACE)
+        block = Block()
+        types = self.types
+        while types[self.pos] != TokenTypes.R_BRACE:
+            block.addStatement(self.parseStatement())
+        self.expect(TokenTypes.R_BRACE)
+        return block
+    def parseEmptyStatement(self) -> EmptyStatement:
+        self.expect(TokenTypes.SEMICOLON)
+        return EmptyStatement()
+    def parseExpressionStatement(self) -> ExpressionStatement:
+        expression = self.parseExpression(Priority.LOWEST)
+        self.expect(TokenTypes.SEMICOLON)
+        return ExpressionStatement(expression)
+    def parseAssignStatement(self) -> AssignStatement:
+        identifierToken = self.expect(TokenTypes.IDENTIFIER)
+        self.expect(TokenTypes.OP_ASSIGN)
+        expression = self.parseExpression(Priority.LOWEST)
+        self.expect(TokenTypes.SEMICOLON)
+        return AssignStatement(IdentifierNode(identifierToken), expression)
+    def parseLetStatement(self) -> LetStatement:
+        self.expect(TokenTypes.KW_LET)
+        assign = self.parseAssignStatement()
+        return LetStatement(assign.identifier(), assign.expression())
+    def parseReturnStatement(self) -> ReturnStatement:
+        self.expect(TokenTypes.KW_RETURN)
+        expression = self.parseExpression(Priority.LOWEST)
+        self.expect(TokenTypes.SEMICOLON)
+        return ReturnStatement(expression)
+    def parseIfStatement(self) -> IfStatement:
+        self.expect(TokenTypes.KW_IF)
+        condition = self.parseExpression(Priority.LOWEST)
+        consequence = self.parseBlock()
+        alternative = Block()
+        if self.types[self.pos] == TokenTypes.KW_ELSE:
+            self.pos += 1
+            alternative = self.parseBlock()
+        return IfStatement(condition, consequence, alternative)
+    def parseWhileStatement(self) -> WhileStatement:
+        self.expect(TokenTypes.KW_WHILE)
+        condition = self.parseExpression(Priority.LOWEST)
+        body = self.parseBlock()
+        return WhileStatement(condition, body)
+
+    def parseExpression(self, currentPriority:int) -> Expression:
+        left = self.parsePrefix()
+        types = self.types
+        priorities = Priority.TABLE
+        while True:
+            priority = priorities.get(types[self.pos])
+            if priority is None:
+                raise Exception(f"unexcept token type {types[self.pos]}")
+            if priority <= currentPriority:
+                return left
+            operator = self.nextToken()
+            left = BinaryOperatorExpression(left, operator, self.parseExpression(priority))
+    def parsePrefix(self) -> Expression: # 解析左操作数
+        token = self.nextToken()
+        handler = self.prefixParsers.get(token.tokenType)
+        if handler is None:
+            raise Exception(f"unexcept token {token}")
+        return handler(token)
+    def parsePrefixExpression(self, token:Token) -> PrefixExpression: # -/!
+        return PrefixExpression(token, self.parsePrefix())
+    def parseIntegerLiteral(self, token:Token) -> IntegerLiteral:
+        return IntegerLiteral(token)
+    def parseBoolLiteral(self, token:Token) -> BoolLiteral:
+        return BoolLiteral(token)
+    def parseIdentifier(self, token:Token) -> Union[IdentifierNode, FuncCaller]:
+        if self.types[self.pos] == TokenTypes.L_PAREN: # 函数调用
+            return FuncCaller(IdentifierNode(token), self.parseFuncArguments())
+        return IdentifierNode(token)
+    def parseGroup(self, token:Token) -> Expression: # (expr)
+        expression = self.parseExpression(Priority.LOWEST)
+        self.expect(TokenTypes.R_PAREN)
+        return expression
+    def parseFunction(self, token:Token) -> Union[FuncLiteral, FuncCaller]: # fn(){} 或立即函数 fn(){}()
+        self.expect(TokenTypes.L_PAREN)
+        types = self.types
+        identifiers:List[IdentifierNode] = []
+        while types[self.pos] == TokenTypes.IDENTIFIER:
+            identifiers.append(IdentifierNode(self.nextToken()))
+            if types[self.pos] == TokenTypes.R_PAREN:
+                break
+            self.expect(TokenTypes.COMMA)
+        self.expect(TokenTypes.R_PAREN)
+        if self.lazy:
+            start = self.pos
+            self.skipBlock()
+            function = FuncLiteral(identifiers, None, functools.partial(self.__class__.parseRange, self.tokens, start, self.pos, self.symbols))
+        else:
+            function = FuncLiteral(identifiers, self.parseBlock())
+        if types[self.pos] == TokenTypes.L_PAREN:
+            return FuncCaller(function, self.parseFuncArguments())
+        return function
+    def skipBlock(self) -> None: # 只做括号匹配，跳过整个 {...}
+        self.expect(TokenTypes.L_BRACE)
+        types = self.types
+        pos = self.pos
+        depth = 1
+        while pos < self.last:
+            tokenType = types[pos]
+            pos += 1
+            if tokenType == TokenTypes.L_BRACE:
+                depth += 1
+            elif tokenType == TokenTypes.R_BRACE:
+                depth -= 1
+                if depth == 0:
+                    self.pos = pos
+                    return
+        self.pos = self.last # 括号不匹配，报告缺少 }
+        self.expect(TokenTypes.R_BRACE)
+    def parseFuncArguments(self) -> List[Expression]: # (expr...)
+        self.expect(TokenTypes.L_PAREN)
+        types = self.types
+        if types[self.pos] == TokenTypes.R_PAREN:
+            self.pos += 1
+            return []
+        arguments:List[Expression] = []
+        while True:
+            arguments.append(self.parseExpression(Priority.LOWEST))
+            if types[self.pos] == TokenTypes.R_PAREN:
+                self.pos += 1
+                return arguments
+            self.expect(TokenTypes.COMMA)
+
+
+class IterativeParser(PrattParser):
+    '''
+    显式栈语法分析器，产生的 AST 与 PrattParser 完全一致
+    表达式中的括号、前缀运算符、二元运算符以及嵌套的代码块、if、while 都不消耗 Python 调用栈，嵌套深度只受内存限制
+    函数调用的实参和函数字面量仍然各递归一层
+    '''
+    # 表达式栈帧类型
+    _BINARY = 0 # (_BINARY, 外层优先级, 左操作数, 运算符)，等待右操作数
+    _PREFIX = 1 # (_PREFIX, 前缀运算符)，等待操作数
+    _GROUP = 2 # (_GROUP, 外层优先级)，等待括号内的表达式和右括号
+    # 代码块栈帧类型
+    _BLOCK = 0 # 普通代码块
+    _IF_THEN = 1 # if 的 consequence，附带条件
+    _IF_ELSE = 2 # if 的 alternative，附带条件和 consequence
+    _WHILE = 3 # while 循环体，附带条件
+
+    def parseExpression(self, currentPriority:int) -> Expression:
+        types = self.types
+        priorities = Priority.TABLE
+        prefixParsers = self.prefixParsers
+        stack:List[tuple] = []
+        current = currentPriority
+        while True:
+            # 解析左操作数，前缀运算符和左括号先入栈
+            token = self.nextToken()
+            tokenType = token.tokenType
+            if tokenType == TokenTypes.OP_MINUS or tokenType == TokenTypes.OP_BANG:
+                stack.append((IterativeParser._PREFIX, token))
+                continue
+            if tokenType == TokenTypes.L_PAREN:
+                stack.append((IterativeParser._GROUP, current))
+                current = Priority.LOWEST
+                continue
+            handler = prefixParsers.get(tokenType)
+            if handler is None:
+                raise Exception(f"unexcept token {token}")
+            left = handler(token)
+            # 得到操作数后向上归约，直到需要下一个操作数
+            while True:
+                while stack and stack[-1][0] == IterativeParser._PREFIX:
+                    left = PrefixExpression(stack.pop()[1], left)
+                priority = priorities.get(types[self.pos])
+                if priority is None:
+                    raise Exception(f"unexcept token type {types[self.pos]}")
+                if priority > current: # 读入运算符，接下来解析右操作数
+                    stack.append((IterativeParser._BINARY, current, left, self.nextToken()))
+                    current = priority
+                    break
+                if not stack:
+                    return left
+                frame = stack.pop()
+                if frame[0] == IterativeParser._BINARY:
+                    current = frame[1]
+                    left = BinaryOperatorExpression(frame[2], frame[3], left)
+                else: # _GROUP
+                    self.expect(TokenTypes.R_PAREN)
+                    current = frame[1]
+    def parseBlock(self) -> Block:
+        self.expect(TokenTypes.L_BRACE)
+        types = self.types
+        stack:List[tuple] = [(IterativeParser._BLOCK, Block())]
+        while True:
+            topType = types[self.pos]
+            if topType == TokenTypes.R_BRACE:
+                self.pos += 1
+                frame = stack.pop()
+                kind, block = frame[0], frame[1]
+                if kind == IterativeParser._IF_THEN:
+                    if types[self.pos] == TokenTypes.KW_ELSE:
+                        self.pos += 1
+                        self.expect(TokenTypes.L_BRACE)
+                        stack.append((IterativeParser._IF_ELSE, Block(), frame[2], block))
+                        continue
+                    statement = IfStatement(frame[2], block, Block())
+                elif kind == IterativeParser._IF_ELSE:
+                    statement = IfStatement(frame[2], frame[3], block)
+                elif kind == IterativeParser._WHILE:
+                    statement = WhileStatement(frame[2], block)
+                else:
+                    statement = block
+                if not stack:
+                    return block
+                stack[-1][1].addStatement(statement)
+            elif topType == TokenTypes.L_BRACE:
+                self.pos += 1
+                stack.append((IterativeParser._BLOCK, Block()))
+            elif topType == TokenTypes.KW_IF:
+                self.pos += 1
+                condition = self.parseExpression(Priority.LOWEST)
+                self.expect(TokenTypes.L_BRACE)
+                stack.append((IterativeParser._IF_THEN, Block(), condition))
+            elif topType == TokenTypes.KW_WHILE:
+                self.pos += 1
+                condition = self.parseExpression(Priority.LOWEST)
+                self.expect(TokenTypes.L_BRACE)
+                stack.append((IterativeParser._WHILE, Block(), condition))
+            else:
+                stack[-1][1].addStatement(self.parseStatement())
+
+
+if __name__ == "__main__":
+    import io
+    from it_interpreter.it_tokenizer import BufferedSourceReader, Tokenizer, SourceReader
+    from it_interpreter.it_parser import Parser
+    def _parse(code:str) -> None:
+        program = PrattParser.fromTokenizer(FastTokenizer(BufferedSourceReader(code.encode("ascii")))).parse()
+        expected = Parser(Tokenizer(SourceReader(io.BytesIO(code.encode("ascii"))))).parse()
+        assert str(program) == str(expected), f"{program} != {expected}"
+        iterative = IterativeParser.fromTokenizer(FastTokenizer(BufferedSourceReader(code.encode("ascii")))).parse()
+        assert str(iterative) == str(expected), f"{iterative} != {expected}"
+        for parserClass in [PrattParser, IterativeParser]: # 预解析模式，str 会触发函数体解析
+            lazy = parserClass.fromTokenizer(FastTokenizer(BufferedSourceReader(code.encode("ascii"))), lazy=True).parse()
+            assert str(lazy) == str(expected), f"{lazy} != {expected}"
+        print(program)
+
+    _parse("let a = (-1+-2)*(-5/(-6--7)); a = a + 1;")
+    _parse("a+233==356+ccc; !true + false; 1+2*3-4/5<=6>7!=8;")
+    _parse("{}{let a=1;let b=a;}{}")
+    _parse("if(a>b){return 1+2-3;}else{1+2*3;} if(true){;}")
+    _parse("return 123 + a * fn(a, b) {return a + b;} (fn(){return 1;}(), adder(3, 4));")
+    _parse("let a = 0; while (a<100) {a=a+1;} return a;")
+    _parse("- - -x; !(!(a)); -(1+2)*-3 == --4; ((((1))+2)*(3-(4))); if(1){if(2){3;}else{{4;}}}else{while(5){if(6){}}}")
+    for code in ["a b;", "let = 1;", "1 + ;", "f(1 2);", "{1;", "(1;", "if(1){}else 2;", "while(1) 2;"]:
+        try:
+            _parse(code)
+        except Exception as e:
+            print(code, e)
+        try:
+            IterativeParser.fromTokenizer(FastTokenizer(BufferedSourceReader(code.encode("ascii")))).parse()
+        except Exception as e:
+            print(code, e)
+    # 预解析模式下函数体中的语法错误推迟到第一次取函数体时报告
+    lazy = PrattParser.fromTokenizer(FastTokenizer(BufferedSourceReader(b"let f = fn(a) { fn(){ 1 +; }; }; 2;")), lazy=True).parse()
+    funcLit = lazy.statements()[0].treatAs(LetStatement).expression().treatAs(FuncLiteral)
+    print(funcLit.parsedBody())
+    inner = funcLit.body().statements()[0].treatAs(ExpressionStatement).expression().treatAs(FuncLiteral)
+    print(inner.parsedBody())
+    try:
+        inner.body()
+    except Exception as e:
+        print("lazy", e)
+    for code in ["let f = fn() { { };", "fn() 1;"]:
+        try:
+            PrattParser.fromTokenizer(FastTokenizer(BufferedSourceReader(code.encode("ascii"))), lazy=True).parse()
+        except Exception as e:
+            print(code, e)
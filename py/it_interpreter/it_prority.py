@@ -3,6 +3,7 @@
 在生成 AST 时使用到
 '''
 from it_interpreter.it_token import TokenType, TokenTypes
+from typing import Dict
 
 
 class Priority:
@@ -10,34 +11,26 @@ class Priority:
     优先级
     '''
     LOWEST = 0 # 最低优先级
+    # 运算符优先级表，不在表中的 token 不能出现在二元运算符的位置
+    TABLE:Dict[TokenType, int] = {
+        TokenTypes.R_PAREN:LOWEST, # 解析 (1) 就会遇到右括号 )
+        TokenTypes.SEMICOLON:LOWEST, # return expr; 后面会遇到 ;
+        TokenTypes.L_BRACE:LOWEST, # if expr {} 后面会遇到 {
+        TokenTypes.COMMA:LOWEST, # 解析 add(1, 2) 中会遇到逗号 , {
+        TokenTypes.OP_EQ:1,
+        TokenTypes.OP_NEQ:1,
+        TokenTypes.OP_LT:2,
+        TokenTypes.OP_LTE:2,
+        TokenTypes.OP_GT:2,
+        TokenTypes.OP_GTE:2,
+        TokenTypes.OP_PLUS:3,
+        TokenTypes.OP_MINUS:3,
+        TokenTypes.OP_ASTERISK:4,
+        TokenTypes.OP_SLASH:4,
+    }
     @staticmethod
     def of(tokenType:TokenType)->int:
-        if tokenType == TokenTypes.R_PAREN: # 解析 (1) 就会遇到右括号 )
-            return Priority.LOWEST
-        elif tokenType == TokenTypes.SEMICOLON: # return expr; 后面会遇到 ;
-            return Priority.LOWEST
-        elif tokenType == TokenTypes.L_BRACE: # if expr {} 后面会遇到 {
-            return Priority.LOWEST
-        elif tokenType == TokenTypes.COMMA: # 解析 add(1, 2) 中会遇到逗号 , {
-            return Priority.LOWEST
-        elif tokenType == TokenTypes.OP_EQ:
-            return 1
-        elif tokenType == TokenTypes.OP_NEQ:
-            return 1
-        elif tokenType == TokenTypes.OP_LT:
-            return 2
-        elif tokenType == TokenTypes.OP_LTE:
-            return 2
-        elif tokenType == TokenTypes.OP_GT:
-            return 2
-        elif tokenType == TokenTypes.OP_GTE:
-            return 2
-        elif tokenType == TokenTypes.OP_PLUS:
-            return 3
-        elif tokenType == TokenTypes.OP_MINUS:
-            return 3
-        elif tokenType == TokenTypes.OP_ASTERISK:
-            return 4
-        elif tokenType == TokenTypes.OP_SLASH:
-            return 4
-        raise Exception(f"unexcept token type {tokenType}")
+        priority = Priority.TABLE.get(tokenType)
+        if priority is None:
+            raise Exception(f"unexcept token type {tokenType}")
+        return priority
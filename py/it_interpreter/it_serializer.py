@@ -0,0 +1,244 @@
+'''
+AST 的紧凑二进制格式
+节点按后序排成一个整数数组，每个节点是 [标签, 操作数]，加载时用一个栈逐个还原，不递归，任意深的 AST 都可以处理
+标识符名和整数字面量放在字符串表中，节点只记录下标；字符串表前 nSymbols 项就是符号表，加载后 symbolId 不变
+文本形式见 it_ast.AstWriter
+'''
+from it_interpreter.it_token import Token, TokenTypes, FixedTokenMap, TokenTypeList, TokenKindMap, SymbolTable
+from it_interpreter.it_ast import *
+from array import array
+from typing import Dict, List
+import gc
+import io
+import struct
+import sys
+
+
+class serializer:
+    MAGIC = b"ITAST\x01"
+    _HEADER = struct.Struct("<III") # 符号个数、字符串表字节数、节点数组长度
+
+    # 节点标签，后面是操作数个数，括号内是出栈的子节点
+    IDENTIFIER = 0 # 1 字符串下标
+    INTEGER = 1 # 1 字符串下标
+    TRUE = 2 # 0
+    FALSE = 3 # 0
+    PREFIX = 4 # 1 运算符 kind (expr)
+    BINARY = 5 # 1 运算符 kind (left right)
+    FUNCTION = 6 # 1 形参个数 (id... block)
+    CALL = 7 # 1 实参个数 (callee expr...)
+    EMPTY = 8 # 0
+    EXPRESSION = 9 # 0 (expr)
+    ASSIGN = 10 # 0 (id expr)
+    LET = 11 # 0 (id expr)
+    RETURN = 12 # 0 (expr)
+    IF = 13 # 0 (expr block block)
+    WHILE = 14 # 0 (expr block)
+    BLOCK = 15 # 1 语句条数 (statement...)
+
+    @staticmethod
+    def dumps(program:Program) -> bytes:
+        strings:List[str] = list(program.symbols.names)
+        indexes:Dict[str, int] = {name:i for i, name in enumerate(strings)}
+        codes = array('I')
+        emit = codes.extend
+        def stringIndex(s:str) -> int:
+            index = indexes.get(s)
+            if index is None:
+                index = indexes[s] = len(strings)
+                strings.append(s)
+            return index
+        # 显式栈后序遍历，栈中是待展开的节点，或者子节点都已输出后要写入的 [标签, 操作数]
+        stack:List[Union[Node, tuple]] = [(serializer.BLOCK, len(program.statements()))]
+        stack.extend(reversed(program.statements()))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, tuple):
+                emit(node)
+                continue
+            kind = node.kind
+            if kind == NodeKinds.IDENTIFIER_EXPRESSION:
+                emit((serializer.IDENTIFIER, stringIndex(node.name())))
+            elif kind == NodeKinds.INTEGER_LITERAL_EXPRESSION:
+                emit((serializer.INTEGER, stringIndex(node.token.literal)))
+            elif kind == NodeKinds.BOOL_LITERAL_EXPRESSION:
+                codes.append(serializer.TRUE if node.boolValue() else serializer.FALSE)
+            elif kind == NodeKinds.PREFIX_EXPRESSION:
+                stack.append((serializer.PREFIX, TokenKindMap[node.prefixType()]))
+                stack.append(node.rawExpression())
+            elif kind == NodeKinds.BINARY_EXPRESSION:
+                stack.append((serializer.BINARY, TokenKindMap[node.operatorType()]))
+                stack.append(node.right())
+                stack.append(node.left())
+            elif kind == NodeKinds.FUNC_LITERAL_EXPRESSION:
+                stack.append((serializer.FUNCTION, len(node.parameters())))
+                stack.append(node.body()) # 延迟解析的函数体在这里解析
+                stack.extend(reversed(node.parameters()))
+            elif kind == NodeKinds.FUNC_CALLER_EXPRESSION:
+                stack.append((serializer.CALL, len(node.arguments())))
+                stack.extend(reversed(node.arguments()))
+                stack.append(node.callee())
+            elif kind == NodeKinds.EMPTY_STATEMENT:
+                codes.append(serializer.EMPTY)
+            elif kind == NodeKinds.EXPRESSION_STATEMENT:
+                stack.append((serializer.EXPRESSION,))
+                stack.append(node.expression())
+            elif kind == NodeKinds.ASSIGN_STATEMENT or kind == NodeKinds.LET_STATEMENT:
+                stack.append((serializer.ASSIGN if kind == NodeKinds.ASSIGN_STATEMENT else serializer.LET,))
+                stack.append(node.expression())
+                stack.append(node.identifier())
+            elif kind == NodeKinds.RETURN_STATEMENT:
+                stack.append((serializer.RETURN,))
+                stack.append(node.expression())
+            elif kind == NodeKinds.IF_STATEMENT:
+                stack.append((serializer.IF,))
+                stack.append(node.alternative())
+                stack.append(node.consequence())
+                stack.append(node.condition())
+            elif kind == NodeKinds.WHILE_STATEMENT:
+                stack.append((serializer.WHILE,))
+                stack.append(node.body())
+                stack.append(node.condition())
+            elif kind == NodeKinds.BLOCK_STATEMENT:
+                statements = node.statements()
+                stack.append((serializer.BLOCK, len(statements)))
+                stack.extend(reversed(statements))
+            else:
+                raise Exception(f"unknown node {node} kind {kind}")
+        if sys.byteorder != "little":
+            codes.byteswap()
+        stringBytes = "\n".join(strings).encode("ascii")
+        return serializer.MAGIC + serializer._HEADER.pack(len(program.symbols), len(stringBytes), len(codes)) + stringBytes + codes.tobytes()
+
+    @staticmethod
+    def dump(program:Program, out:io.BufferedIOBase) -> None: # 写入二进制文件
+        out.write(serializer.dumps(program))
+    @staticmethod
+    def load(input:io.BufferedIOBase) -> Program: # 从二进制文件读取
+        return serializer.loads(input.read())
+    @staticmethod
+    def loads(data:bytes) -> Program:
+        # 还原时只创建对象不产生垃圾，暂停分代回收，避免大量分配反复触发对整个堆的扫描
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return serializer._loads(data)
+        finally:
+            if enabled:
+                gc.enable()
+    @staticmethod
+    def _loads(data:bytes) -> Program:
+        if not data.startswith(serializer.MAGIC):
+            raise Exception("not an AST dump")
+        offset = len(serializer.MAGIC)
+        symbolCount, stringSize, codeCount = serializer._HEADER.unpack_from(data, offset)
+        offset += serializer._HEADER.size
+        strings = data[offset:offset + stringSize].decode("ascii").split("\n") if stringSize > 0 else []
+        offset += stringSize
+        codes = array('I')
+        if len(data) - offset != codeCount * codes.itemsize:
+            raise Exception(f"AST dump truncated, expect {codeCount * codes.itemsize} bytes of codes but got {len(data) - offset}")
+        codes.frombytes(data[offset:])
+        if sys.byteorder != "little":
+            codes.byteswap()
+
+        symbols = SymbolTable()
+        tokens:List[Token] = [symbols.intern(name) for name in strings[:symbolCount]] # 符号表按原编号恢复
+        tokens.extend(Token(TokenTypes.INTEGER, literal) for literal in strings[symbolCount:])
+        kindTokens = [FixedTokenMap.get(t) for t in TokenTypeList]
+        trueToken, falseToken = FixedTokenMap[TokenTypes.KW_TRUE], FixedTokenMap[TokenTypes.KW_FALSE]
+        stack:List[Node] = []
+        push, pop = stack.append, stack.pop
+        i = 0
+        while i < codeCount:
+            tag = codes[i]
+            if tag == serializer.IDENTIFIER:
+                token = tokens[codes[i + 1]]
+                push(IdentifierNode(token if token.tokenType == TokenTypes.IDENTIFIER else symbols.intern(token.literal)))
+                i += 2
+            elif tag == serializer.INTEGER:
+                push(IntegerLiteral(tokens[codes[i + 1]]))
+                i += 2
+            elif tag == serializer.BINARY:
+                right = pop()
+                stack[-1] = BinaryOperatorExpression(stack[-1], kindTokens[codes[i + 1]], right)
+                i += 2
+            elif tag == serializer.PREFIX:
+                stack[-1] = PrefixExpression(kindTokens[codes[i + 1]], stack[-1])
+                i += 2
+            elif tag == serializer.TRUE or tag == serializer.FALSE:
+                push(BoolLiteral(trueToken if tag == serializer.TRUE else falseToken))
+                i += 1
+            elif tag == serializer.CALL:
+                count = codes[i + 1]
+                arguments = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                stack[-1] = FuncCaller(stack[-1], arguments)
+                i += 2
+            elif tag == serializer.BLOCK:
+                count = codes[i + 1]
+                block = Block()
+                block.setStatements(stack[len(stack) - count:])
+                del stack[len(stack) - count:]
+                push(block)
+                i += 2
+            elif tag == serializer.EXPRESSION:
+                stack[-1] = ExpressionStatement(stack[-1])
+                i += 1
+            elif tag == serializer.ASSIGN or tag == serializer.LET:
+                expression = pop()
+                stack[-1] = (AssignStatement if tag == serializer.ASSIGN else LetStatement)(stack[-1], expression)
+                i += 1
+            elif tag == serializer.RETURN:
+                stack[-1] = ReturnStatement(stack[-1])
+                i += 1
+            elif tag == serializer.IF:
+                alternative = pop()
+                consequence = pop()
+                stack[-1] = IfStatement(stack[-1], consequence, alternative)
+                i += 1
+            elif tag == serializer.WHILE:
+                body = pop()
+                stack[-1] = WhileStatement(stack[-1], body)
+                i += 1
+            elif tag == serializer.FUNCTION:
+                count = codes[i + 1]
+                body = pop()
+                parameters = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                push(FuncLiteral(parameters, body))
+                i += 2
+            elif tag == serializer.EMPTY:
+                push(EmptyStatement())
+                i += 1
+            else:
+                raise Exception(f"unknown AST dump tag {tag}")
+        if len(stack) != 1:
+            raise Exception("broken AST dump")
+        return Program(stack[0].treatAs(Block), symbols)
+
+
+if __name__ == "__main__":
+    from it_interpreter.it_parser import parser
+    for code in [
+        "let a = (-1+-2)*(-5/(-6--7)); a = a + 1; b = 010;",
+        "if(a>b){return 1+2-3;}else{1+2*3;} if(true){;} while(!false){{}}",
+        "return 123 + a * fn(a, b) {return a + b;} (fn(){return 1;}(), adder(3, 4));",
+        "",
+    ]:
+        program = parser.parse(io.BytesIO(code.encode("ascii")))
+        data = serializer.dumps(program)
+        loaded = serializer.loads(data)
+        assert str(loaded) == str(program) and loaded.symbols.names == program.symbols.names
+        out = io.BytesIO()
+        serializer.dump(program, out)
+        out.seek(0)
+        assert str(serializer.load(out)) == str(program)
+        print(len(data), loaded)
+    deep = parser.parse(io.BytesIO(b"x = " + b"(" * 5000 + b"1" + b")" * 5000 + b";" + b"{" * 5000 + b"}" * 5000), iterative=True)
+    print(len(serializer.loads(serializer.dumps(deep)).statements()), len(str(deep)))
+    for data in [b"", serializer.dumps(program)[:-1]]:
+        try:
+            serializer.loads(data)
+        except Exception as e:
+            print(e)
@@ -0,0 +1,285 @@
+'''
+显式栈解释器，解释 AST 树但不使用 Python 递归
+待执行的工作放在 tasks 栈中，每一项是 (处理函数, 参数)，主循环逐个弹出执行；处理函数把子节点的求值和之后的续体压栈后立即返回
+二元运算先求出的左操作数暂存在 values 栈中
+这样用户函数的递归深度、AST 的嵌套深度都不受 Python 递归上限限制，只受 memoryBudget 限制
+语义和 Evaluator 完全一致（动态作用域、求值结果、println、报错）
+'''
+from it_interpreter.it_ast import *
+from it_interpreter.it_object import *
+from it_interpreter.it_evaluator import Enviroment, Evaluator
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+Task = Tuple[Callable[[Any], None], Any]
+
+
+class StackEvaluator:
+    '''
+    与 Evaluator 接口一致：eval(node) 之后结果在 result，环境在 env
+    memoryBudget 是工作栈可以占用的字节数（估算值），超出时报 stack overflow，而不是耗尽内存
+    '''
+    _LEAVES = frozenset([NodeKinds.IDENTIFIER_EXPRESSION, NodeKinds.INTEGER_LITERAL_EXPRESSION, NodeKinds.BOOL_LITERAL_EXPRESSION, NodeKinds.FUNC_LITERAL_EXPRESSION, NodeKinds.EMPTY_STATEMENT])
+    TASK_BYTES = 240 # 每个待执行工作的估算字节数：元组、栈中的指针，以及分摊到它的栈帧、绑定（用 tracemalloc 对递归函数测得约 235）
+
+    def __init__(self, memoryBudget:int = 256 * 1024 * 1024) -> None:
+        self.env = Enviroment()
+        self.returnMode:bool = False
+        self.result:Object = NULL
+        self.tasks:List[Task] = []
+        self.values:List[Object] = []
+        self.maxTasks = memoryBudget // StackEvaluator.TASK_BYTES
+        # 分派表，下标是节点种类 NodeKinds
+        self.evaluators:List[Callable[[Node], None]] = [self._evalUnknown] * NodeKinds.COUNT
+        self.evaluators[NodeKinds.EMPTY_STATEMENT] = self._evalEmptyStatement
+        self.evaluators[NodeKinds.ASSIGN_STATEMENT] = self._evalAssignStatement
+        self.evaluators[NodeKinds.LET_STATEMENT] = self._evalLetStatement
+        self.evaluators[NodeKinds.RETURN_STATEMENT] = self._evalReturnStatement
+        self.evaluators[NodeKinds.EXPRESSION_STATEMENT] = self._evalExpressionStatement
+        self.evaluators[NodeKinds.IF_STATEMENT] = self._evalIfStatement
+        self.evaluators[NodeKinds.WHILE_STATEMENT] = self._evalWhileStatement
+        self.evaluators[NodeKinds.BLOCK_STATEMENT] = self._evalBlock
+        self.evaluators[NodeKinds.PROGRAM_STATEMENT] = self._evalProgram
+        self.evaluators[NodeKinds.IDENTIFIER_EXPRESSION] = self._evalIdentifier
+        self.evaluators[NodeKinds.INTEGER_LITERAL_EXPRESSION] = self._evalIntegerLiteral
+        self.evaluators[NodeKinds.BOOL_LITERAL_EXPRESSION] = self._evalBoolLiteral
+        self.evaluators[NodeKinds.FUNC_LITERAL_EXPRESSION] = self._evalFuncLiteral
+        self.evaluators[NodeKinds.PREFIX_EXPRESSION] = self._evalPrefixExpression
+        self.evaluators[NodeKinds.BINARY_EXPRESSION] = self._evalBinaryExpression
+        self.evaluators[NodeKinds.FUNC_CALLER_EXPRESSION] = self._evalFuncCaller
+        self.env.put(Evaluator.BUILDIN_FUNC_PRINTIN, FuncObject(["obj"], Block()))
+
+    def eval(self, node:Node) -> None:
+        tasks = self.tasks
+        tasks.clear() # 上一次执行报错时可能留下未完成的工作
+        self.values.clear()
+        tasks.append((self.evaluators[node.kind], node))
+        pop = tasks.pop
+        while tasks:
+            handler, argument = pop()
+            handler(argument)
+    def evalStatements(self, statements:Iterable[Statement]) -> None: # 执行顶层语句，可以传入生成器边解析边执行
+        if self.returnMode:
+            return
+        for statement in statements:
+            self.eval(statement)
+            if self.returnMode:
+                break
+    # 以下两个函数总是在处理函数的最后调用，安排的工作紧接着执行
+    # 叶子节点求值不会再压栈，直接求值，省去入栈出栈；处理函数之间因此最多直接调用几层，不随运行时深度增长
+    def _push(self, node:Node) -> None: # 安排对节点求值
+        if node.kind in StackEvaluator._LEAVES:
+            self.evaluators[node.kind](node)
+        else:
+            self.tasks.append((self.evaluators[node.kind], node))
+    def _then(self, node:Node, handler:Callable[[Any], None], argument:Any) -> None: # 安排对节点求值，之后执行 handler(argument)
+        if node.kind in StackEvaluator._LEAVES:
+            self.evaluators[node.kind](node)
+            handler(argument)
+        else:
+            self.tasks.append((handler, argument))
+            self.tasks.append((self.evaluators[node.kind], node))
+
+    # statement
+    def _evalEmptyStatement(self, node:EmptyStatement) -> None:
+        self.result = NULL
+    def _evalAssignStatement(self, node:AssignStatement) -> None: # assign
+        self._then(node.expression(), self._assign, node.identifier().name())
+    def _assign(self, name:str) -> None:
+        self.env.modify(name, self.result)
+    def _evalLetStatement(self, node:LetStatement) -> None: # let
+        self._then(node.expression(), self._let, node.identifier().name())
+    def _let(self, name:str) -> None:
+        self.env.put(name, self.result)
+    def _evalReturnStatement(self, node:ReturnStatement) -> None: # return
+        self._then(node.expression(), self._return, None)
+    def _return(self, _:None) -> None:
+        self.returnMode = True # 进入返回模式
+    def _evalExpressionStatement(self, node:ExpressionStatement) -> None: # 表达式
+        self._push(node.expression())
+    def _evalIfStatement(self, node:IfStatement) -> None: # if
+        self._then(node.condition(), self._branch, node)
+    def _branch(self, node:IfStatement) -> None: # 条件已求值
+        self.tasks.append((self._evalBlock, node.consequence() if self.result.treatAs(BoolObject).value() else node.alternative()))
+    def _evalWhileStatement(self, node:WhileStatement) -> None: # while
+        self._then(node.condition(), self._loop, node)
+    def _loop(self, node:WhileStatement) -> None: # 条件已求值，为真时执行循环体，之后再次求条件
+        if not self.result.treatAs(BoolObject).value():
+            return
+        self.tasks.append((self._loopNext, node))
+        self.tasks.append((self._evalBlock, node.body()))
+    def _loopNext(self, node:WhileStatement) -> None:
+        if self.returnMode: # 循环体需要检查 return 标识，否则空转
+            return
+        self._evalWhileStatement(node)
+    def _evalBlock(self, node:Block) -> None: # 代码块，进入时进栈，执行完或进入返回模式时退栈
+        if not node.declares: # 不声明变量的代码块和外层共用栈帧
+            self._statementsNext(iter(node.statements()))
+            return
+        self.env.stackPush()
+        self._blockNext(iter(node.statements()))
+    def _blockNext(self, statements:Iterator[Statement]) -> None:
+        statement = None if self.returnMode else next(statements, None)
+        if statement is None:
+            self.env.stackPop()
+            return
+        self.tasks.append((self._blockNext, statements))
+        self._push(statement)
+    def _evalProgram(self, node:Program) -> None: # 程序，和代码块的区别是不变更环境
+        self._statementsNext(iter(node.statements()))
+    def _statementsNext(self, statements:Iterator[Statement]) -> None: # 依次执行语句，不变更环境
+        statement = None if self.returnMode else next(statements, None)
+        if statement is not None:
+            self.tasks.append((self._statementsNext, statements))
+            self._push(statement)
+    # expression
+    def _evalIdentifier(self, node:IdentifierNode) -> None: # 标识符
+        self.result = self.env.get(node.name())
+    def _evalIntegerLiteral(self, node:IntegerLiteral) -> None: # 整形字面量
+        value = node.constant
+        if value is None:
+            value = node.constant = IntegerObject.of(node.integerValue())
+        self.result = value
+    def _evalBoolLiteral(self, node:BoolLiteral) -> None: # 布尔字面量
+        self.result = TRUE if node.boolValue() else FALSE
+    def _evalFuncLiteral(self, node:FuncLiteral) -> None: # 函数定义
+        self.result = FuncObject(node.parameterNames(), node.parsedBody(), node) # 延迟解析的函数体到调用时才解析
+    def _evalPrefixExpression(self, node:PrefixExpression) -> None: # 前缀运算
+        self._then(node.rawExpression(), self._unary, node.prefixType())
+    def _unary(self, prefixType:TokenType) -> None:
+        self.result = operation.unary(prefixType, self.result)
+    def _evalBinaryExpression(self, node:BinaryOperatorExpression) -> None: # 二元运算，先求左操作数
+        self._then(node.left(), self._binaryRight, node)
+    def _binaryRight(self, node:BinaryOperatorExpression) -> None: # 左操作数暂存，再求右操作数
+        self.values.append(self.result)
+        self._then(node.right(), self._binary, node.operatorType())
+    def _binary(self, operatorType:TokenType) -> None:
+        self.result = operation.binary(operatorType, self.values.pop(), self.result)
+    def _evalFuncCaller(self, node:FuncCaller) -> None: # 函数调用，先求 callee
+        self._then(node.callee(), self._call, node)
+    def _call(self, node:FuncCaller) -> None: # 拿到 funcObj，进栈后逐个求实参
+        if len(self.tasks) + len(self.values) > self.maxTasks:
+            raise Exception(f"stack overflow, exceed memory budget {self.maxTasks * StackEvaluator.TASK_BYTES} bytes")
+        funcObj = self.result.treatAs(FuncObject)
+        callee = node.callee()
+        isPrintln = isinstance(callee, IdentifierNode) and callee.name() == Evaluator.BUILDIN_FUNC_PRINTIN # 内置函数 println
+        self.env.stackPush() # 进栈
+        self._argument((funcObj, node.arguments(), 0, isPrintln))
+    def _argument(self, call:Tuple[FuncObject, List[Expression], int, bool]) -> None: # 从第 i 个实参开始求值，全部求完后执行函数体
+        funcObj, arguments, i, isPrintln = call
+        parameters = funcObj.parameters()
+        while i < len(parameters):
+            argument = arguments[i]
+            if argument.kind not in StackEvaluator._LEAVES:
+                self.tasks.append((self._bind, (funcObj, arguments, i, isPrintln)))
+                self.tasks.append((self.evaluators[argument.kind], argument))
+                return
+            self.evaluators[argument.kind](argument) # 叶子实参直接求值绑定，用循环而不是 _then，实参再多也不加深调用
+            self.env.put(parameters[i], self.result)
+            if isPrintln:
+                print(self.result)
+            i += 1
+        self.tasks.append((self._callReturn, None))
+        self.tasks.append((self._evalBlock, funcObj.body())) # 计算函数体
+    def _bind(self, call:Tuple[FuncObject, List[Expression], int, bool]) -> None: # 第 i 个实参已求值
+        funcObj, arguments, i, isPrintln = call
+        self.env.put(funcObj.parameters()[i], self.result)
+        if isPrintln:
+            print(self.result)
+        self._argument((funcObj, arguments, i + 1, isPrintln))
+    def _callReturn(self, _:None) -> None:
+        self.env.stackPop() # 退栈
+        self.returnMode = False # 退出返回模式
+    def _evalUnknown(self, node:Node) -> None:
+        raise Exception(f"unknown node {node} type {node.nodeType()}")
+
+
+if __name__ == "__main__":
+    import io
+    import contextlib
+    from it_interpreter.it_parser import parser
+    def _eval(code:str) -> None:
+        expected = Evaluator()
+        expectedOutput = io.StringIO()
+        with contextlib.redirect_stdout(expectedOutput):
+            expected.eval(parser.parse(io.BytesIO(code.encode("ascii"))))
+        engine = StackEvaluator()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            engine.eval(parser.parse(io.BytesIO(code.encode("ascii"))))
+        assert str(engine.result) == str(expected.result), f"{code} {engine.result} != {expected.result}"
+        assert output.getvalue() == expectedOutput.getvalue() and str(engine.env) == str(expected.env), code
+        print(f"{code}\n==>{engine.result}")
+
+    # 与 it_evaluator 的用例相同
+    _eval("123;")
+    _eval("true;")
+    _eval("false;")
+    _eval("-123;")
+    _eval("!true;")
+    _eval("!false;")
+    _eval("20+30;")
+    _eval("20-30;")
+    _eval("20*30;")
+    _eval("50/20;")
+    _eval("50>20;")
+    _eval("50>100;")
+    _eval("50>=20;")
+    _eval("50>=50;")
+    _eval("50>=100;")
+    _eval("50<=100;")
+    _eval("50<=50;")
+    _eval("50<=40;")
+    _eval("50==40;")
+    _eval("50==50;")
+    _eval("true==true;")
+    _eval("false==true;")
+    _eval("false!=true;")
+    _eval("true!=true;")
+    _eval("50!=50;")
+    _eval("40!=50;")
+    _eval("!false==true;")
+    _eval("1+2+3+4==4+3+2+1;")
+    _eval("if (5>2) {12;} else {21;}")
+    _eval("if (1+1==3) {12;}")
+    _eval("return 1+5;")
+    _eval("if (2+3>5) {return 12;} else {return 21;}")
+    _eval("return 1; return 2;")
+    _eval("1; return 2;")
+    _eval("1; return 2;3;")
+    _eval("if (10>1) { if(10>1) {return 10;} return 1; }")
+    _eval("let a = 123; let b = 312; a;")
+    _eval("let a = 123; let b = 312; a + b;")
+    _eval("let a = 5; let b = a; let c = a + b + 5; c;")
+    _eval("let a = fn(a) {return a+1;}; a(11+11); a;")
+    _eval("let add = fn(a,b,c,d) {return a+b+c+d;}; add(1,2,3,4);")
+    _eval("let max = fn(x,y) {if(x>y){return x;}else{return y;}}; max(5, 10);")
+    _eval("let fa = fn(n) {if(n==0){return 1;}else{return fa(n-1)*n;}}; fa(6);")
+    _eval("fn(a, b) {return a*10+b;} (5,6);")
+    _eval("let a = 5; fn(b) {return a*10+b;} (6);")
+    _eval("let a = 5; let f5 = fn(b) {return a*10+b;}; let b = 7; let f7 = fn(d, f) {return b*100 + f(d);}; f7(6, f5);")
+    _eval("while(true){return 123;}return 321;")
+    _eval("let i = 0; while(true) {i=i+1; if (i==100){return i;}}")
+    _eval("println(123);")
+    # 求值结果的边界情况
+    _eval("1; {{}}")
+    _eval("let f = fn() {}; f();")
+    _eval("let f = fn(a, b) {{}}; f(1, 2);")
+    _eval("let f = fn(a) { a + 1; }; f(1);")
+    _eval("let i = 0; while (i < 3) { i = i + 1; }")
+    _eval("let x = 1; let f = fn() { return x; }; let g = fn(x) { return f(); }; g(2);") # 动态作用域
+    _eval("println(1) + println(2); ;")
+    for code in ["a;", "let a = 1; let a = 2;", "if (1) {}", "1 + true;", "let f = fn(a) {}; f();"]:
+        for engine in [Evaluator(), StackEvaluator()]:
+            try:
+                engine.eval(parser.parse(io.BytesIO(code.encode("ascii"))))
+            except Exception as e:
+                print(code, type(engine).__name__, e)
+    # 递归深度不受 Python 递归上限限制
+    deep = parser.parse(io.BytesIO(b"let fa = fn(n) {if(n==0){return 1;}else{return fa(n-1)*n;}}; fa(3000) == fa(2999) * 3000;"))
+    engine = StackEvaluator()
+    engine.eval(deep)
+    print("fa(3000) == fa(2999) * 3000 ==>", engine.result)
+    try:
+        StackEvaluator(memoryBudget=1024 * 1024).eval(deep)
+    except Exception as e:
+        print(e)
@@ -2,7 +2,7 @@
 定义词法单元及其类型
 '''
 
-from typing import Dict
+from typing import Dict, List
 
 class TokenType(str):
     pass
@@ -50,10 +50,13 @@ class TokenTypes:
 class Token:
     '''
     词法单元：词法类型 TokenType + 字面量 literal
+    标识符 token 还带有符号表中的编号 symbolId，见 SymbolTable
     '''
-    def __init__(self, tokenType:TokenType, literal:str = "") -> None:
+    __slots__ = ("tokenType", "literal", "symbolId")
+    def __init__(self, tokenType:TokenType, literal:str = "", symbolId:int = -1) -> None:
         self.tokenType = tokenType
         self.literal = literal
+        self.symbolId = symbolId
     def checkTokenType(self, tokenType:TokenType)->'Token':
         if self.tokenType != tokenType:
             raise Exception(f"type of token {self} is not {tokenType}")
@@ -70,17 +73,53 @@ class Token:
             return self.tokenType
 
 
+# 所有 token 类型，下标即 token 种类编号 kind，用于 TokenTable 等紧凑表示
+TokenTypeList:List[TokenType] = [
+    TokenTypes.ILLEGAL, TokenTypes.EOF, TokenTypes.IDENTIFIER, TokenTypes.INTEGER,
+    TokenTypes.OP_ASSIGN, TokenTypes.OP_PLUS, TokenTypes.OP_MINUS, TokenTypes.OP_ASTERISK, TokenTypes.OP_SLASH, TokenTypes.OP_BANG,
+    TokenTypes.OP_EQ, TokenTypes.OP_NEQ, TokenTypes.OP_LT, TokenTypes.OP_LTE, TokenTypes.OP_GT, TokenTypes.OP_GTE,
+    TokenTypes.COMMA, TokenTypes.SEMICOLON, TokenTypes.L_PAREN, TokenTypes.R_PAREN, TokenTypes.L_BRACE, TokenTypes.R_BRACE,
+    TokenTypes.KW_FUNC, TokenTypes.KW_LET, TokenTypes.KW_IF, TokenTypes.KW_ELSE,
+    TokenTypes.KW_WHILE, TokenTypes.KW_RETURN, TokenTypes.KW_TRUE, TokenTypes.KW_FALSE,
+]
+TokenKindMap:Dict[TokenType, int] = {t:i for i, t in enumerate(TokenTypeList)}
+
+# 字面量固定的 token 单例，除标识符和整数外的所有类型
+FixedTokenMap:Dict[TokenType, Token] = {t:Token(t) for t in TokenTypeList if t != TokenTypes.IDENTIFIER and t != TokenTypes.INTEGER}
+
 KeywordMap:Dict[str, Token] = {
-    TokenTypes.KW_FUNC:Token(TokenTypes.KW_FUNC),
-    TokenTypes.KW_LET:Token(TokenTypes.KW_LET),
-    TokenTypes.KW_IF:Token(TokenTypes.KW_IF),
-    TokenTypes.KW_ELSE:Token(TokenTypes.KW_ELSE),
-    TokenTypes.KW_WHILE:Token(TokenTypes.KW_WHILE),
-    TokenTypes.KW_RETURN:Token(TokenTypes.KW_RETURN),
-    TokenTypes.KW_TRUE:Token(TokenTypes.KW_TRUE),
-    TokenTypes.KW_FALSE:Token(TokenTypes.KW_FALSE),
+    TokenTypes.KW_FUNC:FixedTokenMap[TokenTypes.KW_FUNC],
+    TokenTypes.KW_LET:FixedTokenMap[TokenTypes.KW_LET],
+    TokenTypes.KW_IF:FixedTokenMap[TokenTypes.KW_IF],
+    TokenTypes.KW_ELSE:FixedTokenMap[TokenTypes.KW_ELSE],
+    TokenTypes.KW_WHILE:FixedTokenMap[TokenTypes.KW_WHILE],
+    TokenTypes.KW_RETURN:FixedTokenMap[TokenTypes.KW_RETURN],
+    TokenTypes.KW_TRUE:FixedTokenMap[TokenTypes.KW_TRUE],
+    TokenTypes.KW_FALSE:FixedTokenMap[TokenTypes.KW_FALSE],
 }
 
+class SymbolTable:
+    '''
+    符号表，每次编译一个
+    为每个标识符分配从 0 开始的整数编号 symbolId，同名标识符共享同一个 Token 对象
+    '''
+    def __init__(self) -> None:
+        self.names:List[str] = [] # symbolId -> 标识符
+        self._tokens:Dict[str, Token] = {}
+    def intern(self, name:str) -> Token:
+        token = self._tokens.get(name)
+        if token is None:
+            token = Token(TokenTypes.IDENTIFIER, name, len(self.names))
+            self._tokens[name] = token
+            self.names.append(name)
+        return token
+    def name(self, symbolId:int) -> str:
+        return self.names[symbolId]
+    def __len__(self) -> int:
+        return len(self.names)
+    def __str__(self) -> str:
+        return str(self.names)
+
 if __name__ == "__main__":
     tokens = [
         Token(TokenTypes.IDENTIFIER, "a"),
@@ -94,3 +133,7 @@ if __name__ == "__main__":
     for t in tokens:
         print(t)
     print(tokens)
+
+    symbols = SymbolTable()
+    a, b = symbols.intern("a"), symbols.intern("b")
+    print(a is symbols.intern("a"), a.symbolId, b.symbolId, symbols)
@@ -2,10 +2,14 @@
 词法解析器，将原代码解析为词法单元 token 序列
 '''
 
-from it_interpreter.it_token import TokenType, TokenTypes, Token, KeywordMap
+from it_interpreter.it_token import TokenType, TokenTypes, Token, KeywordMap, FixedTokenMap, SymbolTable
 import io
+import os
+import re
+import mmap
+from collections import deque
 from queue import Queue
-from typing import Dict, List
+from typing import Deque, Dict, Iterator, List, Optional, Union
 
 
 class tokenizer:
@@ -23,14 +27,16 @@ class tokenizer:
         return c.isdigit()
     @staticmethod
     def tokenize(input:io.IOBase)->List[Token]:
-        tokens = []
-        sr = SourceReader(input)
-        tk = Tokenizer(sr)
+        return list(tokenizer.generate(input))
+    @staticmethod
+    def generate(input:io.IOBase)->Iterator[Token]: # 惰性产生 token，直到 EOF 或 ILLEGAL
+        sr = BufferedSourceReader.fromInput(input)
+        tk = FastTokenizer(sr)
         while True:
             t = tk.nextToken()
-            tokens.append(t)
+            yield t
             if t.tokenType == TokenTypes.EOF or t.tokenType == TokenTypes.ILLEGAL:
-                return tokens
+                return
 
 class SourceReader:
     '''
@@ -78,12 +84,94 @@ class SourceReader:
                 self.unread(c)
                 return str(int(interger))
 
+class BufferedSourceReader(SourceReader):
+    '''
+    缓冲原代码读取器，接口和 SourceReader 一致
+    一次性载入全部原代码（文件输入使用 mmap 映射），用整数游标 pos 遍历
+    fromFile 得到的读取器用完后需要 close（或用 with），释放映射
+    read/top/unread 都是 O(1)，单词、整数和空白使用正则一次匹配
+    '''
+    Buffer = Union[bytes, bytearray, mmap.mmap]
+    _CHARS = tuple(chr(i) for i in range(128)) # 字节 -> 字符
+    _NON_ASCII = re.compile(rb"[\x80-\xff]")
+    _WHITESPACE = re.compile(rb"[ \t\n\r]*")
+    _WORD_TAIL = re.compile(rb"[A-Za-z0-9]*")
+    _DIGITS = re.compile(rb"[0-9]*")
+
+    def __init__(self, buffer:Buffer) -> None:
+        nonAscii = BufferedSourceReader._NON_ASCII.search(buffer)
+        if nonAscii is not None:
+            raise Exception(f"non-ascii byte {buffer[nonAscii.start()]} at {nonAscii.start()}")
+        self.buffer = buffer
+        self.size = len(buffer)
+        self.pos = 0 # 游标，指向下一个待读字符
+        self.pending:Deque[tokenizer.char] = deque() # 无法通过回退游标放回的字符
+    @staticmethod
+    def fromInput(input:io.IOBase) -> 'BufferedSourceReader':
+        return BufferedSourceReader(input.read())
+    @staticmethod
+    def fromFile(path:str) -> 'BufferedSourceReader':
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0: # 空文件无法 mmap
+                return BufferedSourceReader(b"")
+            return BufferedSourceReader(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    def close(self) -> None: # 关闭 mmap 映射，bytes 输入无需关闭
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+    def __enter__(self) -> 'BufferedSourceReader':
+        return self
+    def __exit__(self, *exc) -> None:
+        self.close()
+    def read(self) -> tokenizer.char:
+        if self.pending:
+            return self.pending.popleft()
+        pos = self.pos
+        if pos >= self.size:
+            return tokenizer.EOF
+        self.pos = pos + 1
+        return BufferedSourceReader._CHARS[self.buffer[pos]]
+    def unread(self, c:tokenizer.char) -> None:
+        if not self.pending:
+            if c == tokenizer.EOF and self.pos >= self.size: # 读到 EOF 时游标并未前进
+                return
+            if c != tokenizer.EOF and self.pos > 0 and BufferedSourceReader._CHARS[self.buffer[self.pos-1]] == c:
+                self.pos -= 1 # 放回刚读出的字符，回退游标即可
+                return
+        self.pending.append(c)
+    def top(self) -> tokenizer.char:
+        if self.pending:
+            return self.pending[0]
+        if self.pos >= self.size:
+            return tokenizer.EOF
+        return BufferedSourceReader._CHARS[self.buffer[self.pos]]
+    def readSkipWhitespace(self) -> tokenizer.char:
+        if self.pending:
+            return super().readSkipWhitespace()
+        self.pos = BufferedSourceReader._WHITESPACE.match(self.buffer, self.pos).end()
+        return self.read()
+    def readWord(self, fisrt:tokenizer.char) -> str:
+        if self.pending:
+            return super().readWord(fisrt)
+        end = BufferedSourceReader._WORD_TAIL.match(self.buffer, self.pos).end()
+        word = fisrt + self.buffer[self.pos:end].decode("ascii")
+        self.pos = end
+        return word
+    def readInteger(self, fisrt:tokenizer.char) -> str:
+        if self.pending:
+            return super().readInteger(fisrt)
+        end = BufferedSourceReader._DIGITS.match(self.buffer, self.pos).end()
+        interger = fisrt + self.buffer[self.pos:end].decode("ascii")
+        self.pos = end
+        return str(int(interger))
+
 class Tokenizer:
     '''
     词法分析器
+    标识符登记到符号表 symbols 中，同名标识符共享同一个 Token
     '''
-    def __init__(self, sr:SourceReader) -> None:
+    def __init__(self, sr:SourceReader, symbols:Optional[SymbolTable] = None) -> None:
         self.sr = sr
+        self.symbols = symbols if symbols is not None else SymbolTable()
     def nextToken(self) -> Token:
         # swith-case
         c = self.sr.readSkipWhitespace()
@@ -91,67 +179,146 @@ class Tokenizer:
             n = self.sr.top() # 查看下一个，不读出来
             if n == TokenTypes.OP_ASSIGN:
                 self.sr.read()
-                return Token(TokenTypes.OP_EQ)
+                return FixedTokenMap[TokenTypes.OP_EQ]
             else:
-                return Token(TokenTypes.OP_ASSIGN)
+                return FixedTokenMap[TokenTypes.OP_ASSIGN]
         elif c == TokenTypes.OP_PLUS: # +
-            return Token(TokenTypes.OP_PLUS)
+            return FixedTokenMap[TokenTypes.OP_PLUS]
         elif c == TokenTypes.OP_MINUS: # -
-            return Token(TokenTypes.OP_MINUS)
+            return FixedTokenMap[TokenTypes.OP_MINUS]
         elif c == TokenTypes.OP_ASTERISK: # *
-            return Token(TokenTypes.OP_ASTERISK)
+            return FixedTokenMap[TokenTypes.OP_ASTERISK]
         elif c == TokenTypes.OP_SLASH: # /
-            return Token(TokenTypes.OP_SLASH)
+            return FixedTokenMap[TokenTypes.OP_SLASH]
         elif c == TokenTypes.OP_BANG: # !, !=
             n = self.sr.top()
             if n == TokenTypes.OP_ASSIGN:
                 self.sr.read()
-                return Token(TokenTypes.OP_NEQ)
+                return FixedTokenMap[TokenTypes.OP_NEQ]
             else:
-                return Token(TokenTypes.OP_BANG)
+                return FixedTokenMap[TokenTypes.OP_BANG]
         elif c == TokenTypes.OP_LT: # <, <=
             n = self.sr.top()
             if n == TokenTypes.OP_ASSIGN:
                 self.sr.read()
-                return Token(TokenTypes.OP_LTE)
+                return FixedTokenMap[TokenTypes.OP_LTE]
             else:
-                return Token(TokenTypes.OP_LT)
+                return FixedTokenMap[TokenTypes.OP_LT]
         elif c == TokenTypes.OP_GT: # >, >=
             n = self.sr.top()
             if n == TokenTypes.OP_ASSIGN:
                 self.sr.read()
-                return Token(TokenTypes.OP_GTE)
+                return FixedTokenMap[TokenTypes.OP_GTE]
             else:
-                return Token(TokenTypes.OP_GT)
+                return FixedTokenMap[TokenTypes.OP_GT]
         elif c == TokenTypes.COMMA: # ,
-            return Token(TokenTypes.COMMA)
+            return FixedTokenMap[TokenTypes.COMMA]
         elif c == TokenTypes.SEMICOLON: # ;
-            return Token(TokenTypes.SEMICOLON)
+            return FixedTokenMap[TokenTypes.SEMICOLON]
         elif c == TokenTypes.L_PAREN: # (
-            return Token(TokenTypes.L_PAREN)
+            return FixedTokenMap[TokenTypes.L_PAREN]
         elif c == TokenTypes.R_PAREN: # )
-            return Token(TokenTypes.R_PAREN)
+            return FixedTokenMap[TokenTypes.R_PAREN]
         elif c == TokenTypes.L_BRACE: # {
-            return Token(TokenTypes.L_BRACE)
+            return FixedTokenMap[TokenTypes.L_BRACE]
         elif c == TokenTypes.R_BRACE: # }
-            return Token(TokenTypes.R_BRACE)
+            return FixedTokenMap[TokenTypes.R_BRACE]
         elif c == tokenizer.EOF: # ,
-            return Token(TokenTypes.EOF)
+            return FixedTokenMap[TokenTypes.EOF]
         else:
             if tokenizer.isLetter(c): # 处理单词
                 word = self.sr.readWord(c)
                 # 区分关键字和标识符
                 keywordToken = KeywordMap.get(word)
                 if keywordToken is None:
-                    return Token(TokenTypes.IDENTIFIER, word)
+                    return self.symbols.intern(word)
                 else:
                     return keywordToken
             elif tokenizer.isDigit(c): # 处理数字
                 integer = self.sr.readInteger(c)
                 return Token(TokenTypes.INTEGER, integer)
         
-        return Token(TokenTypes.ILLEGAL)
+        return FixedTokenMap[TokenTypes.ILLEGAL]
 
+class FastTokenizer:
+    '''
+    表驱动的单遍词法分析器，产生的 token 序列与 Tokenizer 完全一致
+    每个字节先查 256 项的字符类别表 _CLASSES 再分派，双字符运算符直接查看下一字节，不再 top/unread
+    直接在 BufferedSourceReader 的缓冲区上移动其游标 pos
+    '''
+    # 字符类别
+    _WHITESPACE = 0
+    _LETTER = 1
+    _DIGIT = 2
+    _SINGLE = 3 # 单字符 token
+    _DOUBLE = 4 # 可能后接 = 组成双字符运算符
+    _ILLEGAL = 5
+
+    _CLASSES:List[int] = [_ILLEGAL] * 256
+    _SINGLE_TOKENS:List[Token] = [FixedTokenMap[TokenTypes.ILLEGAL]] * 256 # 字节 -> 单字符 token
+    _DOUBLE_TOKENS:List[Token] = [FixedTokenMap[TokenTypes.ILLEGAL]] * 256 # 字节 -> 后接 = 时的 token
+    for _c in b" \t\n\r":
+        _CLASSES[_c] = _WHITESPACE
+    for _c in b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz":
+        _CLASSES[_c] = _LETTER
+    for _c in b"0123456789":
+        _CLASSES[_c] = _DIGIT
+    for _t in [TokenTypes.OP_PLUS, TokenTypes.OP_MINUS, TokenTypes.OP_ASTERISK, TokenTypes.OP_SLASH, TokenTypes.COMMA,
+               TokenTypes.SEMICOLON, TokenTypes.L_PAREN, TokenTypes.R_PAREN, TokenTypes.L_BRACE, TokenTypes.R_BRACE]:
+        _CLASSES[ord(_t)] = _SINGLE
+        _SINGLE_TOKENS[ord(_t)] = FixedTokenMap[_t]
+    for _t, _tt in [(TokenTypes.OP_ASSIGN, TokenTypes.OP_EQ), (TokenTypes.OP_BANG, TokenTypes.OP_NEQ),
+                    (TokenTypes.OP_LT, TokenTypes.OP_LTE), (TokenTypes.OP_GT, TokenTypes.OP_GTE)]:
+        _CLASSES[ord(_t)] = _DOUBLE
+        _SINGLE_TOKENS[ord(_t)] = FixedTokenMap[_t]
+        _DOUBLE_TOKENS[ord(_t)] = FixedTokenMap[_tt]
+    del _c, _t, _tt
+    _EQUAL = ord(TokenTypes.OP_ASSIGN)
+
+    def __init__(self, sr:BufferedSourceReader, symbols:Optional[SymbolTable] = None) -> None:
+        if sr.pending:
+            raise Exception("FastTokenizer cannot work on a reader with unread chars")
+        self.sr = sr
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.buffer = sr.buffer
+        self.size = sr.size
+    def nextToken(self) -> Token:
+        buffer = self.buffer
+        size = self.size
+        pos = self.sr.pos
+        if pos >= size:
+            return FixedTokenMap[TokenTypes.EOF]
+        cls = FastTokenizer._CLASSES[buffer[pos]]
+        if cls == FastTokenizer._WHITESPACE: # 跳过空白
+            pos = BufferedSourceReader._WHITESPACE.match(buffer, pos).end()
+            if pos >= size:
+                self.sr.pos = pos
+                return FixedTokenMap[TokenTypes.EOF]
+            cls = FastTokenizer._CLASSES[buffer[pos]]
+        if cls == FastTokenizer._SINGLE:
+            self.sr.pos = pos + 1
+            return FastTokenizer._SINGLE_TOKENS[buffer[pos]]
+        elif cls == FastTokenizer._LETTER: # 单词
+            end = BufferedSourceReader._WORD_TAIL.match(buffer, pos + 1).end()
+            self.sr.pos = end
+            word = buffer[pos:end].decode("ascii")
+            keywordToken = KeywordMap.get(word)
+            if keywordToken is None:
+                return self.symbols.intern(word)
+            return keywordToken
+        elif cls == FastTokenizer._DIGIT: # 整数
+            end = BufferedSourceReader._DIGITS.match(buffer, pos + 1).end()
+            self.sr.pos = end
+            return Token(TokenTypes.INTEGER, str(int(buffer[pos:end])))
+        elif cls == FastTokenizer._DOUBLE: # =, ==, !, !=, <, <=, >, >=
+            c = buffer[pos]
+            if pos + 1 < size and buffer[pos + 1] == FastTokenizer._EQUAL:
+                self.sr.pos = pos + 2
+                return FastTokenizer._DOUBLE_TOKENS[c]
+            self.sr.pos = pos + 1
+            return FastTokenizer._SINGLE_TOKENS[c]
+        self.sr.pos = pos + 1
+        return FixedTokenMap[TokenTypes.ILLEGAL]
 
 
 if __name__ == "__main__":
@@ -179,6 +346,13 @@ if __name__ == "__main__":
     print(tokenizer.isDigit(tokenizer.EOF))
     print(tokenizer.isLetter(tokenizer.EOF))
 
+    print("====")
+    sr = BufferedSourceReader(b"AB 12")
+    print(sr.read(), sr.top())
+    sr.unread("+")
+    print(sr.read(), sr.read(), sr.readSkipWhitespace(), sr.read())
+    print(sr.read() == tokenizer.EOF, sr.top() == tokenizer.EOF)
+
     print("====")
     sr = SourceReader(io.BytesIO(b'''
         let five = 5;
@@ -227,3 +401,14 @@ if __name__ == "__main__":
             break
     print(" ".join(tokens))
 
+    print("====")
+    source = b"let a1 = 007 == b; c!=!d <= >=> @ if(x){return a<b;} else"
+    tz, ftz = Tokenizer(BufferedSourceReader(source)), FastTokenizer(BufferedSourceReader(source))
+    tokens = []
+    while True:
+        t, ft = tz.nextToken(), ftz.nextToken()
+        assert str(t) == str(ft), f"{t} != {ft}"
+        tokens.append(ft.__repr__())
+        if t.tokenType == TokenTypes.EOF:
+            break
+    print(" ".join(tokens))
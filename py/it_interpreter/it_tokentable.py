@@ -0,0 +1,101 @@
+'''
+数组形式的 token 表（struct-of-arrays）
+kinds/starts/ends 三个平行数组，分别记录 token 种类编号 kind 和它在原代码中的起止位置
+字面量通过 memoryview 按需切片，不为每个 token 创建对象
+'''
+
+from it_interpreter.it_token import TokenType, TokenTypes, Token, KeywordMap, FixedTokenMap, TokenTypeList, TokenKindMap, SymbolTable
+from array import array
+from typing import Dict, List, Optional, Union
+import mmap
+import re
+
+class TokenTable:
+    '''
+    token 表
+    最后一个 token 一定是 EOF 或 ILLEGAL
+    标识符 Token 在构建时通过符号表 symbols 共享
+    '''
+    Source = Union[bytes, bytearray, mmap.mmap]
+    EOF = TokenKindMap[TokenTypes.EOF]
+    ILLEGAL = TokenKindMap[TokenTypes.ILLEGAL]
+    IDENTIFIER = TokenKindMap[TokenTypes.IDENTIFIER]
+    INTEGER = TokenKindMap[TokenTypes.INTEGER]
+
+    def __init__(self, source:Source, symbols:Optional[SymbolTable] = None) -> None:
+        self.source = memoryview(source)
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.kinds = array('B') # token 种类编号，见 TokenTypeList
+        self.starts = array('I') # 起始位置（含），原代码不超过 4GB
+        self.ends = array('I') # 结束位置（不含）
+    def append(self, kind:int, start:int, end:int) -> None:
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+    def __len__(self) -> int:
+        return len(self.kinds)
+    def tokenType(self, index:int) -> TokenType:
+        return TokenTypeList[self.kinds[index]]
+    def literal(self, index:int) -> str: # 原代码中的字面量
+        return self.source[self.starts[index]:self.ends[index]].tobytes().decode("ascii")
+    def token(self, index:int) -> Token: # 按需构建 Token 对象
+        kind = self.kinds[index]
+        tokenType = TokenTypeList[kind]
+        if kind == TokenTable.IDENTIFIER:
+            return self.symbols.intern(self.literal(index))
+        elif kind == TokenTable.INTEGER:
+            return Token(tokenType, str(int(self.literal(index))))
+        return FixedTokenMap[tokenType]
+    def __str__(self) -> str:
+        return " ".join(self.token(i).__repr__() for i in range(len(self)))
+
+    # 每个运算符、分隔符各占一个分组，匹配到的分组编号 lastindex 直接映射为 kind
+    _FIXED:List[TokenType] = [
+        TokenTypes.OP_EQ, TokenTypes.OP_NEQ, TokenTypes.OP_LTE, TokenTypes.OP_GTE, # 双字符运算符优先
+        TokenTypes.OP_ASSIGN, TokenTypes.OP_PLUS, TokenTypes.OP_MINUS, TokenTypes.OP_ASTERISK, TokenTypes.OP_SLASH,
+        TokenTypes.OP_BANG, TokenTypes.OP_LT, TokenTypes.OP_GT, TokenTypes.COMMA, TokenTypes.SEMICOLON,
+        TokenTypes.L_PAREN, TokenTypes.R_PAREN, TokenTypes.L_BRACE, TokenTypes.R_BRACE,
+    ]
+    _LEXEME = re.compile(rb"[ \t\n\r]*(?:" + b"|".join(b"(" + re.escape(t.encode("ascii")) + b")" for t in _FIXED)
+                         + rb"|([A-Za-z][A-Za-z0-9]*)|([0-9]+))")
+    _GROUP_KINDS:List[int] = [-1] + [TokenKindMap[t] for t in _FIXED] + [IDENTIFIER, INTEGER]
+    _WORD_GROUP = len(_FIXED) + 1
+    _KEYWORD_KINDS:Dict[bytes, int] = {k.encode("ascii"):TokenKindMap[k] for k in KeywordMap}
+    _WHITESPACE = re.compile(rb"[ \t\n\r]*")
+
+    @staticmethod
+    def build(source:Source, symbols:Optional[SymbolTable] = None) -> 'TokenTable':
+        table = TokenTable(source, symbols)
+        kinds, starts, ends = table.kinds, table.starts, table.ends
+        groupKinds, wordGroup, keywordKinds = TokenTable._GROUP_KINDS, TokenTable._WORD_GROUP, TokenTable._KEYWORD_KINDS
+        pos = 0
+        for m in iter(TokenTable._LEXEME.scanner(source).match, None):
+            group = m.lastindex
+            kind = groupKinds[group]
+            if group == wordGroup: # 区分关键字和标识符
+                kind = keywordKinds.get(m.group(group), kind)
+            kinds.append(kind)
+            starts.append(m.start(group))
+            pos = m.end()
+            ends.append(pos)
+        pos = TokenTable._WHITESPACE.match(source, pos).end()
+        if pos >= len(source):
+            table.append(TokenTable.EOF, pos, pos)
+        else: # 无法识别的字符
+            table.append(TokenTable.ILLEGAL, pos, pos + 1)
+        return table
+
+
+if __name__ == "__main__":
+    table = TokenTable.build(b'''
+        let add = fn(x, y) {
+        x + y;
+        };
+        let result = add(five, 010);
+        !-/*5 <= 10 != 5 == 3 >= 2;
+        if (5 < 10) { return true; } else { return false; }
+    ''')
+    print(len(table), table.kinds.itemsize, table.starts.itemsize)
+    print(table)
+    print(TokenTable.build(b"a = 1; @ b"))
+    print(TokenTable.build(b""))
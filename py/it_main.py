@@ -6,7 +6,7 @@ if __name__ == "__main__":
     
     import sys
     import io
-    from it_interpreter import it_ast, it_evaluator, it_tokenizer, it_parser
+    from it_interpreter import it_ast, it_evaluator, it_tokenizer, it_parser, it_cache, it_optimizer, it_closure, it_stackeval, it_memo
 
     def REPL()->None:
         evaluator = it_evaluator.Evaluator()
@@ -33,31 +33,72 @@ if __name__ == "__main__":
             if evaluator.returnMode:
                 break
 
-    def run(code:io.IOBase)->None:
-        ast = it_parser.parser.parse(code)
-        it_evaluator.Evaluator().eval(ast)
+    def run(ast:it_ast.Program)->None:
+        if optimize:
+            ast = it_optimizer.Optimizer().optimize(ast)
+        evaluator = engines[engine]()
+        if memoize:
+            evaluator.memo = it_memo.Memoizer(ast)
+        evaluator.eval(ast)
         print("runtime" ,time.time() - start)
+        if memoize:
+            print(evaluator.memo)
+        if stats:
+            print(evaluator.cacheStats())
 
 
     def help()->None:
         print("interpreter_tb https://github.com/madokast/interpreter_tb")
         print("-h        help")
         print("-r        REPL")
-        print("-f [file] execute file")
+        print("-f [file] execute file, the parsed program is cached on disk in __itcache__")
+        print("          (the in-memory cache only helps when one process loads files repeatedly, not across runs)")
+        print("-s [file] execute file while parsing, one top-level statement at a time")
+        print("-l [file] execute file, function bodies are parsed on first call")
         print("-c [code] execute code")
+        print("-O        optimize before execution (constant folding, dead code elimination), e.g. -O -f [file]")
+        print("-M        memoize calls to pure functions (ast engine, not with -s), e.g. -M -f [file]")
+        print("--engine [ast|stack|closure] execution engine, e.g. -f [file] --engine closure")
+        print("          stack: no recursion limit, deep recursion is limited by memory only")
+        print("--stats   print inline cache hit rates (ast engine, not with -s), e.g. -f [file] --stats")
 
 
+    engines = {"ast":it_evaluator.Evaluator, "stack":it_stackeval.StackEvaluator, "closure":it_closure.ClosureEngine}
     argv = sys.argv
-    if len(argv) == 1:
+    optimize = '-O' in argv
+    if optimize:
+        argv = [a for a in argv if a != '-O']
+    memoize = '-M' in argv
+    if memoize:
+        argv = [a for a in argv if a != '-M']
+    stats = '--stats' in argv
+    if stats:
+        argv = [a for a in argv if a != '--stats']
+    engine = "ast"
+    if '--engine' in argv:
+        index = argv.index('--engine')
+        engine = argv[index + 1] if index + 1 < len(argv) else ""
+        argv = argv[:index] + argv[index + 2:]
+    if engine not in engines or ((memoize or stats) and (engine != "ast" or '-s' in argv)):
+        help()
+    elif len(argv) == 1:
         help()
     elif len(argv) == 3:
         if (argv[1] == '-r'):
             REPL()
         elif (argv[1] == '-f'):
-            with open(argv[2], encoding="utf-8") as f:
-                run(io.BytesIO(f.read().encode("ascii")))
+            run(it_cache.programCache.load(argv[2]))
+        elif (argv[1] == '-l'):
+            run(it_parser.parser.parseFile(argv[2], lazy=True))
+        elif (argv[1] == '-s'):
+            statements = it_parser.parser.streamFile(argv[2])
+            if optimize:
+                optimizer = it_optimizer.Optimizer()
+                statements = (optimizer.optimize(s) for s in statements)
+            engines[engine]().evalStatements(statements)
+            print("runtime" ,time.time() - start)
         elif (argv[1] == '-c'):
-            run(io.BytesIO(argv[2].encode("ascii")))
+            run(it_parser.parser.parse(io.BytesIO(argv[2].encode("ascii"))))
         else:
             help()
     else:
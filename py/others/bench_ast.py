@@ -0,0 +1,51 @@
+'''
+AST 节点的内存占用与求值速度
+python others/bench_ast.py [源码字节数] [循环次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import gc
+import time
+import tracemalloc
+import contextlib
+from it_interpreter.it_ast import Node
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+from bench_source import generateSource
+
+def generateLoopSource(count:int) -> bytes:
+    return f'''
+let add = fn(x, y) {{ return x + y; }};
+let s = 0;
+let i = 0;
+while (i < {count}) {{
+    if (i / 3 * 3 == i) {{ s = add(s, i); }} else {{ s = s - 1; }}
+    i = i + 1;
+}}
+println(s);
+'''.encode("ascii")
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 512*1024
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    source = generateSource(size)
+    gc.collect()
+    tracemalloc.start()
+    program = parser.parse(io.BytesIO(source))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = sum(1 for o in gc.get_objects() if isinstance(o, Node))
+    print(f"source {len(source)} bytes, {nodes} nodes, AST {current/1024/1024:.1f}MB, {current/nodes:.0f} bytes/node")
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(None):
+        Evaluator().eval(program)
+    print(f"eval generated source {time.perf_counter() - start:.3f}s")
+    del program
+    loop = parser.parse(io.BytesIO(generateLoopSource(count)))
+    start = time.perf_counter()
+    Evaluator().eval(loop)
+    print(f"eval while loop x{count} {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,38 @@
+'''
+不声明变量的代码块不进栈：while 循环体、if 分支都不创建栈帧
+python others/bench_blocks.py [循环次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+from it_interpreter.it_stackeval import StackEvaluator
+from it_interpreter.it_closure import ClosureEngine
+
+def generateSource(count:int) -> bytes:
+    return f"let s = 0; let i = 0; while (i < {count}) {{ if (i / 2 * 2 == i) {{ s = s + 1; }} else {{ s = s - 1; }} i = i + 1; }} s;".encode("ascii")
+
+def countPushes(engine, program) -> int: # 统计进栈次数
+    pushes = [0]
+    push = engine.env.stackPush
+    def counting() -> None:
+        pushes[0] += 1
+        push()
+    engine.env.stackPush = counting
+    engine.eval(program)
+    return pushes[0]
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    program = parser.parse(io.BytesIO(generateSource(count)))
+    small = parser.parse(io.BytesIO(generateSource(1000)))
+    for engineType in [Evaluator, StackEvaluator, ClosureEngine]:
+        engine = engineType()
+        start = time.perf_counter()
+        engine.eval(program)
+        cost = time.perf_counter() - start
+        print(f"{engineType.__name__:14} x{count} {cost:.3f}s  result {engine.result}  frames pushed per iteration {countPushes(engineType(), small) / 1000:.0f}")
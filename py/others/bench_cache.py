@@ -0,0 +1,42 @@
+'''
+解析缓存的冷启动与热启动对比
+cold: 没有缓存，解析并写入磁盘；disk: 新的进程内缓存，从磁盘读取；memory: 进程内 LRU 命中
+python others/bench_cache.py [源码字节数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import gc
+import time
+import shutil
+import tempfile
+from it_interpreter.it_cache import ProgramCache
+from it_interpreter.it_evaluator import Evaluator
+from bench_source import generateSource
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024*1024
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "bench.it")
+        with open(path, "wb") as f:
+            f.write(generateSource(size))
+        print(f"source {os.path.getsize(path)} bytes")
+        cache = ProgramCache()
+        programs = []
+        for name in ["cold", "disk", "memory"]:
+            if name == "disk":
+                cache = ProgramCache() # 模拟新进程，内存缓存为空
+            gc.collect()
+            start = time.perf_counter()
+            program = cache.load(path)
+            print(f"{name:6} {time.perf_counter() - start:.3f}s  {cache}")
+            evaluator = Evaluator() # 执行结果一致即可，str(program) 本身太慢
+            evaluator.eval(program)
+            programs.append(str(evaluator.env))
+        cacheFile = os.listdir(os.path.join(directory, ProgramCache.DIRECTORY))[0]
+        print(f"cache file {os.path.getsize(os.path.join(directory, ProgramCache.DIRECTORY, cacheFile))} bytes")
+        assert programs[0] == programs[1] == programs[2]
+    finally:
+        shutil.rmtree(directory)
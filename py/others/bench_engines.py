@@ -0,0 +1,45 @@
+'''
+AST 解释器 Evaluator、显式栈解释器 StackEvaluator 与闭包编译引擎 ClosureEngine 的对比
+python others/bench_engines.py [循环次数] [递归参数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+from it_interpreter.it_stackeval import StackEvaluator
+from it_interpreter.it_closure import ClosureEngine
+
+def generateLoopSource(count:int) -> bytes:
+    return f'''
+let s = 0;
+let i = 0;
+while (i < {count}) {{
+    if (i / 3 * 3 == i) {{ s = s + i * 2; }} else {{ s = s - 1; }}
+    i = i + 1;
+}}
+s;
+'''.encode("ascii")
+
+def generateCallSource(n:int) -> bytes:
+    return f'''
+let fib = fn(n) {{ if (n < 2) {{ return n; }} return fib(n - 1) + fib(n - 2); }};
+fib({n});
+'''.encode("ascii")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    for name, source in [(f"while loop x{count}", generateLoopSource(count)), (f"fib({n})", generateCallSource(n))]:
+        program = parser.parse(io.BytesIO(source))
+        results = []
+        for engine in [Evaluator(), StackEvaluator(), ClosureEngine()]:
+            start = time.perf_counter()
+            engine.eval(program)
+            cost = time.perf_counter() - start
+            results.append(str(engine.result))
+            print(f"{name:18} {type(engine).__name__:14} {cost:.3f}s  result {engine.result}")
+        assert len(set(results)) == 1
@@ -0,0 +1,31 @@
+'''
+Evaluator 的内联缓存：标识符节点缓存绑定栈，调用点缓存函数对象和形参列表，输出耗时和命中率
+python others/bench_inline.py [重复次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+
+SOURCES = {
+    "loop": "let s = 0; let i = 0; while (i < 100000) { s = s + i * 2; i = i + 1; } s;",
+    "fib": "let fib = fn(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }; fib(20);",
+    "calls": "let add = fn(a, b) { return a + b; }; let s = 0; let i = 0; while (i < 30000) { s = add(s, i); i = add(i, 1); } s;",
+}
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for name, source in SOURCES.items():
+        program = parser.parse(io.BytesIO(source.encode("ascii")))
+        best = float("inf")
+        for _ in range(repeat):
+            evaluator = Evaluator()
+            start = time.perf_counter()
+            evaluator.eval(program)
+            best = min(best, time.perf_counter() - start)
+        stats = evaluator.cacheStats() if hasattr(evaluator, "cacheStats") else ""
+        print(f"{name:6} best of {repeat} {best:.3f}s  result {evaluator.result}  {stats}")
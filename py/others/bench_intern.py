@@ -0,0 +1,42 @@
+'''
+标识符密集代码的内存占用：token 列表与 AST
+python others/bench_intern.py [源码字节数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+import tracemalloc
+from it_interpreter.it_tokenizer import tokenizer
+from it_interpreter.it_parser import parser
+
+def generateIdentifierHeavySource(size:int) -> bytes:
+    names = ["alpha", "beta", "gamma", "delta", "counter", "total", "index", "result"]
+    parts = ["let %s = 1;\n" % n for n in names]
+    total = 0
+    i = 0
+    while total < size:
+        a, b, c, d = names[i%8], names[(i+3)%8], names[(i+5)%8], names[(i+7)%8]
+        part = f"{a} = {b} + {c} * ({d} - {a}) / ({b} + {c} + {d});\n"
+        parts.append(part)
+        total += len(part)
+        i += 1
+    return "".join(parts).encode("ascii")
+
+def _measure(name:str, fun) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fun()
+    cost = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:20s} retained {current/1024/1024:.1f}MB ({cost:.2f}s with tracemalloc)")
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024*1024
+    source = generateIdentifierHeavySource(size)
+    print(f"source {len(source)} bytes")
+    _measure("tokenizer.tokenize", lambda: tokenizer.tokenize(io.BytesIO(source)))
+    _measure("parser.parse", lambda: parser.parse(io.BytesIO(source)))
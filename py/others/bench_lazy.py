@@ -0,0 +1,52 @@
+'''
+函数体预解析（lazy）与完整解析的对比
+源码定义大量函数，只调用其中少数几个，统计首条语句开始执行前的耗时（即解析耗时）和总耗时
+python others/bench_lazy.py [函数个数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import gc
+import time
+import tempfile
+import contextlib
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+
+def generateLibrary(count:int) -> bytes:
+    parts = []
+    for i in range(count):
+        parts.append(
+            f"let f{i} = fn(a, b) {{\n"
+            f"    let s = 0;\n"
+            f"    while (a > 0) {{ s = s + a * {i % 13} - b / 2; a = a - 1; }}\n"
+            f"    if (s > {i}) {{ return s - {i}; }} else {{ return fn(x) {{ return x + s; }}({i}); }}\n"
+            f"}};\n"
+        )
+    parts.append("".join(f"println(f{i}(10, 3));\n" for i in range(0, count, max(1, count // 5))))
+    return "".join(parts).encode("ascii")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    with tempfile.NamedTemporaryFile(suffix=".it", delete=False) as f:
+        f.write(generateLibrary(count))
+        path = f.name
+    print(f"{count} functions, source {os.path.getsize(path)} bytes")
+    try:
+        outputs = []
+        for name, lazy in [("eager", False), ("lazy", True)]:
+            gc.collect()
+            start = time.perf_counter()
+            program = parser.parseFile(path, lazy=lazy)
+            firstStatement = time.perf_counter() - start # 解析完成后才开始执行第一条语句
+            with contextlib.redirect_stdout(None):
+                evaluator = Evaluator()
+                evaluator.eval(program)
+            total = time.perf_counter() - start
+            outputs.append(str(evaluator.env))
+            print(f"{name:6} time-to-first-statement {firstStatement:.3f}s  total {total:.3f}s")
+            del program, evaluator
+        assert outputs[0] == outputs[1]
+    finally:
+        os.remove(path)
@@ -0,0 +1,40 @@
+'''
+词法分析吞吐对比：Tokenizer、表驱动的 FastTokenizer、TokenTable.build
+python others/bench_lexer.py [源码字节数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import time
+from bench_source import generateSource
+from it_interpreter.it_token import TokenTypes
+from it_interpreter.it_tokenizer import BufferedSourceReader, Tokenizer, FastTokenizer
+from it_interpreter.it_tokentable import TokenTable
+
+def _count(tk) -> int:
+    n = 1
+    while tk.nextToken().tokenType != TokenTypes.EOF:
+        n += 1
+    return n
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 4*1024*1024
+    source = generateSource(size)
+    print(f"source {len(source)} bytes")
+    for name, fun in [("Tokenizer", lambda: _count(Tokenizer(BufferedSourceReader(source)))),
+                      ("FastTokenizer", lambda: _count(FastTokenizer(BufferedSourceReader(source)))),
+                      ("TokenTable.build", lambda: len(TokenTable.build(source)))]:
+        start = time.perf_counter()
+        n = fun()
+        cost = time.perf_counter() - start
+        print(f"{name:18s} {n} tokens {cost:.3f}s {n/cost:,.0f} tokens/s {len(source)/cost/1024/1024:.2f}MB/s")
+
+    # 两者 token 序列完全一致
+    tk, ftk = Tokenizer(BufferedSourceReader(source)), FastTokenizer(BufferedSourceReader(source))
+    while True:
+        t, ft = tk.nextToken(), ftk.nextToken()
+        assert str(t) == str(ft), f"{t} != {ft}"
+        if t.tokenType == TokenTypes.EOF:
+            break
+    print("same token sequence")
@@ -0,0 +1,37 @@
+'''
+深递归中访问全局变量的耗时，变量查找与调用深度无关时总耗时应当随深度线性增长
+python others/bench_lookup.py [最大深度]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+
+def generateRecursionSource(depth:int) -> bytes:
+    return f'''
+let g = 1;
+let h = 2;
+let down = fn(n) {{
+    if (n == 0) {{ return g; }}
+    let t = g + h;
+    return down(n - 1) + t - h;
+}};
+down({depth});
+'''.encode("ascii")
+
+if __name__ == "__main__":
+    maxDepth = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    sys.setrecursionlimit(100 * maxDepth + 1000) # 每层递归占用若干 Python 栈帧
+    depth = 500
+    while depth <= maxDepth:
+        program = parser.parse(io.BytesIO(generateRecursionSource(depth)))
+        evaluator = Evaluator()
+        start = time.perf_counter()
+        evaluator.eval(program)
+        cost = time.perf_counter() - start
+        print(f"depth {depth:6d}  {cost:.3f}s  {cost / depth * 1e6:.1f}us/level  result {evaluator.result}")
+        depth *= 2
@@ -0,0 +1,38 @@
+'''
+纯函数记忆化：朴素递归的斐波那契、组合数，有无 Memoizer 的对比，以及缓存容量的影响
+python others/bench_memo.py [斐波那契参数] [组合数参数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from typing import Optional
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+from it_interpreter.it_memo import Memoizer
+
+def generateFibSource(n:int) -> bytes:
+    return f"let fib = fn(n) {{ if (n < 2) {{ return n; }} return fib(n - 1) + fib(n - 2); }}; fib({n});".encode("ascii")
+
+def generateBinomialSource(n:int) -> bytes:
+    return f"let c = fn(n, k) {{ if (k == 0) {{ return 1; }} if (k == n) {{ return 1; }} return c(n - 1, k - 1) + c(n - 1, k); }}; c({n}, {n // 2});".encode("ascii")
+
+def run(name:str, source:bytes, capacity:Optional[int]) -> None:
+    program = parser.parse(io.BytesIO(source))
+    evaluator = Evaluator()
+    if capacity is not None:
+        evaluator.memo = Memoizer(program, capacity)
+    start = time.perf_counter()
+    evaluator.eval(program)
+    cost = time.perf_counter() - start
+    print(f"{name:10} {'no memo' if capacity is None else f'capacity {capacity}':14} {cost:.3f}s  result {evaluator.result}  {evaluator.memo or ''}")
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    m = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    for name, source in [(f"fib({n})", generateFibSource(n)), (f"c({m}, {m // 2})", generateBinomialSource(m))]:
+        for capacity in [None, 1024, 8]:
+            run(name, source, capacity)
+    run("fib(150)", generateFibSource(150), 1024) # 不记忆化时不可能算完
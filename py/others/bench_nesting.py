@@ -0,0 +1,44 @@
+'''
+深度嵌套代码的语法分析：递归的 PrattParser 与显式栈的 IterativeParser
+python others/bench_nesting.py [嵌套层数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import time
+from it_interpreter.it_tokenizer import BufferedSourceReader, FastTokenizer
+from it_interpreter.it_pratt import PrattParser, IterativeParser
+
+def _cases(depth:int) -> list:
+    return [
+        ("((((x))))", "(" * depth + "x" + ")" * depth + ";"),
+        ("- - - - x", "- " * depth + "x;"),
+        ("1+(1+(1+...))", "1+(" * depth + "1" + ")" * depth + ";"),
+        ("{{{{}}}}", "{" * depth + "}" * depth),
+        ("if(x){if(x){...}}", "if(x){" * depth + "}" * depth),
+    ]
+
+def _parse(parserClass, source:bytes):
+    tokenized = parserClass.fromTokenizer(FastTokenizer(BufferedSourceReader(source))) # 只测量语法分析
+    start = time.perf_counter()
+    try:
+        program = tokenized.parse()
+        return program, f"{time.perf_counter() - start:.4f}s"
+    except RecursionError:
+        return None, "RecursionError"
+
+if __name__ == "__main__":
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(f"depth {depth}")
+    for name, code in _cases(depth):
+        source = code.encode("ascii")
+        _, default = _parse(PrattParser, source)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(depth * 10 + 1000) # 放宽递归限制，测量递归版本的耗时
+        expected, recursive = _parse(PrattParser, source)
+        iterative, iterativeCost = _parse(IterativeParser, source)
+        assert str(iterative) == str(expected)
+        sys.setrecursionlimit(limit)
+        _, iterativeDefault = _parse(IterativeParser, source)
+        print(f"{name:20s} PrattParser {default} (raised limit {recursive})  IterativeParser {iterativeDefault}")
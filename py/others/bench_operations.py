@@ -0,0 +1,45 @@
+'''
+operation.binary、operation.unary 每个运算符的耗时
+python others/bench_operations.py [每个运算符的执行次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import timeit
+from it_interpreter.it_token import TokenTypes
+from it_interpreter.it_object import IntegerObject, BoolObject, NullObject, operation
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    a, b = IntegerObject(3000), IntegerObject(7)
+    t, f = BoolObject(True), BoolObject(False)
+    cases = [
+        ("+", TokenTypes.OP_PLUS, a, b), ("-", TokenTypes.OP_MINUS, a, b), ("*", TokenTypes.OP_ASTERISK, a, b), ("/", TokenTypes.OP_SLASH, a, b),
+        (">", TokenTypes.OP_GT, a, b), (">=", TokenTypes.OP_GTE, a, b), ("<", TokenTypes.OP_LT, a, b), ("<=", TokenTypes.OP_LTE, a, b),
+        ("== int", TokenTypes.OP_EQ, a, b), ("!= int", TokenTypes.OP_NEQ, a, b), ("== bool", TokenTypes.OP_EQ, t, f), ("!= bool", TokenTypes.OP_NEQ, t, f),
+    ]
+    binary = operation.binary
+    for name, operator, left, right in cases:
+        cost = timeit.timeit(lambda: binary(operator, left, right), number=number)
+        print(f"binary {name:8} {cost / number * 1e9:7.0f} ns")
+    unary = operation.unary
+    for name, operator, operand in [("-", TokenTypes.OP_MINUS, a), ("!", TokenTypes.OP_BANG, t)]:
+        cost = timeit.timeit(lambda: unary(operator, operand), number=number)
+        print(f"unary  {name:8} {cost / number * 1e9:7.0f} ns")
+    def invalid() -> None:
+        try:
+            binary(TokenTypes.OP_PLUS, a, t)
+        except Exception:
+            pass
+    print(f"binary invalid  {timeit.timeit(invalid, number=number // 10) / (number // 10) * 1e9:7.0f} ns")
+    for operator, left, right in [(TokenTypes.OP_PLUS, a, t), (TokenTypes.OP_GT, t, f), (TokenTypes.OP_EQ, a, t), (TokenTypes.OP_MINUS, NullObject(), a), (TokenTypes.OP_SLASH, a, IntegerObject(0))]:
+        try:
+            binary(operator, left, right)
+        except Exception as e:
+            print("error:", e)
+    for operator, operand in [(TokenTypes.OP_MINUS, t), (TokenTypes.OP_BANG, a), (TokenTypes.OP_BANG, NullObject()), (TokenTypes.OP_PLUS, a)]:
+        try:
+            unary(operator, operand)
+        except Exception as e:
+            print("error:", e)
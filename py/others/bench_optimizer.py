@@ -0,0 +1,47 @@
+'''
+常量折叠与死分支消除前后的求值耗时
+模板生成的代码：循环体内有常量表达式、常量条件的 if、return 之后的语句
+python others/bench_optimizer.py [循环次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+from it_interpreter.it_optimizer import Optimizer
+
+def generateTemplateSource(count:int) -> bytes:
+    return f'''
+let scale = fn(x) {{
+    if (1 > 0) {{ return x * (2 + 3) * 4 - (10 / 2); }} else {{ return 0; }}
+    return x;
+    x = x + 1;
+}};
+let s = 0;
+let i = 0;
+while (i < {count}) {{
+    if (2 * 3 == 6 == !false) {{ s = s + scale(i) / (100 * 10); }} else {{ s = s - 1; }}
+    if (1 > 2) {{ s = 0; }}
+    i = i + (3 - 2);
+}}
+s;
+'''.encode("ascii")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    program = parser.parse(io.BytesIO(generateTemplateSource(count)))
+    start = time.perf_counter()
+    optimizer = Optimizer()
+    optimized = optimizer.optimize(program)
+    print(f"optimize {time.perf_counter() - start:.4f}s, folded {optimizer.folded}, pruned {optimizer.pruned}")
+    results = []
+    for name, ast in [("original", program), ("optimized", optimized)]:
+        evaluator = Evaluator()
+        start = time.perf_counter()
+        evaluator.eval(ast)
+        print(f"{name:10} eval {time.perf_counter() - start:.3f}s  result {evaluator.result}")
+        results.append(str(evaluator.result))
+    assert results[0] == results[1]
@@ -0,0 +1,54 @@
+'''
+语法分析吞吐对比：Parser、TableParser、PrattParser
+python others/bench_parser.py [源码字节数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import gc
+import time
+from bench_source import generateSource
+from it_interpreter.it_token import TokenTypes
+from it_interpreter.it_tokenizer import BufferedSourceReader, FastTokenizer
+from it_interpreter.it_tokentable import TokenTable
+from it_interpreter.it_parser import Parser, TableParser
+from it_interpreter.it_pratt import PrattParser
+
+class _ListTokenizer:
+    '''
+    从预先读好的 token 列表中产生 token，只测量 Parser 本身
+    '''
+    def __init__(self, tokens:list, symbols) -> None:
+        self.tokens = iter(tokens)
+        self.symbols = symbols
+    def nextToken(self):
+        return next(self.tokens)
+
+def _statements(program) -> list:
+    return [str(s) for s in program.statements()]
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2*1024*1024
+    source = generateSource(size)
+    print(f"source {len(source)} bytes")
+    tk = FastTokenizer(BufferedSourceReader(source))
+    tokens = [tk.nextToken()]
+    while tokens[-1].tokenType != TokenTypes.EOF:
+        tokens.append(tk.nextToken())
+    table = TokenTable.build(source)
+
+    expected = None
+    for name, fun in [("Parser", lambda: Parser(_ListTokenizer(tokens + [tokens[-1]], tk.symbols)).parse()),
+                      ("TableParser", lambda: TableParser(table).parse()),
+                      ("PrattParser", lambda: PrattParser(tokens, tk.symbols).parse())]:
+        gc.collect()
+        start = time.perf_counter()
+        program = fun()
+        cost = time.perf_counter() - start
+        print(f"{name:12s} {len(tokens)} tokens {cost:.3f}s {len(tokens)/cost:,.0f} tokens/s (tokenized beforehand)")
+        statements = _statements(program)
+        expected = statements if expected is None else expected
+        assert statements == expected, name
+        del program, statements
+    print("same Program trees")
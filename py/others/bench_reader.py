@@ -0,0 +1,30 @@
+'''
+SourceReader 与 BufferedSourceReader 的词法分析吞吐对比
+python others/bench_reader.py [源码字节数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from bench_source import generateSource
+from it_interpreter.it_token import TokenTypes
+from it_interpreter.it_tokenizer import SourceReader, BufferedSourceReader, Tokenizer
+
+def _count(tk:Tokenizer) -> int:
+    n = 0
+    while tk.nextToken().tokenType != TokenTypes.EOF:
+        n += 1
+    return n
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2*1024*1024
+    source = generateSource(size)
+    print(f"source {len(source)} bytes")
+    for name, make in [("SourceReader", lambda: SourceReader(io.BytesIO(source))),
+                       ("BufferedSourceReader", lambda: BufferedSourceReader.fromInput(io.BytesIO(source)))]:
+        start = time.perf_counter()
+        n = _count(Tokenizer(make()))
+        cost = time.perf_counter() - start
+        print(f"{name:22s} {n} tokens {cost:.3f}s {n/cost:,.0f} tokens/s")
@@ -0,0 +1,31 @@
+'''
+深递归：AST 解释器 Evaluator 与显式栈解释器 StackEvaluator 的对比
+Evaluator 每层用户递归占多层 Python 调用栈，超过 Python 递归上限时报 RecursionError
+python others/bench_recursion.py [递归深度...]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+from it_interpreter.it_stackeval import StackEvaluator
+
+def generateSource(n:int) -> bytes:
+    return f"let fa = fn(n) {{if(n==0){{return 1;}}else{{return fa(n-1)*n;}}}}; fa({n}) / fa({n} - 1);".encode("ascii")
+
+if __name__ == "__main__":
+    depths = [int(a) for a in sys.argv[1:]] or [100, 2000, 20000]
+    for n in depths:
+        program = parser.parse(io.BytesIO(generateSource(n)))
+        for engine in [Evaluator(), StackEvaluator()]:
+            start = time.perf_counter()
+            try:
+                engine.eval(program)
+                outcome = f"result {engine.result}"
+            except RecursionError:
+                outcome = "RecursionError"
+            cost = time.perf_counter() - start
+            print(f"fa({n}) {type(engine).__name__:14} {cost:.3f}s  {outcome}")
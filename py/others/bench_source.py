@@ -0,0 +1,19 @@
+'''
+基准测试使用的代码生成器
+生成指定大小、语法合法且可以执行的原代码
+'''
+
+def generateSource(size:int) -> bytes:
+    parts = ["let a%d = %d;\n" % (i, i) for i in range(7)]
+    total = sum(len(p) for p in parts)
+    i = 0
+    while total < size:
+        part = (
+            f"let v{i} = {i} * (a{i%7} + 3) - {i%13} / 2;\n"
+            f"let f{i} = fn(x, y) {{ if (x >= y) {{ return x - y; }} else {{ return y + x * {i}; }} }};\n"
+            f"if (v{i} > 0 == !false) {{ v{i} = f{i}(v{i}, -{i%5}); }}\n"
+        )
+        parts.append(part)
+        total += len(part)
+        i += 1
+    return "".join(parts).encode("ascii")
@@ -0,0 +1,57 @@
+'''
+整体解析后执行（-f）与流式边解析边执行（-s）的峰值内存对比
+python others/bench_stream.py [源码字节数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import time
+import tempfile
+import tracemalloc
+import contextlib
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+
+def generateBatchSource(size:int) -> bytes:
+    parts = ["let total = 0;\nlet count = 0;\n"]
+    total = 0
+    i = 0
+    while total < size:
+        part = (
+            f"total = total + ({i} * 3 - {i%7}) / 2;\n"
+            f"if (total > 1000000) {{ total = total - 1000000; count = count + 1; }}\n"
+            f"{{ let t = total * 2; if (t == {i}) {{ count = count - 1; }} }}\n"
+        )
+        parts.append(part)
+        total += len(part)
+        i += 1
+    parts.append("println(total);\nprintln(count);\n")
+    return "".join(parts).encode("ascii")
+
+def _whole(path:str) -> None:
+    Evaluator().eval(parser.parseFile(path))
+
+def _stream(path:str) -> None:
+    Evaluator().evalStatements(parser.streamFile(path))
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2*1024*1024
+    with tempfile.NamedTemporaryFile(suffix=".it", delete=False) as f:
+        f.write(generateBatchSource(size))
+        path = f.name
+    print(f"source {os.path.getsize(path)} bytes")
+    try:
+        for name, fun in [("parseFile + eval", _whole), ("streamFile + evalStatements", _stream)]:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(None):
+                fun(path)
+            cost = time.perf_counter() - start
+            tracemalloc.start()
+            with contextlib.redirect_stdout(None):
+                fun(path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:28s} {cost:.2f}s peak {peak/1024/1024:.2f}MB")
+    finally:
+        os.remove(path)
@@ -0,0 +1,45 @@
+'''
+尾调用：return loop(i - 1, acc + i) 形式的循环
+没有尾调用时每次迭代占用一层环境栈帧和多层 Python 调用栈，很快报 RecursionError；复用栈帧后只占固定的栈
+对照同样次数的 while 循环；注意实参在被调函数的栈帧中求值，acc + i 中的 i 已经是新的 i - 1
+python others/bench_tailcall.py [迭代次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+import tracemalloc
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+
+def generateTailCallSource(count:int) -> bytes:
+    return f"let loop = fn(i, acc) {{ if (i == 0) {{ return acc; }} return loop(i - 1, acc + i); }}; loop({count}, 0);".encode("ascii")
+
+def generateWhileSource(count:int) -> bytes:
+    return f"let i = {count}; let acc = 0; while (i != 0) {{ i = i - 1; acc = acc + i; }} acc;".encode("ascii")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for name, source in [("tail call", generateTailCallSource(count)), ("while", generateWhileSource(count))]:
+        program = parser.parse(io.BytesIO(source))
+        evaluator = Evaluator()
+        start = time.perf_counter()
+        try:
+            evaluator.eval(program)
+            outcome = f"result {evaluator.result}"
+        except RecursionError:
+            outcome = "RecursionError"
+        cost = time.perf_counter() - start
+        print(f"{name:10} x{count} {cost:.3f}s  {outcome}  tail calls {getattr(evaluator, 'tailCalls', '-')}")
+    # 内存不随迭代次数增长
+    for n in [count // 100, count // 10]:
+        program = parser.parse(io.BytesIO(generateTailCallSource(n)))
+        tracemalloc.start()
+        try:
+            Evaluator().eval(program)
+        except RecursionError:
+            pass
+        print(f"tail call x{n} peak memory {tracemalloc.get_traced_memory()[1] / 1024:.1f}KB")
+        tracemalloc.stop()
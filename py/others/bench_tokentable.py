@@ -0,0 +1,42 @@
+'''
+Token 对象列表与 TokenTable 的时间、内存对比，以及 Parser 与 TableParser 的解析时间对比
+python others/bench_tokentable.py [源码字节数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+import tracemalloc
+from bench_source import generateSource
+from it_interpreter.it_tokenizer import tokenizer
+from it_interpreter.it_tokentable import TokenTable
+from it_interpreter.it_parser import parser
+
+def _measure(name:str, fun) -> object:
+    start = time.perf_counter()
+    fun()
+    cost = time.perf_counter() - start
+    tracemalloc.start() # 内存单独测量，tracemalloc 本身很慢
+    result = fun()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:28s} {cost:.3f}s retained {current/1024/1024:.1f}MB peak {peak/1024/1024:.1f}MB")
+    return result
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024*1024
+    source = generateSource(size)
+    print(f"source {len(source)} bytes")
+    tokens = _measure("tokenizer.tokenize", lambda: tokenizer.tokenize(io.BytesIO(source)))
+    table = _measure("TokenTable.build", lambda: TokenTable.build(source))
+    assert len(tokens) == len(table)
+    print(f"{len(table)} tokens")
+    del tokens, table
+
+    for name, fun in [("parser.parse", lambda: parser.parse(io.BytesIO(source))),
+                      ("parser.parseTable", lambda: parser.parseTable(source))]:
+        start = time.perf_counter()
+        fun()
+        print(f"{name:28s} {time.perf_counter() - start:.3f}s")
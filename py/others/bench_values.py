@@ -0,0 +1,53 @@
+'''
+值对象的分配：while 循环中创建的 IntegerObject/BoolObject/NullObject 个数、每个对象占用的内存（tracemalloc）以及循环耗时
+python others/bench_values.py [循环次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+import tracemalloc
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+from it_interpreter.it_object import IntegerObject, BoolObject, NullObject
+
+def generateLoopSource(count:int) -> bytes:
+    return f"let s = 0; let i = 0; while (i < {count}) {{ if (i / 3 * 3 == i) {{ s = s + 1; }} else {{ ; }} i = i + 1; }} s;".encode("ascii")
+
+def countConstructions(program) -> int: # 统计值对象构造次数，替换 __init__ 计数
+    counter = [0]
+    originals = {cls:cls.__init__ for cls in [IntegerObject, BoolObject, NullObject]}
+    for cls, init in originals.items():
+        def counting(self, *args, init=init) -> None:
+            counter[0] += 1
+            init(self, *args)
+        cls.__init__ = counting
+    try:
+        Evaluator().eval(program)
+    finally:
+        for cls, init in originals.items():
+            cls.__init__ = init
+    return counter[0]
+
+def bytesPerObject(count:int) -> float: # 不同的整数，避开小整数缓存
+    tracemalloc.start()
+    objects = [IntegerObject(i) for i in range(1 << 20, (1 << 20) + count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(objects)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    program = parser.parse(io.BytesIO(generateLoopSource(count)))
+    print(f"objects constructed   {countConstructions(parser.parse(io.BytesIO(generateLoopSource(count // 10)))) / (count // 10):.1f} per iteration")
+    print(f"IntegerObject size    {bytesPerObject(100000):.1f} bytes (tracemalloc, including the int)")
+    tracemalloc.start()
+    Evaluator().eval(program)
+    print(f"peak traced memory    {tracemalloc.get_traced_memory()[1] / 1024:.1f}KB")
+    tracemalloc.stop()
+    evaluator = Evaluator()
+    start = time.perf_counter()
+    evaluator.eval(program)
+    print(f"while loop x{count}  {time.perf_counter() - start:.3f}s  result {evaluator.result}")
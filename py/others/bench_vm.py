@@ -0,0 +1,51 @@
+'''
+在字节码虚拟机上执行循环、递归和频繁调用函数的程序，和 Evaluator 对比
+VM 分别用 step 逐条解码执行、用 run 预解码后执行，MIPS 是每秒执行的百万条指令数
+python others/bench_vm.py [重复次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from it_interpreter.it_parser import parser
+from it_interpreter.it_evaluator import Evaluator
+from it_compiler.it_compiler import Compiler
+from it_compiler.it_vm import VM
+
+SOURCES = { # 结果保存在全局变量 r 中
+    "loop": "let r = 0; let i = 0; while (i < 50000) { let t = i; r = r + t; i = i + 1; }",
+    "fa": "let fa = fn(n) { if (n == 0) { return 1; } return fa(n - 1) * n; }; let r = 0; let i = 0; while (i < 300) { r = fa(12); i = i + 1; }",
+    "calls": "let add = fn(a, b) { return a + b; }; let r = 0; let i = 0; while (i < 20000) { r = add(r, i); i = add(i, 1); }",
+}
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for name, source in SOURCES.items():
+        program = parser.parse(io.BytesIO(source.encode("ascii")))
+        evaluatorCost = stepCost = runCost = float("inf")
+        for _ in range(repeat):
+            evaluator = Evaluator()
+            start = time.perf_counter()
+            evaluator.eval(program)
+            evaluatorCost = min(evaluatorCost, time.perf_counter() - start)
+
+            compiler = Compiler()
+            compiler.compile(program)
+            vm = VM(compiler.bytecode)
+            steps = 0
+            start = time.perf_counter()
+            while vm.hasNext():
+                vm.step()
+                steps += 1
+            stepCost = min(stepCost, time.perf_counter() - start)
+            result = vm.globals[compiler.globalSlots['r']]
+
+            vm = VM(compiler.bytecode)
+            start = time.perf_counter()
+            vm.run()
+            runCost = min(runCost, time.perf_counter() - start)
+        assert str(result) == str(evaluator.env.get('r')) == str(vm.globals[compiler.globalSlots['r']]), name
+        print(f"{name:6} Evaluator {evaluatorCost:.3f}s  step {stepCost:.3f}s {steps / stepCost / 1e6:.2f} MIPS  "
+            f"run {runCost:.3f}s {steps / runCost / 1e6:.2f} MIPS  r = {result}  {steps} instructions")
@@ -0,0 +1,56 @@
+'''
+VM 各个指令的耗时，每个用例重复执行一段栈平衡的指令序列，输出 step 和 run（不含解码）平均每条指令的耗时
+depth 是执行前操作数栈中预先压入的元素个数，用来观察栈深度对每条指令耗时的影响
+python others/bench_vmops.py [重复次数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import time
+from typing import List
+from it_compiler.it_code import Bytes, ByteCode, OprationCode, OprationCodes
+from it_compiler.it_vm import VM
+
+def generateByteCode(body:List[OprationCode], count:int, depth:int) -> ByteCode: # 先压入 depth 个元素，再重复 count 次 body
+    bytecode = ByteCode()
+    bytecode.constPool.append(1)
+    bytecode.globalNames.append("g")
+    bytecode.localCount = 1
+    load = Bytes().pushByte(OprationCodes.LOADI.code).pushInt(0, OprationCodes.LOADI.operandNumber)
+    for _ in range(depth):
+        bytecode.instrctions.extend(load)
+    for _ in range(count):
+        for op in body:
+            bytecode.instrctions.pushByte(op.code)
+            if op.operandNumber > 0:
+                bytecode.instrctions.pushInt(0, op.operandNumber)
+    return bytecode
+
+def measure(body:List[OprationCode], count:int, depth:int, run:bool) -> float: # 每条指令的平均耗时，纳秒
+    vm = VM(generateByteCode(body, count, depth))
+    while vm.ip < depth * OprationCodes.LOADI.length:
+        vm.step()
+    if run:
+        vm.program = vm._decode()
+        start = time.perf_counter()
+        vm.run()
+    else:
+        start = time.perf_counter()
+        while vm.hasNext():
+            vm.step()
+    return (time.perf_counter() - start) / (count * len(body)) * 1e9
+
+CASES = { # 用例名: 指令序列，栈在序列前后保持平衡
+    "LOADI+POPI": [OprationCodes.LOADI, OprationCodes.POPI],
+    "ADDI": [OprationCodes.LOADI, OprationCodes.LOADI, OprationCodes.ADDI, OprationCodes.POPI],
+    "LTI": [OprationCodes.LOADI, OprationCodes.LOADI, OprationCodes.LTI, OprationCodes.POPI],
+    "DEFG+LOADG": [OprationCodes.LOADI, OprationCodes.DEFG, OprationCodes.LOADG, OprationCodes.POPI],
+    "STOREL+LOADL": [OprationCodes.LOADI, OprationCodes.STOREL, OprationCodes.LOADL, OprationCodes.POPI],
+}
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for depth in [0, 1000, 100000]:
+        for name, body in CASES.items():
+            print(f"depth {depth:6}  {name:13} step {measure(body, count, depth, False):5.0f} ns/instruction  run {measure(body, count, depth, True):4.0f} ns/instruction")
@@ -0,0 +1,36 @@
+'''
+AST 文本输出与二进制转储的耗时，源码规模翻倍时耗时应当也只是翻倍
+python others/bench_writer.py [最大源码字节数]
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(sys.path[0]))
+
+import io
+import time
+from it_interpreter.it_ast import AstWriter
+from it_interpreter.it_parser import parser
+from it_interpreter.it_serializer import serializer
+from bench_source import generateSource
+
+if __name__ == "__main__":
+    maxSize = int(sys.argv[1]) if len(sys.argv) > 1 else 1024*1024
+    size = 64*1024
+    while size <= maxSize:
+        program = parser.parse(io.BytesIO(generateSource(size)))
+        start = time.perf_counter()
+        text = str(program)
+        strCost = time.perf_counter() - start
+        start = time.perf_counter()
+        with open(os.devnull, "w") as out:
+            AstWriter(out).write(program)
+        fileCost = time.perf_counter() - start
+        start = time.perf_counter()
+        data = serializer.dumps(program)
+        dumpCost = time.perf_counter() - start
+        start = time.perf_counter()
+        serializer.loads(data)
+        loadCost = time.perf_counter() - start
+        print(f"source {size//1024:5d}KB  str {strCost:.3f}s ({len(text)} chars)  write file {fileCost:.3f}s  "
+              f"dumps {dumpCost:.3f}s ({len(data)} bytes)  loads {loadCost:.3f}s")
+        size *= 2
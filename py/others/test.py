@@ -14,7 +14,7 @@ if __name__ == "__main__":
     bytecode = ByteCode()
     bytecode.instrctions.pushByte(OprationCodes.LOADI.code)
     bytecode.instrctions.pushInt(14, OprationCodes.LOADI.operandNumber)
-    bytecode.constPool.extend([0]*14).pushInt(513, Sizes.I)
+    bytecode.constPool.extend([0]*14 + [513])
     vm = VM(bytecode)
     while vm.hasNext():
         vm.step()
@@ -42,4 +42,66 @@ if __name__ == "__main__":
     _test("!(2<=4);")
     _test("!true;")
     _test("if (1>0) {3;} else {4;}")
-    _test("if (1<0) {3;} else {4;}")
\ No newline at end of file
+    _test("if (1<0) {3;} else {4;}")
+    _test("let a = 3; let b = a * 2; a = b - a;")
+    _test("let x = 1; { let x = x + 1; x = x * 10; } x;")
+    _test("let i = 0; while (i < 2) { let t = i; i = t + 1; }")
+    _test("let f = fn(a, b) { return a * 10 + b; }; f(1, 2);")
+    _test("let fa = fn(n) { if (n == 0) { return 1; } return fa(n - 1) * n; }; println(fa(3));")
+
+    def _run(code:str)->None: # 预解码后一次执行到结束
+        AST = it_parser.parser.parse(io.BytesIO(code.encode("ascii")))
+        c = it_compiler.Compiler()
+        c.compile(AST)
+        vm = VM(c.bytecode)
+        vm.run()
+        print(">> " + code, "\n", vm, '\n', sep='')
+
+    _run("let fa = fn(n) { if (n == 0) { return 1; } return fa(n - 1) * n; }; let r = fa(10); println(r - fa(9) * 11);")
+    _run("let i = 0; let s = 0; while (i < 100) { let t = i; s = s + t; i = i + 1; } return s;")
+    _run("println(5000000000); println(4294967296 + 1); let a = 4294967296; println(a * a - 1);") # 常量是任意大小的整数
+
+    def _error(code:str)->None: # 编译或执行时报错，执行时 step 和 run 都要检查
+        AST = it_parser.parser.parse(io.BytesIO(code.encode("ascii")))
+        c = it_compiler.Compiler()
+        try:
+            c.compile(AST)
+        except Exception as e:
+            print(">> " + code, "\ncompile error: ", e, sep='')
+            return
+        for run in (False, True):
+            vm = VM(c.bytecode)
+            try:
+                if run:
+                    vm.run()
+                else:
+                    while vm.hasNext():
+                        vm.step()
+                print(">> " + code, "\nno error", vm)
+            except Exception as e:
+                print(">> " + code, "\n", "run" if run else "step", " error: ", e, sep='')
+
+    _error("let f = fn(a) { return a + 100; }; let g = fn(a) { return a * 2; }; let h = 0 - 1; let r = h(5);") # 负数不是函数
+    _error("let f = fn(a) { return a; }; let h = 0 - 2; h(5);")
+    _error("let println = fn(x) { return 42; }; println(1);") # 内置函数不能重新定义
+    _error("let f = fn(a) { println(a + 1000); return a; }; let g = 0; g(5);") # 函数值不是下标
+    _error("let f = fn(a) { return a; }; println(f + 1);") # 函数不能参与运算
+    _error("let f = fn(a) { return a; }; println(f == f);")
+    _error("let f = fn() { let g = fn(n) { if (n == 0) { return 0; } return g(n - 1); }; return g(3); }; f();") # 内层函数引用外层函数之后才声明的变量
+    _error("let f = fn() { let x = 1; let g = fn() { return x; }; return g(); }; f();")
+    _run("let f = fn() { let x = 1; { let x = 2; x = x + 1; } let y = x * 10; return y; }; println(f());")
+
+    def _limit(name:str, code:str)->None: # 操作数超出字节数时编译期报错，代码太长只输出名字
+        AST = it_parser.parser.parse(io.BytesIO(code.encode("ascii")))
+        try:
+            it_compiler.Compiler().compile(AST)
+            print(">> " + name, "\nno error", sep='')
+        except Exception as e:
+            print(">> " + name, "\ncompile error: ", e, sep='')
+
+    _limit("65536 constants", "let a = 0;" + "".join(f"a = {i};" for i in range(65537)))
+    _limit("65536 globals", "".join(f"let a{i} = 0;" for i in range(65537)))
+    _limit("255 arguments", "let f = fn(a) { return a; }; f(" + ", ".join(["1"] * 255) + "); println(" + ", ".join(["1"] * 255) + ");")
+    _limit("256 arguments", "let f = fn(a) { return a; }; f(" + ", ".join(["1"] * 256) + ");")
+    _limit("256 native arguments", "println(" + ", ".join(["1"] * 256) + ");")
+    _limit("jump over 64KB", "let s = 0; while (false) {" + "s = s + 1;" * 7000 + "}")